@@ -4,4 +4,13 @@ from .models import *
 
 
 admin.site.register(CustomUser)
-admin.site.register(TeacherProfile)
\ No newline at end of file
+
+@admin.register(TeacherProfile)
+class TeacherProfileAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'user', 'expires_at', 'revoked_at')
+    list_select_related = ('user',)
@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.db_routers import PRIMARY
+from . import revocation
+from .user_cache import AUTH_USER_CACHE_TTL, user_key
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+class VersionedRefreshToken(RefreshToken):
+    """Refresh token (and derived access tokens) stamped with the user's token_version."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from the cache instead of one
+    query per request. Entries are keyed by user id and token version and
+    dropped whenever the user is saved, so the active flag, role and token
+    version checked here are never older than the last save. The row is read
+    from the primary: a lagging replica could return it from before a
+    deactivation or a token version bump. Revoked JTIs
+    are rejected from the in-memory revocation store.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocation.is_revoked(token):
+            raise InvalidToken(_('Token has been revoked'))
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        # Tokens minted before versioning carry no claim; they match version 0.
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+
+        key = user_key(user_id, version)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = self.user_model.objects.using(PRIMARY).select_related('teacher_profile', 'student_profile').get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(key, user, AUTH_USER_CACHE_TTL)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if user.token_version != version:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+        return user
+
+
+class QueryTokenJWTAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication that also accepts the access token as ``?token=``,
+    for clients that cannot set headers (the browser's EventSource). Only for
+    endpoints that need it: URLs end up in logs.
+    """
+
+    def authenticate(self, request):
+        if self.get_header(request) is not None:
+            return super().authenticate(request)
+        raw_token = request.query_params.get('token')
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_user(validated_token), validated_token
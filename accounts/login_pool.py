@@ -0,0 +1,145 @@
+"""
+Bounded pool for login password verification.
+
+PBKDF2 releases the GIL while it hashes, so a small thread pool sized to the
+cores verifies passwords in parallel. The request thread still waits for its
+own hash, so the pool does not free request workers; it bounds how many
+hashes run at once. Logins beyond the workers wait in a bounded queue
+(``LOGIN_HASH_QUEUE_SIZE``); only a login that finds the queue full, or
+whose hash is not done within the timeout, is refused so the view can
+answer 429.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class PoolSaturated(Exception):
+    """Raised when the wait queue is full or a check times out."""
+    def __init__(self, retry_after):
+        super().__init__(f"Login hashing is saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordCheckPool:
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._latencies = deque(maxlen=1024)
+
+    def _run(self, raw_password, encoded):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        started = time.perf_counter()
+        try:
+            return check_password(raw_password, encoded)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._latencies.append(elapsed)
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        with self._lock:
+            backlog = self._in_flight
+            latencies = list(self._latencies)
+        average = sum(latencies) / len(latencies) if latencies else 0.5
+        return max(1, math.ceil(backlog / self.workers * average))
+
+    def check(self, raw_password, encoded):
+        """Verify ``raw_password`` against ``encoded`` on the pool."""
+        with self._lock:
+            admitted = self._in_flight < self.workers + self.queue_size
+            if admitted:
+                self._in_flight += 1
+                self._queued += 1
+            else:
+                self._rejected += 1
+        if not admitted:
+            raise PoolSaturated(self.retry_after())
+
+        future = self._executor.submit(self._run, raw_password, encoded)
+        # The slot is freed when the hash finishes, not when we stop waiting.
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolSaturated(self.retry_after())
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            snapshot = {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self._queued,
+                'in_flight': self._in_flight,
+                'active': self._active,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+            }
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(fraction * len(latencies)))
+            return round(latencies[index] * 1000, 2)
+
+        snapshot['hash_latency_ms'] = {
+            'samples': len(latencies),
+            'avg': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'max': round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+        return snapshot
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_dummy_hash = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, 'LOGIN_HASH_WORKERS', None) or os.cpu_count() or 1
+                _pool = PasswordCheckPool(workers=workers,
+                                          queue_size=getattr(settings, 'LOGIN_HASH_QUEUE_SIZE', workers * 4),
+                                          timeout=getattr(settings, 'LOGIN_HASH_TIMEOUT', 5))
+    return _pool
+
+
+def dummy_hash():
+    """A real hash to verify against for unknown emails, so timing matches."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = make_password('unused-login-password')
+    return _dummy_hash
@@ -0,0 +1,47 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import read_rows, provision_users, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create students and teachers from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSONL file of users.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Password hashing processes.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt == 'ndjson':
+            fmt = 'jsonl'
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                rows = read_rows(stream, fmt)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        report = provision_users(rows, workers=options['workers'], batch_size=options['batch_size'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        errors = report['errors']
+        for error in errors[:20]:
+            details = f" {json.dumps(error['errors'])}" if 'errors' in error else ''
+            self.stderr.write(f"row {error['row']}: {error['email'] or '<blank>'} {error['status']}{details}")
+        if len(errors) > 20:
+            self.stderr.write(f"... {len(errors) - 20} more skipped rows (use --json for the full report)")
+        timing = report['timing']
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} of {report['received']} users "
+            f"({report['skipped']} skipped) in {timing['total_seconds']}s: "
+            f"{timing['users_per_second']} users/s, hashing {timing['hash_seconds']}s "
+            f"on {timing['hash_workers']} workers, inserts {timing['insert_seconds']}s."
+        ))
@@ -4,6 +4,8 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core.validators import RegexValidator
 
+from .user_cache import forget_user
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -66,6 +68,8 @@ class CustomUser(AbstractUser):
     date_joined = models.DateTimeField(default=timezone.now)
     last_login = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
+    # Embedded in issued JWTs; bumping it invalidates every outstanding token.
+    token_version = models.PositiveIntegerField(default=0)
     
     # Contact information
     phone_regex = RegexValidator(
@@ -101,10 +105,37 @@ class CustomUser(AbstractUser):
         """Return the user's full name."""
         return f"{self.first_name} {self.last_name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._loaded_token_version = getattr(user, 'token_version', None)
+        return user
+
     def save(self, *args, **kwargs):
         """
         Override save method to ensure role-specific fields are properly handled.
         """
+        self.clear_role_fields()
+        super().save(*args, **kwargs)
+        self.forget_cached()
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        self.forget_cached(pk)
+        return result
+
+    def forget_cached(self, pk=None):
+        """Drop this user from the authentication cache under old and new token versions."""
+        versions = {self.token_version, getattr(self, '_loaded_token_version', None)} - {None}
+        forget_user(pk or self.pk, *versions)
+        self._loaded_token_version = self.token_version
+
+    def clear_role_fields(self):
+        """
+        Null out the fields that do not apply to this user's role. Called by
+        save() and by bulk paths that bypass it.
+        """
         # Set specific fields to None based on the role
         if self.role == 'STUDENT':
             self.employee_id = None
@@ -116,8 +147,6 @@ class CustomUser(AbstractUser):
             self.enrollment_date = None
             self.graduation_date = None
             self.major = None
-        
-        super().save(*args, **kwargs)
     
     def is_teacher(self):
         """Check if user is a teacher."""
@@ -160,4 +189,19 @@ class StudentProfile(models.Model):
     year_level = models.IntegerField(blank=True, null=True)
     
     def __str__(self):
-        return f"Student Profile: {self.user.email}"
\ No newline at end of file
+        return f"Student Profile: {self.user.email}"
+
+class RevokedToken(models.Model):
+    """
+    A JWT that must no longer be accepted. Authoritative copy of the
+    in-memory revocation store (accounts.revocation); rows past
+    ``expires_at`` are pruned since the token would be rejected anyway.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='revoked_tokens')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
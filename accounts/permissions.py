@@ -6,3 +6,8 @@ class IsAuthenticatedAndActive(BasePermission):
     def has_permission(self, request, view):
         user = request.user
         return user and user.is_authenticated and user.is_active
+
+class IsAdminRole(BasePermission):
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.role == 'ADMIN' or user.is_superuser))
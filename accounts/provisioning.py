@@ -0,0 +1,236 @@
+"""
+Bulk user provisioning.
+
+Imports students and teachers from CSV or JSON Lines without going through
+``create_user``: every row is checked by ``ProvisionRowSerializer``,
+passwords are hashed (across a process pool when ``workers`` > 1) and users
+and profiles are inserted with batched ``bulk_create`` (no post_save
+signals). Only the management command hashes in worker processes; the admin
+endpoint hashes in the request thread rather than fork a pool per request.
+"""
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from rest_framework import serializers
+
+from .models import CustomUser, TeacherProfile, StudentProfile
+
+PROVISION_ROLES = ('STUDENT', 'TEACHER')
+# Optional columns copied onto the user; anything else in a row is ignored.
+PROVISION_FIELDS = (
+    'first_name', 'last_name', 'phone_number', 'address',
+    'student_id', 'major', 'employee_id', 'department', 'qualification',
+)
+BATCH_SIZE = 500
+PASSWORD_MIN_LENGTH = 8
+# Below this many passwords a pool costs more to start than it saves.
+POOL_THRESHOLD = 64
+
+
+def read_rows(stream, fmt):
+    """Parse an uploaded CSV or JSONL text stream into a list of dicts."""
+    if isinstance(stream, bytes):
+        stream = stream.decode('utf-8-sig')
+    if isinstance(stream, str):
+        stream = io.StringIO(stream)
+    if fmt == 'csv':
+        return [
+            {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+            for row in csv.DictReader(stream)
+        ]
+    if fmt == 'jsonl':
+        rows = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON.")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {number} is not a JSON object.")
+            rows.append(row)
+        return rows
+    raise ValueError(f"Unsupported format '{fmt}', expected 'csv' or 'jsonl'.")
+
+
+def _init_worker():
+    # Spawned (non-forked) workers need Django configured before hashing.
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+        django.setup()
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash ``passwords`` in order, spreading the work over a process pool."""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < POOL_THRESHOLD:
+        return _hash_chunk(passwords)
+    size = max(1, len(passwords) // (workers * 4))
+    chunks = [passwords[start:start + size] for start in range(0, len(passwords), size)]
+    hashed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for result in pool.map(_hash_chunk, chunks):
+            hashed.extend(result)
+    return hashed
+
+
+class ProvisionRowSerializer(serializers.ModelSerializer):
+    """One imported user; a blank password leaves the account without a usable one."""
+    role = serializers.ChoiceField(choices=PROVISION_ROLES, default='STUDENT')
+
+    class Meta:
+        model = CustomUser
+        fields = ('email', 'role', 'password') + PROVISION_FIELDS
+        extra_kwargs = {
+            # Existing emails are reported in bulk, not looked up row by row.
+            'email': {'validators': []},
+            'password': {'required': False, 'allow_blank': True, 'allow_null': True,
+                         'trim_whitespace': False, 'min_length': PASSWORD_MIN_LENGTH},
+        }
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict) and (data.get('role') is None or isinstance(data['role'], str)):
+            data = dict(data, role=(data.get('role') or '').strip().upper() or 'STUDENT')
+        return super().to_internal_value(data)
+
+
+def _validate(rows):
+    """Split rows into valid ones and a per-row error report."""
+    valid, errors, seen = [], [], set()
+    row_serializer = ProvisionRowSerializer()
+    for index, row in enumerate(rows, start=1):
+        try:
+            data = row_serializer.run_validation(row)
+        except serializers.ValidationError as exc:
+            email = row.get('email') if isinstance(row, dict) else None
+            errors.append({'row': index, 'email': email if isinstance(email, str) else '',
+                           'status': 'invalid', 'errors': exc.detail})
+            continue
+        email = CustomUser.objects.normalize_email(data['email'])
+        if email.lower() in seen:
+            errors.append({'row': index, 'email': email, 'status': 'duplicate'})
+            continue
+        seen.add(email.lower())
+        valid.append((index, email, data['role'], data))
+    return valid, errors
+
+
+def _existing_emails(emails, batch_size):
+    """Lowercased emails among ``emails`` that already belong to a user."""
+    existing = set()
+    users = CustomUser.objects.annotate(email_lower=Lower('email'))
+    lowered = [email.lower() for email in emails]
+    for start in range(0, len(lowered), batch_size):
+        existing.update(
+            users.filter(email_lower__in=lowered[start:start + batch_size]).values_list('email_lower', flat=True)
+        )
+    return existing
+
+
+def _insert(users, batch_size):
+    """Insert ``users`` and their role profiles in one transaction."""
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users, batch_size=batch_size)
+        # SQLite does not hand back primary keys from bulk inserts, so map
+        # them back by email before creating profiles.
+        ids = {}
+        created_emails = [user.email for user in users]
+        for start in range(0, len(created_emails), batch_size):
+            ids.update(
+                CustomUser.objects.filter(email__in=created_emails[start:start + batch_size])
+                .values_list('email', 'id')
+            )
+        TeacherProfile.objects.bulk_create(
+            [TeacherProfile(user_id=ids[user.email]) for user in users if user.role == 'TEACHER'],
+            batch_size=batch_size,
+        )
+        StudentProfile.objects.bulk_create(
+            [StudentProfile(user_id=ids[user.email]) for user in users if user.role == 'STUDENT'],
+            batch_size=batch_size,
+        )
+
+
+def provision_users(rows, workers=1, batch_size=BATCH_SIZE):
+    """
+    Create users and their role profiles from ``rows``.
+
+    Invalid rows and rows whose email already exists (in any letter case)
+    are skipped; emails taken by a concurrent signup while the batch was
+    being prepared are reported as conflicts. Rows without a password get an unusable one. Passwords are hashed in this
+    process unless ``workers`` > 1. Returns a report with counts, per-row
+    problems and throughput figures.
+    """
+    started = time.perf_counter()
+    workers = workers or 1
+    valid, errors = _validate(rows)
+
+    existing = _existing_emails([email for _, email, _, _ in valid], batch_size)
+    pending = []
+    for index, email, role, row in valid:
+        if email.lower() in existing:
+            errors.append({'row': index, 'email': email, 'status': 'exists'})
+        else:
+            pending.append((index, email, role, row))
+
+    hash_started = time.perf_counter()
+    hashes = hash_passwords([row.get('password') or None for _, _, _, row in pending], workers=workers)
+    hash_seconds = time.perf_counter() - hash_started
+
+    users = []
+    for (_, email, role, row), password in zip(pending, hashes):
+        user = CustomUser(email=email, role=role, password=password)
+        for field in PROVISION_FIELDS:
+            if row.get(field) not in (None, ''):
+                setattr(user, field, row[field])
+        user.clear_role_fields()
+        users.append(user)
+
+    insert_started = time.perf_counter()
+    rows_by_email = {user.email: index for (index, _, _, _), user in zip(pending, users)}
+    while users:
+        try:
+            _insert(users, batch_size)
+            break
+        except IntegrityError:
+            # Someone else created some of these emails after the check above.
+            taken = _existing_emails([user.email for user in users], batch_size)
+            if not taken:
+                # Not an email clash we can single out; report the whole batch.
+                taken = {user.email.lower() for user in users}
+            errors.extend(
+                {'row': rows_by_email[user.email], 'email': user.email, 'status': 'conflict'}
+                for user in users if user.email.lower() in taken
+            )
+            users = [user for user in users if user.email.lower() not in taken]
+    insert_seconds = time.perf_counter() - insert_started
+    total_seconds = time.perf_counter() - started
+
+    errors.sort(key=lambda entry: entry['row'])
+    return {
+        'received': len(rows),
+        'created': len(users),
+        'skipped': len(errors),
+        'errors': errors,
+        'timing': {
+            'hash_seconds': round(hash_seconds, 3),
+            'insert_seconds': round(insert_seconds, 3),
+            'total_seconds': round(total_seconds, 3),
+            'users_per_second': round(len(users) / total_seconds, 1) if total_seconds else None,
+            'hash_workers': workers if len(pending) >= POOL_THRESHOLD else 1,
+        },
+    }
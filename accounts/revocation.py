@@ -0,0 +1,172 @@
+"""
+In-process JWT revocation store.
+
+Revoked token ids (JTIs) are written to the ``RevokedToken`` table and kept in
+memory as a Bloom filter in front of a dict, so the per-request check costs
+no query: most tokens are rejected by the filter in a few hash probes and
+the rare filter hit is confirmed against the dict. Every ``sync_interval``
+seconds each process pulls rows added by other processes (by id watermark),
+and every ``prune_interval`` seconds expired rows are deleted and the filter
+is rebuilt, since Bloom filters cannot forget.
+
+"Log out everywhere" does not go through here: it bumps the user's
+``token_version``, which ``CachedJWTAuthentication`` compares on every
+request.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def false_positive_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class RevocationStore:
+    def __init__(self, capacity, error_rate, sync_interval, prune_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._filter = BloomFilter(capacity, error_rate)
+        self._last_id = 0
+        self._synced_at = None
+        self._pruned_at = time.monotonic()
+        self._checks = 0
+        self._filter_hits = 0
+
+    def revoke(self, jti, expires_at, user_id=None):
+        """Revoke ``jti``; False if it already was (e.g. a refresh token replayed)."""
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, user_id=user_id, expires_at=expires_at)
+        except IntegrityError:
+            created = False
+        else:
+            created = True
+        with self._lock:
+            self._remember(jti, expires_at)
+        return created
+
+    def is_revoked(self, jti):
+        self._maybe_sync()
+        self._checks += 1
+        if jti not in self._filter:
+            return False
+        self._filter_hits += 1
+        return jti in self._entries
+
+    def _remember(self, jti, expires_at):
+        if jti in self._entries:
+            return
+        self._entries[jti] = expires_at
+        if len(self._entries) > self._filter.capacity:
+            self._rebuild(self._filter.capacity * 2)
+        else:
+            self._filter.add(jti)
+
+    def _rebuild(self, capacity):
+        self._filter = BloomFilter(max(capacity, self.capacity), self.error_rate)
+        for jti in self._entries:
+            self._filter.add(jti)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+                return
+            rows = RevokedToken.objects.filter(id__gt=self._last_id, expires_at__gt=timezone.now())
+            for pk, jti, expires_at in rows.order_by('id').values_list('id', 'jti', 'expires_at'):
+                self._remember(jti, expires_at)
+                self._last_id = pk
+            self._synced_at = now
+            if now - self._pruned_at >= self.prune_interval:
+                self._prune()
+                self._pruned_at = now
+
+    def _prune(self):
+        cutoff = timezone.now()
+        RevokedToken.objects.filter(expires_at__lte=cutoff).delete()
+        self._entries = {jti: expires for jti, expires in self._entries.items() if expires > cutoff}
+        self._rebuild(self.capacity)
+
+    def metrics(self):
+        return {
+            'revoked': len(self._entries),
+            'filter_bits': self._filter.size,
+            'filter_hashes': self._filter.hashes,
+            'estimated_false_positive_rate': round(self._filter.false_positive_rate(), 6),
+            'checks': self._checks,
+            'filter_hits': self._filter_hits,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RevocationStore(
+                    capacity=getattr(settings, 'REVOCATION_BLOOM_CAPACITY', 100000),
+                    error_rate=getattr(settings, 'REVOCATION_BLOOM_ERROR_RATE', 0.001),
+                    sync_interval=getattr(settings, 'REVOCATION_SYNC_INTERVAL', 5),
+                    prune_interval=getattr(settings, 'REVOCATION_PRUNE_INTERVAL', 3600),
+                )
+    return _store
+
+
+def reset_store():
+    """Forget the in-memory state; the next check reloads from the table."""
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def revoke_token(token):
+    """Revoke a validated simplejwt token until it would have expired anyway."""
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    return get_store().revoke(token[api_settings.JTI_CLAIM], expires_at, token.get(api_settings.USER_ID_CLAIM))
+
+
+def is_revoked(token):
+    return get_store().is_revoked(token[api_settings.JTI_CLAIM])
@@ -6,6 +6,7 @@ from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from .permissions import IsAuthenticatedAndActive
 from .models import CustomUser, TeacherProfile, StudentProfile 
+from .provisioning import read_rows
 import logging
 from rest_framework import serializers 
 
@@ -88,4 +89,24 @@ class UserDetailSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'role', 'first_name', 'last_name', 'phone_number', 'address', 'employee_id',
                   'department', 'bio', 'hire_date', 'qualification', 'student_id', 'enrollment_date',
                   'graduation_date', 'major', 'teacher_profile', 'student_profile']  # Include all relevant fields
-        read_only_fields = ['email', 'role'] # Prevent these from being changed.
\ No newline at end of file
+        read_only_fields = ['email', 'role'] # Prevent these from being changed.
+
+class ProvisionUsersSerializer(serializers.Serializer):
+    """Bulk import payload: a CSV/JSONL ``file`` upload or a JSON ``users`` list."""
+    file = serializers.FileField(required=False)
+    format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+    users = serializers.ListField(child=serializers.DictField(), required=False)
+
+    def validate(self, data):
+        if 'file' not in data and 'users' not in data:
+            raise serializers.ValidationError("Provide a 'file' upload or a 'users' list.")
+        rows = list(data.get('users', []))
+        if 'file' in data:
+            upload = data['file']
+            fmt = data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+            try:
+                rows.extend(read_rows(upload.read(), fmt))
+            except (ValueError, UnicodeDecodeError) as exc:
+                raise serializers.ValidationError({'file': str(exc)})
+        data['rows'] = rows
+        return data
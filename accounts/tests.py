@@ -1,3 +1,335 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.db_routers import ReplicaRouter
+from . import login_pool, provisioning, revocation
+from .authentication import CachedJWTAuthentication, VersionedRefreshToken
+from .models import CustomUser, RevokedToken, StudentProfile, TeacherProfile
+
+
+class UserDetailQueryTests(APITestCase):
+    def test_profiles_load_in_one_query(self):
+        for email, role, profile in (('t@example.com', 'TEACHER', TeacherProfile),
+                                     ('s@example.com', 'STUDENT', StudentProfile)):
+            user = CustomUser.objects.create_user(email=email, password=None, first_name='F',
+                                                  last_name='L', role=role)
+            profile.objects.create(user=user)
+            self.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/accounts/user/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='s@example.com', password='old-pass', first_name='F',
+                                                   last_name='L', role='STUDENT')
+        StudentProfile.objects.create(user=self.user)
+
+    def get(self, user=None):
+        token = VersionedRefreshToken.for_user(user or self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/courses/enrollments/')
+        return response, len(queries)
+
+    def test_user_is_loaded_once(self):
+        first, cold = self.get()
+        second, warm = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(warm, cold - 1)
+
+    def test_save_invalidates_cached_user(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_version_bump_revokes_old_tokens(self):
+        old_token = VersionedRefreshToken.for_user(self.user).access_token
+        self.get()
+        self.user.token_version += 1
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {old_token}')
+        self.assertEqual(self.client.get('/api/courses/enrollments/').status_code, 401)
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_is_read_from_the_primary(self):
+        token = VersionedRefreshToken.for_user(self.user).access_token
+        # A replica read would fail: there is no such alias.
+        with mock.patch.object(ReplicaRouter, 'db_for_read', return_value='replica-missing'):
+            user = CachedJWTAuthentication().get_user(token)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_password_change_drops_cached_password(self):
+        self.get()
+        token = VersionedRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.put('/api/accounts/change-password/', {
+            'old_password': 'old-pass', 'new_password': 'n3w-pass', 'new_password2': 'n3w-pass',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.put('/api/accounts/change-password/', {
+            'old_password': 'n3w-pass', 'new_password': 'n3w-pass2', 'new_password2': 'n3w-pass2',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        revocation.reset_store()
+        self.user = CustomUser.objects.create_user(email='s@example.com', password='pass', first_name='F',
+                                                   last_name='L', role='STUDENT')
+
+    def authorize(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/api/courses/enrollments/').status_code
+
+    def test_rotated_refresh_token_cannot_be_replayed(self):
+        refresh = str(VersionedRefreshToken.for_user(self.user))
+        first = self.client.post('/api/accounts/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.authorize(first.data['access']), 200)
+        replay = self.client.post('/api/accounts/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(replay.status_code, 401)
+        rotated = self.client.post('/api/accounts/token/refresh/', {'refresh': first.data['refresh']}, format='json')
+        self.assertEqual(rotated.status_code, 200)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        refresh = VersionedRefreshToken.for_user(self.user)
+        access = str(refresh.access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.post('/api/accounts/logout/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.authorize(access), 401)
+        self.client.credentials()
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocations_survive_a_restart(self):
+        access = VersionedRefreshToken.for_user(self.user).access_token
+        revocation.revoke_token(access)
+        revocation.reset_store()
+        self.assertEqual(self.authorize(str(access)), 401)
+
+    def test_logout_all_invalidates_every_token(self):
+        first = VersionedRefreshToken.for_user(self.user)
+        second = VersionedRefreshToken.for_user(self.user)
+        self.assertEqual(self.authorize(str(second.access_token)), 200)
+        self.client.post('/api/accounts/logout/all/')
+        self.assertEqual(self.authorize(str(first.access_token)), 401)
+        self.assertEqual(self.authorize(str(second.access_token)), 401)
+        self.client.credentials()
+        response = self.client.post('/api/accounts/token/refresh/', {'refresh': str(first)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_prune_drops_expired_revocations(self):
+        store = revocation.RevocationStore(capacity=10, error_rate=0.01, sync_interval=0, prune_interval=0)
+        past = timezone.now() - timedelta(minutes=1)
+        store.revoke('expired', past)
+        store.revoke('live', timezone.now() + timedelta(minutes=1))
+        store.is_revoked('live')
+        self.assertFalse(store.is_revoked('expired'))
+        self.assertTrue(store.is_revoked('live'))
+        self.assertFalse(RevokedToken.objects.filter(jti='expired').exists())
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = revocation.BloomFilter(capacity=1000, error_rate=0.01)
+        for n in range(1000):
+            bloom.add(f'jti-{n}')
+        self.assertTrue(all(f'jti-{n}' in bloom for n in range(1000)))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginPoolTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='s@example.com', password='pass', first_name='F',
+                                                   last_name='L', role='STUDENT')
+        self.started, self.release = threading.Event(), threading.Event()
+        self.addCleanup(self.release.set)
+
+    def blocking_check(self, raw_password, encoded):
+        self.started.set()
+        self.release.wait(5)
+        return True
+
+    def login(self, pool):
+        with mock.patch('accounts.views.get_pool', return_value=pool):
+            return self.client.post('/api/accounts/login/', {'email': 's@example.com', 'password': 'pass'},
+                                    format='json')
+
+    def test_login_succeeds_through_the_pool(self):
+        response = self.login(login_pool.PasswordCheckPool(workers=1, queue_size=1, timeout=5))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+
+    def wait_for_queue(self, pool, depth):
+        deadline = time.monotonic() + 5
+        while pool.metrics()['queue_depth'] != depth and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return pool.metrics()['queue_depth']
+
+    def test_login_waits_in_queue_while_workers_are_busy(self):
+        pool = login_pool.PasswordCheckPool(workers=1, queue_size=1, timeout=5)
+        seen = []
+
+        def release_once_queued():
+            seen.append(self.wait_for_queue(pool, 1))
+            self.release.set()
+
+        with mock.patch.object(login_pool, 'check_password', self.blocking_check):
+            busy = threading.Thread(target=pool.check, args=('pass', 'hash'))
+            busy.start()
+            self.started.wait(5)
+            releaser = threading.Thread(target=release_once_queued)
+            releaser.start()
+            response = self.login(pool)
+            releaser.join()
+            busy.join()
+        self.assertEqual(seen, [1])
+        self.assertEqual(response.status_code, 200)
+        metrics = pool.metrics()
+        self.assertEqual((metrics['queue_depth'], metrics['rejected'], metrics['completed']), (0, 0, 2))
+
+    def test_full_queue_refuses_with_retry_after(self):
+        pool = login_pool.PasswordCheckPool(workers=1, queue_size=1, timeout=5)
+        with mock.patch.object(login_pool, 'check_password', self.blocking_check):
+            busy = [threading.Thread(target=pool.check, args=('pass', 'hash')) for _ in range(2)]
+            for thread in busy:
+                thread.start()
+            self.started.wait(5)
+            self.assertEqual(self.wait_for_queue(pool, 1), 1)
+            response = self.login(pool)
+            self.release.set()
+            for thread in busy:
+                thread.join()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(pool.metrics()['rejected'], 1)
+
+    def test_slow_hash_times_out(self):
+        pool = login_pool.PasswordCheckPool(workers=1, queue_size=1, timeout=0.05)
+        with mock.patch.object(login_pool, 'check_password', self.blocking_check):
+            with self.assertRaises(login_pool.PoolSaturated):
+                pool.check('pass', 'hash')
+            self.release.set()
+        self.assertEqual(pool.metrics()['timeouts'], 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisioningTests(APITestCase):
+    def test_rows_are_validated_one_by_one(self):
+        rows = [
+            {'email': 'ok@example.com', 'password': 'long-enough', 'first_name': 'Ok'},
+            {'email': 'teacher@example.com', 'role': 'teacher', 'department': 'Maths'},
+            {'email': 'number@example.com', 'password': 12345},
+            {'email': 'object@example.com', 'password': {'raw': 'long-enough'}},
+            {'email': 'admin@example.com', 'role': 'ADMIN'},
+            {'email': 'not-an-email'},
+            {'email': 'long@example.com', 'first_name': 'x' * 200},
+            {'email': 'OK@example.com'},
+        ]
+        report = provisioning.provision_users(rows)
+
+        self.assertEqual(report['created'], 2)
+        statuses = {error['row']: error['status'] for error in report['errors']}
+        self.assertEqual(statuses, {3: 'invalid', 4: 'invalid', 5: 'invalid', 6: 'invalid', 7: 'invalid',
+                                    8: 'duplicate'})
+        fields = {error['row']: set(error.get('errors', ())) for error in report['errors']}
+        self.assertEqual(fields[3], {'password'})
+        self.assertEqual(fields[4], {'password'})
+        self.assertEqual(fields[5], {'role'})
+        self.assertEqual(fields[6], {'email'})
+        self.assertEqual(fields[7], {'first_name'})
+
+        user = CustomUser.objects.get(email='ok@example.com')
+        self.assertTrue(user.check_password('long-enough'))
+        self.assertEqual(user.first_name, 'Ok')
+        self.assertTrue(StudentProfile.objects.filter(user=user).exists())
+        teacher = CustomUser.objects.get(email='teacher@example.com')
+        self.assertEqual((teacher.role, teacher.department), ('TEACHER', 'Maths'))
+        self.assertFalse(teacher.has_usable_password())
+        self.assertTrue(TeacherProfile.objects.filter(user=teacher).exists())
+
+    def test_existing_users_are_skipped(self):
+        CustomUser.objects.create_user(email='taken@example.com', password=None, first_name='T',
+                                       last_name='T', role='STUDENT')
+        report = provisioning.provision_users([{'email': 'taken@example.com'}, {'email': 'new@example.com'}])
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [{'row': 1, 'email': 'taken@example.com', 'status': 'exists'}])
+
+    def test_existing_users_match_without_case(self):
+        CustomUser.objects.create_user(email='Taken@example.com', password=None, first_name='T',
+                                       last_name='T', role='STUDENT')
+        report = provisioning.provision_users([{'email': 'taken@example.com'}])
+        self.assertEqual(report['created'], 0)
+        self.assertEqual(report['errors'], [{'row': 1, 'email': 'taken@example.com', 'status': 'exists'}])
+
+    def test_concurrent_signup_is_reported_as_conflict(self):
+        CustomUser.objects.create_user(email='raced@example.com', password=None, first_name='R',
+                                       last_name='R', role='STUDENT')
+        lookup = provisioning._existing_emails
+        calls = []
+
+        def missed_first_check(emails, batch_size):
+            # The first lookup runs before the concurrent signup committed.
+            calls.append(emails)
+            return set() if len(calls) == 1 else lookup(emails, batch_size)
+
+        with mock.patch.object(provisioning, '_existing_emails', side_effect=missed_first_check):
+            report = provisioning.provision_users([{'email': 'raced@example.com'}, {'email': 'new@example.com'}])
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [{'row': 1, 'email': 'raced@example.com', 'status': 'conflict'}])
+        self.assertTrue(StudentProfile.objects.filter(user__email='new@example.com').exists())
+        self.assertEqual(CustomUser.objects.filter(email='raced@example.com').count(), 1)
+
+    def test_endpoint_hashes_without_a_process_pool(self):
+        admin = CustomUser.objects.create_user(email='admin@example.com', password=None, first_name='A',
+                                               last_name='A', role='ADMIN')
+        self.client.force_authenticate(admin)
+        users = [{'email': f'user{number}@example.com', 'password': f'password-{number}'}
+                 for number in range(provisioning.POOL_THRESHOLD + 1)]
+        users.append({'email': 'bad@example.com', 'password': ['not', 'a', 'string']})
+        with mock.patch.object(provisioning, 'ProcessPoolExecutor', side_effect=AssertionError):
+            response = self.client.post('/api/accounts/provision/', {'users': users}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual(report['created'], provisioning.POOL_THRESHOLD + 1)
+        self.assertEqual(report['timing']['hash_workers'], 1)
+        self.assertEqual(report['errors'][0]['row'], len(users))
+        self.assertIn('password', report['errors'][0]['errors'])
+
+    def test_csv_upload(self):
+        admin = CustomUser.objects.create_user(email='admin@example.com', password=None, first_name='A',
+                                               last_name='A', role='ADMIN')
+        self.client.force_authenticate(admin)
+        upload = SimpleUploadedFile('users.csv', b'Email,Role,First_Name\nc1@example.com,Teacher,Cee\n,student,\n')
+        response = self.client.post('/api/accounts/provision/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'][0]['errors'], {'email': ['This field may not be blank.']})
+        self.assertEqual(CustomUser.objects.get(email='c1@example.com').role, 'TEACHER')
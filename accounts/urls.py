@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import RegisterView, login_view, ChangePasswordView, UserDetailView
+from .views import RegisterView, login_view, login_metrics_view, ChangePasswordView, UserDetailView, ProvisionUsersView
+from .views import token_refresh_view, logout_view, logout_all_view
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', login_view, name='login'),
+    path('login/metrics/', login_metrics_view, name='login-metrics'),
+    path('token/refresh/', token_refresh_view, name='token-refresh'),
+    path('logout/', logout_view, name='logout'),
+    path('logout/all/', logout_all_view, name='logout-all'),
     path('change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('user/', UserDetailView.as_view(), name='user-detail'),
+    path('provision/', ProvisionUsersView.as_view(), name='provision-users'),
 ]
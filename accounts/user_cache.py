@@ -0,0 +1,28 @@
+"""
+Short-lived cache of the user rows behind JWT-authenticated requests.
+
+``accounts.authentication.CachedJWTAuthentication`` stores each user (with
+both profiles joined in) under their id and ``token_version``.
+``CustomUser.save()`` and ``delete()`` drop the entries, so role, is_active
+and password changes apply on the next request rather than after the TTL.
+Queryset ``update()`` bypasses both; call ``forget_user`` after using it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+AUTH_USER_CACHE_TTL = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+
+
+def user_key(user_id, token_version):
+    return f'auth:user:{user_id}:v{token_version}'
+
+
+def forget_user(user_id, *token_versions):
+    """
+    Drop the cached user for each version now and again on commit, so a
+    concurrent request cannot re-cache the pre-commit row.
+    """
+    keys = [user_key(user_id, version) for version in token_versions]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,11 +1,23 @@
 from django.shortcuts import render
 from rest_framework import status, generics
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.signals import user_login_failed
+from django.db.models import F
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from . import revocation
+from .authentication import CachedJWTAuthentication, VersionedRefreshToken
+from .user_cache import forget_user
 from .serializers import RegisterSerializer, ChangePasswordSerializer, UserDetailSerializer # Added UserDetailSerializer
-from .permissions import IsAuthenticatedAndActive
+from .serializers import ProvisionUsersSerializer
+from .permissions import IsAuthenticatedAndActive, IsAdminRole
+from .provisioning import provision_users
+from .login_pool import get_pool, dummy_hash, PoolSaturated
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from .models import CustomUser, TeacherProfile, StudentProfile # Import the profile models
 import logging
 
@@ -36,26 +48,102 @@ def login_view(request):
     if not email or not password:
         return Response({'detail': 'Email and password are required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = authenticate(email=email, password=password)
-
-    if user is not None:
-        refresh = RefreshToken.for_user(user)
+    # Same checks as ModelBackend via authenticate(), but the PBKDF2 work runs
+    # on the bounded login pool: logins wait in its bounded queue, and are
+    # refused with 429 once the queue is full or the wait times out.
+    try:
+        user = CustomUser._default_manager.get_by_natural_key(email)
+    except CustomUser.DoesNotExist:
+        user = None
+
+    try:
+        valid = get_pool().check(password, user.password if user is not None else dummy_hash())
+    except PoolSaturated as exc:
+        logger.warning(f"Login pool queue full or timed out, rejected login for email: {email}")
+        response = Response({'detail': 'Too many login attempts in progress, try again shortly.'},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(exc.retry_after)
+        return response
+
+    if user is not None and valid and user.is_active:
+        hasher = identify_hasher(user.password)
+        if hasher.must_update(user.password):
+            user.set_password(password)
+            user.save(update_fields=['password'])
+        refresh = VersionedRefreshToken.for_user(user)
         logger.info(f"User {user.email} logged in successfully.")
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
         })
     else:
+        user_login_failed.send(sender=__name__, credentials={'email': email}, request=request)
         logger.warning(f"Login failed for email: {email}")
         return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+def _refresh_token(raw):
+    """A valid, unrevoked refresh token, or None."""
+    try:
+        token = RefreshToken(raw)
+    except TokenError:
+        return None
+    return None if revocation.is_revoked(token) else token
+
+@api_view(['POST'])
+def token_refresh_view(request):
+    """
+    Exchange a refresh token for a new access token. With rotation on, the
+    refresh token is revoked and replaced; replaying it afterwards fails.
+    """
+    refresh = _refresh_token(request.data.get('refresh') or '')
+    if refresh is None:
+        return Response({'detail': 'Token is invalid, expired or revoked.'}, status=status.HTTP_401_UNAUTHORIZED)
+    # Same user checks as every request: exists, active, token_version current.
+    user = CachedJWTAuthentication().get_user(refresh)
+
+    if not jwt_settings.ROTATE_REFRESH_TOKENS:
+        return Response({'access': str(refresh.access_token)})
+    if jwt_settings.BLACKLIST_AFTER_ROTATION and not revocation.revoke_token(refresh):
+        # Lost a race with another refresh of the same token.
+        return Response({'detail': 'Token is invalid, expired or revoked.'}, status=status.HTTP_401_UNAUTHORIZED)
+    rotated = VersionedRefreshToken.for_user(user)
+    return Response({'refresh': str(rotated), 'access': str(rotated.access_token)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticatedAndActive])
+def logout_view(request):
+    """Revoke the access token used for this request and the given refresh token."""
+    refresh = _refresh_token(request.data.get('refresh') or '')
+    if refresh is not None and refresh.get(jwt_settings.USER_ID_CLAIM) == request.user.pk:
+        revocation.revoke_token(refresh)
+    if request.auth is not None:
+        revocation.revoke_token(request.auth)
+    return Response({'detail': 'Logged out.'})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticatedAndActive])
+def logout_all_view(request):
+    """Invalidate every token issued to the user by bumping their token_version."""
+    user = request.user
+    CustomUser.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    forget_user(user.pk, user.token_version, user.token_version + 1)
+    logger.info(f"User {user.email} logged out of all sessions.")
+    return Response({'detail': 'Logged out of all sessions.'})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedAndActive, IsAdminRole])
+def login_metrics_view(request):
+    """Queue depth and hash latency of the login password pool, plus revocation store stats."""
+    return Response({**get_pool().metrics(), 'revocation': revocation.get_store().metrics()})
+
 class UserDetailView(generics.RetrieveUpdateAPIView):
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.select_related('teacher_profile', 'student_profile')
     serializer_class = UserDetailSerializer # Use the new serializer
     permission_classes = [IsAuthenticatedAndActive]
 
     def get_object(self):
-        return self.request.user
+        # One joined query instead of lazy loads of both profile relations.
+        return self.get_queryset().get(pk=self.request.user.pk)
 
     def put(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -80,5 +168,24 @@ class ChangePasswordView(generics.UpdateAPIView):
         if not user.check_password(old_password):
             return Response({'old_password': 'Old password is incorrect'}, status=status.HTTP_400_BAD_REQUEST)
         user.set_password(serializer.validated_data['new_password'])
+        # save() also drops the cached copy used by CachedJWTAuthentication.
         user.save()
-        return Response({'detail': 'Password changed successfully'}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({'detail': 'Password changed successfully'}, status=status.HTTP_200_OK)
+
+
+class ProvisionUsersView(generics.GenericAPIView):
+    """
+    Admin-only bulk import of students and teachers. Same pipeline as the
+    ``provision_users`` management command, but passwords are hashed in the
+    request thread; use the command for imports that need a process pool.
+    """
+    serializer_class = ProvisionUsersSerializer
+    permission_classes = [IsAuthenticatedAndActive, IsAdminRole]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = provision_users(serializer.validated_data['rows'])
+        logger.info(f"Provisioned {report['created']} users ({report['timing']['users_per_second']} users/s).")
+        return Response(report, status=status.HTTP_201_CREATED)
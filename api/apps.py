@@ -0,0 +1,20 @@
+import atexit
+
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        from . import instrumentation
+        from .db_routers import install_query_counter
+        from .sqlite import apply_pragmas
+        connection_created.connect(install_query_counter, dispatch_uid='api.query_counter')
+        connection_created.connect(apply_pragmas, dispatch_uid='api.sqlite_pragmas')
+        if instrumentation.enabled():
+            connection_created.connect(instrumentation.install_query_timer, dispatch_uid='api.query_timer')
+            instrumentation.instrument_serializers()
+            atexit.register(instrumentation.flush)
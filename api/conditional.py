@@ -0,0 +1,47 @@
+"""
+ETag / Last-Modified support for GET endpoints.
+
+Views mixing in ``ConditionalGetMixin`` override ``get_validators()``: one
+aggregate query over the timestamps (and row counts) that determine the
+response body. Without an override the view answers as if the mixin were
+not there. Its result is hashed into the ETag and its newest timestamp
+becomes Last-Modified; when the request's If-None-Match / If-Modified-Since
+still match, a 304 is returned before any serialization happens.
+"""
+import hashlib
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    def get_validators(self):
+        """
+        Return a tuple of values that changes whenever the body would, or None
+        to skip validation (e.g. so a missing object still 404s). The default
+        never validates.
+        """
+        return None
+
+    def get(self, request, *args, **kwargs):
+        state = self.get_validators()
+        if state is None:
+            return super().get(request, *args, **kwargs)
+        # The path covers query parameters that shape the body.
+        digest = hashlib.md5(repr((request.get_full_path(), state)).encode()).hexdigest()
+        etag = f'"{digest}"'
+        stamps = [value for value in state if isinstance(value, datetime)]
+        last_modified = int(max(stamps).timestamp()) if stamps else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Bodies depend on who is asking.
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
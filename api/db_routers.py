@@ -0,0 +1,126 @@
+"""
+Primary/replica database routing.
+
+Replicas are extra entries in ``DATABASES`` listed in
+``settings.DATABASE_REPLICAS`` (see ``DB_REPLICAS`` in settings.py). Reads of
+the LMS apps go to a replica only while ``ReplicaRoutingMiddleware`` has
+marked the current request as replica-safe: a GET/HEAD/OPTIONS from a caller
+who has not written anything in the last ``REPLICA_STICKY_SECONDS``. Writes,
+reads in unsafe requests and everything outside a request (management
+commands, shell) use ``default``.
+
+Every connection also counts its queries per alias; ``query_counts()``
+returns the totals for this process.
+"""
+import hashlib
+import random
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+ROUTED_APPS = {'accounts', 'courses', 'assignments'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY = 'default'
+
+_replica_ok = ContextVar('replica_ok', default=False)
+_replica_used = ContextVar('replica_used', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def used_replica():
+    """Whether the current request has read from a replica so far."""
+    return _replica_used.get()
+
+
+def cache_timeout(timeout):
+    """
+    Cap ``timeout`` for values built from replica reads: a lagging replica
+    may return rows from before a write whose invalidation already ran, so
+    such entries must not outlive the replication window.
+    """
+    if used_replica():
+        return min(timeout, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+    return timeout
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS or not _replica_ok.get():
+            return PRIMARY
+        aliases = replicas()
+        if not aliases:
+            return PRIMARY
+        _replica_used.set(True)
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {PRIMARY, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, never migrated on their own.
+        return db not in replicas()
+
+
+def _caller_key(request):
+    """Identify the caller without authenticating: a hash of their credentials."""
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'db:sticky:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Allow replica reads for safe requests, except from callers who wrote
+    within the last ``REPLICA_STICKY_SECONDS``, so they read their own writes.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = _caller_key(request)
+        safe = request.method in SAFE_METHODS
+        replica_ok = bool(replicas()) and safe and not (key and cache.get(key))
+        ok_token = _replica_ok.set(replica_ok)
+        used_token = _replica_used.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_ok.reset(ok_token)
+            _replica_used.reset(used_token)
+        if not safe and key and replicas():
+            cache.set(key, True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+        return response
+
+
+_counts = {}
+_counts_lock = threading.Lock()
+
+
+def _count_query(execute, sql, params, many, context):
+    alias = context['connection'].alias
+    with _counts_lock:
+        _counts[alias] = _counts.get(alias, 0) + 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver: count every query run on ``connection``."""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def query_counts():
+    with _counts_lock:
+        return dict(_counts)
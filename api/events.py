@@ -0,0 +1,376 @@
+"""
+Server-sent events push channel.
+
+Clients open one long-lived ``GET /api/events/`` stream instead of polling
+the submission endpoints. Events are published to user ids:
+
+- ``submission.created`` to the course instructor,
+- ``submission.reviewed`` to the student
+
+(see assignments.notifications), once the write commits. ``publish`` fans an
+event out to every open stream of its user in this process through an
+in-process broker. With ``EVENTS_SPOOL_DIR`` set it also drops the events
+into that directory, which every process polls every
+``EVENTS_POLL_SECONDS`` for events published elsewhere. This is the local
+stand-in for a broadcast bus between worker processes; files expire after
+``EVENTS_SPOOL_TTL``.
+
+Under ASGI, ``EventStreamApp`` (api/asgi.py) serves the stream natively on
+the event loop, so an idle connection costs no thread. Under WSGI,
+``EventStreamView`` (api/views.py) streams from a worker thread and closes
+after ``EVENTS_MAX_SECONDS``; the client's EventSource reconnects. A
+comment line is sent every ``EVENTS_HEARTBEAT_SECONDS`` to keep proxies
+from closing idle streams. A stream that falls ``EVENTS_QUEUE_SIZE`` events
+behind is sent ``resync`` and closed. Events missed while disconnected are
+not replayed; clients catch up through the change feed (courses.changes).
+
+Browsers' EventSource cannot set headers, so both paths also accept the
+access token as ``?token=``.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+PATH = '/api/events/'
+CONTENT_TYPE = 'text/event-stream'
+HEARTBEAT = ': keepalive\n\n'
+RESYNC = 'event: resync\ndata: {}\n\n'
+
+# Names this process's events and spool files.
+_origin = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+_sequence = itertools.count(1)
+
+_subscribers = {}
+_lock = threading.Lock()
+_reader = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def spool_dir():
+    return _setting('EVENTS_SPOOL_DIR', None)
+
+
+class Subscription:
+    """One open stream: a bounded queue of the events of one user."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = self.make_queue(_setting('EVENTS_QUEUE_SIZE', 100))
+        self.overflowed = False
+
+    def make_queue(self, size):
+        return queue.Queue(maxsize=size)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def close(self):
+        unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """A stream served on an event loop; ``deliver`` may be called from any thread."""
+
+    def __init__(self, user_id, loop):
+        self.loop = loop
+        super().__init__(user_id)
+
+    def make_queue(self, size):
+        return asyncio.Queue(maxsize=size)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+def subscribe(subscription):
+    with _lock:
+        _subscribers.setdefault(subscription.user_id, set()).add(subscription)
+    _start_spool_reader()
+
+
+def unsubscribe(subscription):
+    with _lock:
+        streams = _subscribers.get(subscription.user_id)
+        if streams is not None:
+            streams.discard(subscription)
+            if not streams:
+                del _subscribers[subscription.user_id]
+
+
+def subscriber_count():
+    with _lock:
+        return sum(len(streams) for streams in _subscribers.values())
+
+
+def event(user_id, kind, data):
+    return {'user': user_id, 'type': kind, 'data': data}
+
+
+def _fan_out(events):
+    with _lock:
+        targets = [(subscription, item) for item in events
+                   for subscription in _subscribers.get(item['user'], ())]
+    for subscription, item in targets:
+        subscription.deliver(item)
+
+
+def publish(events):
+    """Send ``events`` (see ``event``) to their users' streams in every process."""
+    events = [dict(item, id=f'{_origin}-{next(_sequence)}') for item in events]
+    if not events:
+        return
+    _fan_out(events)
+    _spool_write(events)
+
+
+def publish_on_commit(events):
+    """``publish`` once the surrounding transaction commits (at once outside one)."""
+    if events:
+        transaction.on_commit(lambda: publish(events))
+
+
+def _spool_write(events):
+    directory = spool_dir()
+    if not directory:
+        return
+    # The timestamp prefix orders the files and drives expiry.
+    name = f'{time.time_ns():020d}-{_origin}-{events[0]["id"].rsplit("-", 1)[1]}.json'
+    temporary = os.path.join(directory, f'.{name}.tmp')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(temporary, 'w') as stream:
+            json.dump(events, stream, cls=DjangoJSONEncoder)
+        os.replace(temporary, os.path.join(directory, name))
+    except OSError as exc:
+        # Runs after the commit; the write stands and other processes' streams miss these events.
+        logger.warning(f"Could not spool {len(events)} events to {directory}: {exc}")
+
+
+def _spool_names(directory):
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+
+
+def read_spool(seen):
+    """
+    One pass over the spool: fan out the files of other processes not in
+    ``seen`` (which is updated) and delete expired files.
+    """
+    directory = spool_dir()
+    if not directory:
+        return
+    cutoff = time.time_ns() - int(_setting('EVENTS_SPOOL_TTL', 60) * 1e9)
+    names = _spool_names(directory)
+    for name in names:
+        path = os.path.join(directory, name)
+        if int(name.split('-', 1)[0]) < cutoff:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Another process expired it first.
+            continue
+        if name in seen:
+            continue
+        seen.add(name)
+        if f'-{_origin}-' in name:
+            continue  # Already delivered by publish().
+        try:
+            with open(path) as stream:
+                events = json.load(stream)
+        except (OSError, ValueError):
+            continue
+        _fan_out(events)
+    seen.intersection_update(names)
+
+
+def _read_spool_forever():
+    # Start from now: older files were for streams that existed before this process.
+    seen = set(_spool_names(spool_dir()))
+    while True:
+        time.sleep(_setting('EVENTS_POLL_SECONDS', 1))
+        read_spool(seen)
+
+
+def _start_spool_reader():
+    global _reader
+    if _reader is not None or not spool_dir():
+        return
+    with _lock:
+        if _reader is None:
+            _reader = threading.Thread(target=_read_spool_forever, name='events-spool', daemon=True)
+            _reader.start()
+
+
+def frame(item):
+    data = json.dumps(item['data'], cls=DjangoJSONEncoder)
+    return f"id: {item['id']}\nevent: {item['type']}\ndata: {data}\n\n"
+
+
+def preamble():
+    return f"retry: {_setting('EVENTS_RETRY_MS', 3000)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = CONTENT_TYPE
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error bodies; streams are written by stream_response().
+        return f"event: error\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+STREAM_HEADERS = (('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no'))
+
+
+def _stream(user_id, timeout):
+    subscription = Subscription(user_id)
+    subscribe(subscription)
+    try:
+        yield preamble()
+        heartbeat = _setting('EVENTS_HEARTBEAT_SECONDS', 15)
+        deadline = time.monotonic() + timeout
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                item = subscription.queue.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield HEARTBEAT
+            else:
+                yield frame(item)
+        yield RESYNC
+    finally:
+        subscription.close()
+
+
+def stream_response(user_id, timeout):
+    """WSGI streaming response for ``user_id``'s events, closed after ``timeout`` seconds."""
+    response = StreamingHttpResponse(_stream(user_id, timeout), content_type=CONTENT_TYPE)
+    for header, value in STREAM_HEADERS:
+        response[header] = value
+    return response
+
+
+def user_for_token(raw_token):
+    """The active user of an access token, or None."""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from accounts.authentication import CachedJWTAuthentication
+
+    authentication = CachedJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    finally:
+        close_old_connections()
+
+
+def _token(scope):
+    for name, value in scope.get('headers', ()):
+        if name.lower() == b'authorization':
+            parts = value.decode('latin1').split()
+            if len(parts) == 2 and parts[0].lower() == 'bearer':
+                return parts[1]
+    query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+    return query.get('token', [None])[0]
+
+
+async def _reply(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), *headers]})
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def _until_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def serve(scope, receive, send):
+    """The event stream as a native ASGI response; runs until the client disconnects."""
+    if scope['method'] != 'GET':
+        return await _reply(send, 405, {'detail': f'Method "{scope["method"]}" not allowed.'},
+                            [(b'allow', b'GET')])
+    token = _token(scope)
+    user = await sync_to_async(user_for_token)(token) if token else None
+    if user is None:
+        return await _reply(send, 401, {'detail': 'Authentication credentials were not provided.'},
+                            [(b'www-authenticate', b'Bearer realm="api"')])
+
+    subscription = AsyncSubscription(user.pk, asyncio.get_running_loop())
+    subscribe(subscription)
+    disconnected = asyncio.ensure_future(_until_disconnect(receive))
+    getter = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', CONTENT_TYPE.encode()),
+            *((name.lower().encode(), value.encode()) for name, value in STREAM_HEADERS),
+        ]})
+        await send({'type': 'http.response.body', 'body': preamble().encode(), 'more_body': True})
+        heartbeat = _setting('EVENTS_HEARTBEAT_SECONDS', 15)
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=heartbeat,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                return
+            if subscription.overflowed:
+                await send({'type': 'http.response.body', 'body': RESYNC.encode()})
+                return
+            if getter in done:
+                body, getter = frame(getter.result()), None
+            else:
+                body = HEARTBEAT
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+    finally:
+        subscription.close()
+        for task in (getter, disconnected):
+            if task is not None:
+                task.cancel()
+
+
+class EventStreamApp:
+    """ASGI application serving ``PATH`` itself and everything else through ``application``."""
+
+    def __init__(self, application, path=PATH):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            return await serve(scope, receive, send)
+        return await self.application(scope, receive, send)
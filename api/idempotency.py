@@ -0,0 +1,102 @@
+"""
+``Idempotency-Key`` support for create endpoints.
+
+A client that may retry a POST sends a unique ``Idempotency-Key`` header.
+The first request claims the key by inserting an ``IdempotencyKey`` row (the
+unique constraint decides races, no pre-check query), runs, and stores its
+response; any retry with the same key replays that response instead of
+running again. Reusing a key for a different request is refused with 422,
+and a retry that arrives while the first is still running gets 409.
+
+Keys are scoped to the user and expire after ``IDEMPOTENCY_KEY_TTL`` seconds.
+A claim without a stored response is a lease: after
+``IDEMPOTENCY_CLAIM_LEASE`` seconds it is taken to belong to a worker that
+died mid-request, and a retry claims the key again.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+IDEMPOTENCY_CLAIM_LEASE = getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', 60)
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Mix into a view handling POST (usually a CreateAPIView); requests without
+    the header are unaffected.
+    """
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().post(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'detail': f'{HEADER} must be at most 255 characters.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        record, replay = self.claim(request, key, fingerprint(request))
+        if replay is not None:
+            return replay
+        try:
+            response = super().post(request, *args, **kwargs)
+        except Exception:
+            # Nothing was created; let a retry run again.
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            # An UPDATE rather than save(): a retry may have taken over the
+            # claim if this request outlived its lease.
+            IdempotencyKey.objects.filter(pk=record.pk).update(status_code=response.status_code,
+                                                               response_body=response.data)
+        return response
+
+    def claim(self, request, key, digest):
+        """Return (claimed record, None) or (None, response to send instead)."""
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(user=request.user, key=key, fingerprint=digest), None
+            except IntegrityError:
+                pass
+            existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if existing is None:
+                continue
+            age = timezone.now() - existing.created_at
+            if age > timedelta(seconds=IDEMPOTENCY_KEY_TTL):
+                existing.delete()
+                continue
+            if existing.status_code is None and age > timedelta(seconds=IDEMPOTENCY_CLAIM_LEASE):
+                # Abandoned; the condition keeps a claim that just completed.
+                IdempotencyKey.objects.filter(pk=existing.pk, status_code=None).delete()
+                continue
+            return None, self.replay(existing, digest)
+        return None, Response({'detail': f'Could not claim {HEADER}; retry.'}, status=status.HTTP_409_CONFLICT)
+
+    def replay(self, record, digest):
+        if record.fingerprint != digest:
+            return Response({'detail': f'{HEADER} was already used for a different request.'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status_code is None:
+            return Response({'detail': f'A request with this {HEADER} is still being processed.'},
+                            status=status.HTTP_409_CONFLICT)
+        response = Response(record.response_body, status=record.status_code)
+        response['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,342 @@
+"""
+Per-endpoint request metrics.
+
+``InstrumentationMiddleware`` records, for every request, keyed by the
+resolved URL name and method:
+
+- latency, DB query count and response size histograms,
+- total DB time and serializer time (``BaseSerializer.data``),
+- a request counter per status code.
+
+Each thread writes only to its own aggregate, so recording takes no lock;
+``snapshot()`` sums the threads' aggregates when metrics are read. The
+aggregates of finished threads are folded into one, so thread-per-connection
+servers do not accumulate them. With
+``METRICS_DIR`` set, every process also dumps its snapshot into that
+directory every ``METRICS_FLUSH_SECONDS`` and ``collect()`` merges all the
+files, so the endpoint reports totals across worker processes. Delete the
+directory's files to reset. Flushing never fails a request: errors are
+logged.
+
+``render()`` formats the merged totals in the Prometheus text format; see
+``metrics_view`` in api/views.py.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+HISTOGRAMS = (
+    ('latency', 'lms_http_request_duration_seconds', 'Request latency in seconds.', LATENCY_BUCKETS),
+    ('queries', 'lms_http_request_db_queries', 'Database queries per request.', QUERY_BUCKETS),
+    ('bytes', 'lms_http_response_bytes', 'Response body size in bytes.', BYTES_BUCKETS),
+)
+TOTALS = (
+    ('db_seconds', 'lms_http_db_seconds_total', 'Time spent in database queries.'),
+    ('serializer_seconds', 'lms_http_serializer_seconds_total', 'Time spent building serializer data.'),
+)
+
+logger = logging.getLogger(__name__)
+
+# The metrics of the request running in this context, or None.
+_current = ContextVar('request_metrics', default=None)
+
+_local = threading.local()
+# (thread, aggregate) of every live thread that has recorded a request.
+_aggregates = []
+# Totals of the threads that have finished.
+_retired = {}
+_register_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_process = {'pid': None, 'id': None}
+_last_flush = [time.monotonic()]
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_seconds', 'serializer_seconds', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+
+def _new_series():
+    series = {'status': {}, 'db_seconds': 0.0, 'serializer_seconds': 0.0}
+    for field, _, _, buckets in HISTOGRAMS:
+        # Per-bucket (not cumulative) counts, the overflow bucket last, then the sum.
+        series[field] = [0] * (len(buckets) + 1)
+        series[f'{field}_sum'] = 0
+    return series
+
+
+def process_id():
+    """Names this process's file in ``METRICS_DIR``; computed after fork, not at import."""
+    pid = os.getpid()
+    if _process['pid'] != pid:
+        _process.update(pid=pid, id=f'{pid}-{int(time.time())}')
+    return _process['id']
+
+
+def reset():
+    """Forget this process's totals (tests; a forked child drops its parent's)."""
+    global _local
+    with _register_lock:
+        _aggregates.clear()
+        _retired.clear()
+        _local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset)
+
+
+def _reap():
+    """Fold the aggregates of finished threads into ``_retired``; call with ``_register_lock`` held."""
+    live = []
+    for thread, aggregate in _aggregates:
+        if thread.is_alive():
+            live.append((thread, aggregate))
+        else:
+            _merge_into(_retired, aggregate)
+    _aggregates[:] = live
+
+
+def _thread_aggregate():
+    aggregate = getattr(_local, 'aggregate', None)
+    if aggregate is None:
+        aggregate = _local.aggregate = {}
+        with _register_lock:
+            _reap()
+            _aggregates.append((threading.current_thread(), aggregate))
+    return aggregate
+
+
+def record(endpoint, method, status, seconds, metrics, size):
+    key = f'{endpoint}|{method}'
+    aggregate = _thread_aggregate()
+    series = aggregate.get(key)
+    if series is None:
+        series = aggregate[key] = _new_series()
+    for field, value, buckets in (('latency', seconds, LATENCY_BUCKETS), ('queries', metrics.queries, QUERY_BUCKETS),
+                                  ('bytes', size, BYTES_BUCKETS)):
+        series[field][bisect_left(buckets, value)] += 1
+        series[f'{field}_sum'] += value
+    series['db_seconds'] += metrics.db_seconds
+    series['serializer_seconds'] += metrics.serializer_seconds
+    status = str(status)
+    series['status'][status] = series['status'].get(status, 0) + 1
+    _maybe_flush()
+
+
+def _merge_into(total, snapshot):
+    for key, series in snapshot.items():
+        merged = total.get(key)
+        if merged is None:
+            merged = total[key] = _new_series()
+        for name, value in series.items():
+            if name == 'status':
+                for status, count in value.items():
+                    merged['status'][status] = merged['status'].get(status, 0) + count
+            elif isinstance(value, list):
+                merged[name] = [a + b for a, b in zip(merged[name], value)]
+            else:
+                merged[name] += value
+    return total
+
+
+def snapshot():
+    """This process's totals, summed over its threads."""
+    with _register_lock:
+        _reap()
+        total = _merge_into({}, _retired)
+        aggregates = [aggregate for _, aggregate in _aggregates]
+    for aggregate in aggregates:
+        # Copy first: the owning thread may add a key meanwhile.
+        _merge_into(total, {key: dict(series, status=dict(series['status']))
+                            for key, series in list(aggregate.items())})
+    return total
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def flush():
+    """Write this process's snapshot to ``METRICS_DIR`` (atomically replaced); errors are logged."""
+    directory = _metrics_dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f'{process_id()}.json')
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(temporary, 'w') as stream:
+            json.dump(snapshot(), stream)
+        os.replace(temporary, path)
+    except OSError:
+        logger.warning('Could not write request metrics to %s', directory, exc_info=True)
+
+
+def _maybe_flush():
+    if not _metrics_dir() or not _flush_lock.acquire(blocking=False):
+        return  # Another thread is flushing.
+    try:
+        now = time.monotonic()
+        if now - _last_flush[0] >= getattr(settings, 'METRICS_FLUSH_SECONDS', 10):
+            _last_flush[0] = now
+            flush()
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    """Totals across every process that shares ``METRICS_DIR`` (live figures for this one)."""
+    total = {}
+    directory = _metrics_dir()
+    if directory and os.path.isdir(directory):
+        own = f'{process_id()}.json'
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(directory, name)) as stream:
+                    _merge_into(total, json.load(stream))
+            except (OSError, ValueError):
+                continue  # Removed or half-written; the next scrape gets it.
+    return _merge_into(total, snapshot())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(endpoint, method, **extra):
+    pairs = {'endpoint': endpoint, 'method': method, **extra}
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs.items()) + '}'
+
+
+def render(totals):
+    """Prometheus text exposition (format 0.0.4) of ``totals``."""
+    rows = sorted((key.split('|', 1), series) for key, series in totals.items())
+    lines = ['# HELP lms_http_requests_total Requests served.', '# TYPE lms_http_requests_total counter']
+    for (endpoint, method), series in rows:
+        for status, count in sorted(series['status'].items()):
+            lines.append(f'lms_http_requests_total{_labels(endpoint, method, status=status)} {count}')
+
+    for field, metric, help_text, buckets in HISTOGRAMS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for (endpoint, method), series in rows:
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), series[field]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{_labels(endpoint, method, le=bound)} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(endpoint, method)} {series[f"{field}_sum"]}')
+            lines.append(f'{metric}_count{_labels(endpoint, method)} {cumulative}')
+
+    for field, metric, help_text in TOTALS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for (endpoint, method), series in rows:
+            lines.append(f'{metric}{_labels(endpoint, method)} {series[field]:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper; charges the query to the current request, if any."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def instrument_serializers():
+    """Time ``BaseSerializer.data``; nested serializers count once, in their parent."""
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+
+    def timed_data(serializer):
+        metrics = _current.get()
+        if metrics is None:
+            return data.fget(serializer)
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_seconds += time.perf_counter() - started
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+class InstrumentationMiddleware:
+    """Record every request's metrics under its URL name (``<unresolved>`` for 404s)."""
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        match = request.resolver_match
+        endpoint = match.view_name if match is not None and match.url_name else '<unresolved>'
+        if response.streaming:
+            # Body size and latency are only known once the stream is consumed.
+            response.streaming_content = self._counted(response.streaming_content, endpoint, request.method,
+                                                       response.status_code, started, metrics)
+        else:
+            record(endpoint, request.method, response.status_code, time.perf_counter() - started, metrics,
+                   len(response.content))
+        return response
+
+    def _counted(self, chunks, endpoint, method, status, started, metrics):
+        # Queries run while the body streams are charged to the request too.
+        size = 0
+        token = _current.set(metrics)
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:  # Closed from another context.
+                _current.set(None)
+            record(endpoint, method, status, time.perf_counter() - started, metrics, size)
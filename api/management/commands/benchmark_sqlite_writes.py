@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+# (name, settings overrides). "stock" is Django's default SQLite setup.
+PROFILES = (
+    ('stock', {'SQLITE_PRAGMAS': {}, 'SQLITE_SERIALIZE_WRITES': False}),
+    ('tuned', {}),
+)
+
+
+class Command(BaseCommand):
+    help = ('Measure sustained concurrent submit throughput with stock SQLite settings and with the tuned '
+            'profile (pragmas + serialized writes), using the run_benchmark submit scenario.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=400, help='Submissions per profile.')
+        parser.add_argument('--domain', default='synthetic.lms')
+        parser.add_argument('--password', default='synthetic-pass')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite.')
+
+        report = {}
+        for name, overrides in PROFILES:
+            self.stderr.write(f"profile {name} ...")
+            with override_settings(**overrides):
+                # New connections pick up the profile's pragmas. WAL persists
+                # in the file, so the stock run switches it back explicitly.
+                connections.close_all()
+                if name == 'stock':
+                    with connection.cursor() as cursor:
+                        cursor.execute('PRAGMA journal_mode = DELETE')
+                report[name] = self.run_submit(options)
+                connections.close_all()
+
+        stock, tuned = report['stock'], report['tuned']
+        if stock['throughput_rps'] and tuned['throughput_rps']:
+            report['speedup'] = round(tuned['throughput_rps'] / stock['throughput_rps'], 2)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                stream.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_submit(self, options):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            call_command('run_benchmark', endpoints='submit', clients=options['clients'],
+                         requests=options['requests'], domain=options['domain'],
+                         password=options['password'], output=path, stderr=self.stderr)
+            with open(path) as stream:
+                return json.load(stream)['endpoints']['submit']
+        finally:
+            os.unlink(path)
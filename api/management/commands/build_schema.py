@@ -0,0 +1,27 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import schema
+
+
+class Command(BaseCommand):
+    help = ('Render the OpenAPI schema once into versioned JSON/YAML artifacts (plus gzip copies) that '
+            'the schema endpoint serves instead of generating it per request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', help='Defaults to settings.SCHEMA_DIR.')
+        parser.add_argument('--keep', type=int, default=3, help='Number of builds to keep, including this one.')
+
+    def handle(self, *args, **options):
+        directory = options['output_dir'] or schema.schema_dir()
+        started = time.perf_counter()
+        manifest = schema.build(directory, keep=max(1, options['keep']))
+        elapsed = time.perf_counter() - started
+        for kind, name in manifest['files'].items():
+            size = os.path.getsize(os.path.join(directory, name))
+            self.stdout.write(f"  {name}: {size} bytes")
+        self.stdout.write(self.style.SUCCESS(
+            f"Built schema {manifest['version']} ({manifest['hash']}) in {elapsed:.2f}s into {directory}"
+        ))
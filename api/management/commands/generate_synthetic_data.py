@@ -0,0 +1,144 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser, StudentProfile, TeacherProfile
+from assignments import counters
+from assignments.models import Assignment, Submission
+from courses import changes, response_cache
+from courses.models import Course, Enrollment
+
+
+class Command(BaseCommand):
+    help = 'Build a synthetic dataset (users, courses, enrollments, assignments, submissions) with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--courses-per-teacher', type=int, default=4)
+        parser.add_argument('--enrollments-per-course', type=int, default=100)
+        parser.add_argument('--assignments-per-course', type=int, default=10)
+        parser.add_argument('--submission-rate', type=float, default=0.7,
+                            help='Fraction of enrolled students who submit each assignment.')
+        parser.add_argument('--review-rate', type=float, default=0.5,
+                            help='Fraction of submissions already reviewed.')
+        parser.add_argument('--domain', default='synthetic.lms',
+                            help='Email domain of generated users; also identifies them for --clear.')
+        parser.add_argument('--password', default='synthetic-pass',
+                            help='Password shared by every generated user (hashed once).')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true', help='Delete users of --domain (and their data) first.')
+
+    def stage(self, label, started):
+        elapsed = time.perf_counter() - started
+        self.timings[label] = round(elapsed, 3)
+        self.stdout.write(f"  {label}: {elapsed:.2f}s")
+        return time.perf_counter()
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        domain = options['domain']
+        batch = options['batch_size']
+        self.timings = {}
+        started = total_started = time.perf_counter()
+
+        if options['clear']:
+            CustomUser.objects.filter(email__endswith=f'@{domain}').delete()
+            started = self.stage('clear', started)
+        elif CustomUser.objects.filter(email__endswith=f'@{domain}').exists():
+            raise CommandError(f"Users @{domain} already exist; pass --clear or a different --domain.")
+
+        # One hash for everyone: per-user PBKDF2 would dominate the run.
+        password = make_password(options['password'])
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(
+                [CustomUser(email=f'teacher{n}@{domain}', role='TEACHER', password=password,
+                            first_name='Teacher', last_name=str(n), department='Synthetic')
+                 for n in range(options['teachers'])]
+                + [CustomUser(email=f'student{n}@{domain}', role='STUDENT', password=password,
+                              first_name='Student', last_name=str(n), major='Synthetic')
+                   for n in range(options['students'])],
+                batch_size=batch,
+            )
+            users = CustomUser.objects.filter(email__endswith=f'@{domain}')
+            teachers = list(users.filter(role='TEACHER').values_list('id', flat=True))
+            students = list(users.filter(role='STUDENT').values_list('id', flat=True))
+            TeacherProfile.objects.bulk_create([TeacherProfile(user_id=pk) for pk in teachers], batch_size=batch)
+            StudentProfile.objects.bulk_create([StudentProfile(user_id=pk) for pk in students], batch_size=batch)
+            started = self.stage('users', started)
+
+            per_course = min(options['enrollments_per_course'], len(students))
+            # Enrollments are bulk-inserted below, so seed the seat counter here.
+            Course.objects.bulk_create(
+                [Course(instructor_id=teacher, title=f'Synthetic course {teacher}.{n}',
+                        description='Generated for load testing. ' * 8, enrollment_count=per_course)
+                 for teacher in teachers for n in range(options['courses_per_teacher'])],
+                batch_size=batch,
+            )
+            courses = list(Course.objects.filter(instructor_id__in=teachers).values_list('id', flat=True))
+            started = self.stage('courses', started)
+
+            rosters = {course: rng.sample(students, per_course) for course in courses}
+            Enrollment.objects.bulk_create(
+                [Enrollment(course_id=course, student_id=student)
+                 for course, roster in rosters.items() for student in roster],
+                batch_size=batch,
+            )
+            started = self.stage('enrollments', started)
+
+            now = timezone.now()
+            Assignment.objects.bulk_create(
+                [Assignment(course_id=course, title=f'Assignment {n}', description='Answer the questions. ' * 8,
+                            due_date=now + timedelta(days=rng.randint(-30, 30)))
+                 for course in courses for n in range(options['assignments_per_course'])],
+                batch_size=batch,
+            )
+            assignments = list(Assignment.objects.filter(course_id__in=courses).values_list('id', 'course_id'))
+            started = self.stage('assignments', started)
+
+            submissions = []
+            for assignment, course in assignments:
+                roster = rosters[course]
+                for student in rng.sample(roster, int(len(roster) * options['submission_rate'])):
+                    reviewed = rng.random() < options['review_rate']
+                    submissions.append(Submission(
+                        assignment_id=assignment, student_id=student,
+                        content='Synthetic answer. ' * rng.randint(5, 60),
+                        status='reviewed' if reviewed else 'submitted',
+                        feedback='Looks good.' if reviewed else None,
+                        reviewed_at=now if reviewed else None,
+                    ))
+                if len(submissions) >= batch:
+                    Submission.objects.bulk_create(submissions, batch_size=batch)
+                    submissions = []
+            Submission.objects.bulk_create(submissions, batch_size=batch)
+            started = self.stage('submissions', started)
+            # bulk_create skips the counter signals.
+            counters.recount(course_ids=courses)
+            started = self.stage('counters', started)
+            # ... and the change log.
+            changes.seed(course_ids=courses)
+            started = self.stage('change log', started)
+            # New courses get fresh versions; only the cached catalog is stale.
+            response_cache.bump_catalog()
+
+        total = time.perf_counter() - total_started
+        counts = {
+            'teachers': len(teachers),
+            'students': len(students),
+            'courses': len(courses),
+            'enrollments': Enrollment.objects.filter(course_id__in=courses).count(),
+            'assignments': len(assignments),
+            'submissions': Submission.objects.filter(assignment__course_id__in=courses).count(),
+        }
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {rows} rows in {total:.2f}s ({rows / total:.0f} rows/s): "
+            + ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import profile_dir
+
+
+class Command(BaseCommand):
+    help = ('List, show or diff the request profiles written by ProfilingMiddleware: '
+            '"profiles list", "profiles show <id>", "profiles diff <old id> <new id>".')
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+        listing = actions.add_parser('list', help='Newest profiles first.')
+        listing.add_argument('--endpoint', help='Only profiles of this URL name.')
+        listing.add_argument('--limit', type=int, default=20)
+        show = actions.add_parser('show', help='Top functions and SQL of one profile.')
+        show.add_argument('profile')
+        show.add_argument('--limit', type=int, default=15)
+        show.add_argument('--sort', default='cumulative', choices=('cumulative', 'tottime', 'ncalls'))
+        diff = actions.add_parser('diff', help='Where the time moved between two profiles.')
+        diff.add_argument('old')
+        diff.add_argument('new')
+        diff.add_argument('--limit', type=int, default=15)
+
+    def handle(self, *args, **options):
+        self.directory = profile_dir()
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def summary(self, profile_id):
+        path = os.path.join(self.directory, f'{profile_id}.json')
+        if not os.path.exists(path):
+            raise CommandError(f'No profile {profile_id!r} in {self.directory}.')
+        with open(path) as stream:
+            return json.load(stream)
+
+    def stats(self, profile_id, stream=None):
+        return pstats.Stats(os.path.join(self.directory, f'{profile_id}.prof'), stream=stream)
+
+    def handle_list(self, options):
+        if not os.path.isdir(self.directory):
+            raise CommandError(f'{self.directory} does not exist; no profiles yet.')
+        ids = sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')), reverse=True)
+        shown = 0
+        for profile_id in ids:
+            summary = self.summary(profile_id)
+            if options['endpoint'] and summary['endpoint'] != options['endpoint']:
+                continue
+            self.stdout.write(
+                f"{profile_id}  {summary['method']} {summary['path']}  {summary['status']}  "
+                f"{summary['duration_ms']:.1f} ms  {summary['queries']} queries ({summary['sql_ms']:.1f} ms)  "
+                f"[{summary['trigger']}]"
+            )
+            shown += 1
+            if shown >= options['limit']:
+                break
+
+    def handle_show(self, options):
+        summary = self.summary(options['profile'])
+        self.stdout.write(f"{summary['method']} {summary['path']} -> {summary['status']} in "
+                          f"{summary['duration_ms']:.1f} ms, {summary['queries']} queries ({summary['sql_ms']:.1f} ms)")
+        self.stdout.write('\nSQL by total time:')
+        for group in summary['sql'][:options['limit']]:
+            self.stdout.write(f"  {group['total_ms']:9.3f} ms  x{group['count']:<4} {group['sql'][:160]}")
+        # pstats writes fragments; self.stdout would end each with a newline.
+        report = io.StringIO()
+        self.stats(options['profile'], report).sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(report.getvalue())
+
+    def handle_diff(self, options):
+        old, new = self.summary(options['old']), self.summary(options['new'])
+        self.stdout.write(f"duration {old['duration_ms']:.1f} -> {new['duration_ms']:.1f} ms, "
+                          f"queries {old['queries']} -> {new['queries']}, "
+                          f"SQL {old['sql_ms']:.1f} -> {new['sql_ms']:.1f} ms")
+
+        before, after = self.stats(options['old']).stats, self.stats(options['new']).stats
+        rows = []
+        for function in set(before) | set(after):
+            # pstats rows: (primitive calls, calls, own time, cumulative time, callers)
+            old_row, new_row = before.get(function, (0, 0, 0.0, 0.0)), after.get(function, (0, 0, 0.0, 0.0))
+            rows.append((new_row[3] - old_row[3], new_row[2] - old_row[2], new_row[1] - old_row[1], function))
+        rows.sort(key=lambda row: abs(row[0]), reverse=True)
+        self.stdout.write('\nFunctions by change in cumulative time (ms):')
+        self.stdout.write(f"  {'cumulative':>10} {'own':>9} {'calls':>7}  function")
+        for cumulative, own, calls, (filename, line, name) in rows[:options['limit']]:
+            self.stdout.write(f"  {cumulative * 1000:+10.3f} {own * 1000:+9.3f} {calls:+7d}  "
+                              f"{name} ({os.path.basename(filename)}:{line})")
+
+        old_sql = {group['sql']: group for group in old['sql']}
+        new_sql = {group['sql']: group for group in new['sql']}
+        changes = []
+        for sql in set(old_sql) | set(new_sql):
+            was, now = old_sql.get(sql, {'count': 0, 'total_ms': 0.0}), new_sql.get(sql, {'count': 0, 'total_ms': 0.0})
+            if was['count'] != now['count'] or was['total_ms'] != now['total_ms']:
+                changes.append((now['total_ms'] - was['total_ms'], now['count'] - was['count'], sql))
+        changes.sort(key=lambda change: abs(change[0]), reverse=True)
+        self.stdout.write('\nSQL by change in total time (ms):')
+        for total, count, sql in changes[:options['limit']]:
+            self.stdout.write(f"  {total:+9.3f}  {count:+4d}x  {sql[:160]}")
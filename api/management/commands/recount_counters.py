@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.sqlite import serialized_write
+from assignments import counters
+from courses import response_cache
+
+
+class Command(BaseCommand):
+    help = ('Recompute the denormalized enrollment, submission and review counters on every course and '
+            'assignment from the underlying rows, repairing any drift.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only recount this course id (repeatable).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with serialized_write():
+            drift = counters.recount(course_ids=options['courses'])
+        # Cached responses of the repaired courses carry the wrong numbers.
+        stale = set(drift['courses']) | {course_id for _, course_id in drift['assignments']}
+        for course_id in stale:
+            response_cache.bump_course(course_id, catalog=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted in {time.perf_counter() - started:.2f}s: {len(drift['courses'])} course(s) and "
+            f"{len(drift['assignments'])} assignment(s) had drifted."
+        ))
@@ -0,0 +1,244 @@
+import json
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.authentication import VersionedRefreshToken
+from accounts.models import CustomUser
+from assignments.models import Assignment, Submission
+from courses.models import Course, Enrollment
+
+SCENARIOS = ('login', 'course_list', 'course_detail', 'assignment_list', 'submit', 'review', 'review_bulk')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+class Command(BaseCommand):
+    help = ('Drive the main endpoints with concurrent in-process clients and report latency percentiles, '
+            'throughput and query counts per endpoint as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--endpoints', default=','.join(SCENARIOS),
+                            help=f"Comma-separated subset of: {', '.join(SCENARIOS)}.")
+        parser.add_argument('--domain', default='synthetic.lms', help='Email domain of the synthetic users.')
+        parser.add_argument('--password', default='synthetic-pass', help='Password of the synthetic users.')
+        parser.add_argument('--review-batch', type=int, default=50,
+                            help='Submissions per request in the review_bulk scenario.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.local = threading.local()
+        self.prepare_fixtures()
+
+        report = {
+            'meta': {
+                'started_at': datetime.now(dt_timezone.utc).isoformat(),
+                'clients': options['clients'],
+                'requests_per_endpoint': options['requests'],
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'dataset': {
+                    'users': CustomUser.objects.count(),
+                    'courses': Course.objects.count(),
+                    'enrollments': Enrollment.objects.count(),
+                    'assignments': Assignment.objects.count(),
+                    'submissions': Submission.objects.count(),
+                },
+            },
+            'endpoints': {},
+        }
+        for name in scenarios:
+            self.stderr.write(f"benchmarking {name} ...")
+            report['endpoints'][name] = self.run_scenario(name)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                stream.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def prepare_fixtures(self):
+        domain = self.options['domain']
+        self.students = list(CustomUser.objects.filter(email__endswith=f'@{domain}', role='STUDENT')[:500])
+        if not self.students:
+            raise CommandError(f"No users @{domain}; run generate_synthetic_data first.")
+        self.courses = list(
+            Course.objects.filter(instructor__email__endswith=f'@{domain}')
+            .annotate(assignment_total=Count('assignments')).filter(assignment_total__gt=0)
+            .select_related('instructor')[:50]
+        )
+        self.enrollments = list(
+            Enrollment.objects.filter(course__in=self.courses).values_list('student_id', 'course_id')[:2000]
+        )
+        self.assignments = list(Assignment.objects.filter(course__in=self.courses).values_list('id', 'course_id'))
+        by_course = {}
+        for assignment, course in self.assignments:
+            by_course.setdefault(course, []).append(assignment)
+        submitted = set(
+            Submission.objects.filter(assignment__course__in=self.courses).values_list('student_id', 'assignment_id')
+        )
+        # Each submit request needs its own (student, assignment) pair.
+        self.open_pairs = [
+            (student, assignment)
+            for student, course in self.enrollments
+            for assignment in by_course.get(course, [])
+            if (student, assignment) not in submitted
+        ]
+        self.rng.shuffle(self.open_pairs)
+        pending = list(
+            Submission.objects.filter(assignment__course__in=self.courses, status='submitted')
+            .order_by('assignment_id', 'id')
+            .values_list('id', 'assignment_id', 'assignment__course__instructor_id')
+        )
+        # Single reviews and bulk reviews draw from disjoint submissions.
+        self.pending_reviews = [(pk, teacher) for pk, _, teacher in pending[:self.options['requests']]]
+        self.review_batches = []
+        batch_size = self.options['review_batch']
+        for pk, assignment, teacher in pending[self.options['requests']:]:
+            last = self.review_batches[-1] if self.review_batches else None
+            if last is None or last[0] != assignment or len(last[2]) >= batch_size:
+                last = (assignment, teacher, [])
+                self.review_batches.append(last)
+            last[2].append(pk)
+        # Tokens are minted directly; the login scenario measures the real login path.
+        user_ids = {s.pk for s in self.students} | {c.instructor_id for c in self.courses}
+        user_ids |= {student for student, _ in self.enrollments}
+        users = CustomUser.objects.in_bulk(user_ids)
+        self.tokens = {pk: str(VersionedRefreshToken.for_user(user).access_token) for pk, user in users.items()}
+        self.pair_lock = threading.Lock()
+
+    def client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            # Record server errors (e.g. "database is locked") as 500s instead of raising.
+            client = self.local.client = APIClient(HTTP_HOST='localhost', raise_request_exception=False)
+        return client
+
+    def next_item(self, items):
+        with self.pair_lock:
+            return items.pop() if items else None
+
+    def request_for(self, name):
+        """Return (method, url, user_id or None, data) for one request of ``name``."""
+        if name == 'login':
+            student = self.rng.choice(self.students)
+            return 'post', '/api/accounts/login/', None, {'email': student.email, 'password': self.options['password']}
+        if name == 'course_list':
+            return 'get', '/api/courses/create/', self.rng.choice(self.students).pk, None
+        if name == 'course_detail':
+            course = self.rng.choice(self.courses)
+            return 'get', f'/api/courses/courses/{course.pk}/', course.instructor_id, None
+        if name == 'assignment_list':
+            student, course = self.rng.choice(self.enrollments)
+            return 'get', f'/api/assignments/courses/{course}/assignments/', student, None
+        if name == 'submit':
+            pair = self.next_item(self.open_pairs)
+            if pair is None:
+                return None
+            student, assignment = pair
+            return ('post', f'/api/assignments/assignments/{assignment}/submit/', student,
+                    {'assignment': assignment, 'content': 'Benchmark answer. ' * 20})
+        if name == 'review':
+            item = self.next_item(self.pending_reviews)
+            if item is None:
+                return None
+            submission, teacher = item
+            return 'patch', f'/api/assignments/submissions/{submission}/review/', teacher, {'feedback': 'Benchmarked.'}
+        if name == 'review_bulk':
+            batch = self.next_item(self.review_batches)
+            if batch is None:
+                return None
+            assignment, teacher, ids = batch
+            return ('post', f'/api/assignments/assignments/{assignment}/submissions/review/', teacher,
+                    {'reviews': [{'id': pk, 'feedback': 'Benchmarked.'} for pk in ids]})
+        raise ValueError(name)
+
+    def one_request(self, name):
+        spec = self.request_for(name)
+        if spec is None:
+            return None
+        method, url, user_id, data = spec
+        client = self.client()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {self.tokens[user_id]}'} if user_id else {}
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json', **headers)
+            elapsed = time.perf_counter() - started
+        items = len(data['reviews']) if name == 'review_bulk' else 1
+        return elapsed * 1000, len(queries), response.status_code, len(response.content), items
+
+    def worker(self, name, count):
+        results = []
+        try:
+            for _ in range(count):
+                result = self.one_request(name)
+                if result is None:
+                    break
+                results.append(result)
+        finally:
+            connections.close_all()
+        return results
+
+    def run_scenario(self, name):
+        clients = self.options['clients']
+        total = self.options['requests']
+        shares = [total // clients + (1 if n < total % clients else 0) for n in range(clients)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            batches = list(pool.map(lambda share: self.worker(name, share), shares))
+        wall = time.perf_counter() - started
+
+        results = [result for batch in batches for result in batch]
+        latencies = [result[0] for result in results]
+        queries = [result[1] for result in results]
+        items = sum(result[4] for result in results)
+        statuses = {}
+        for result in results:
+            statuses[str(result[2])] = statuses.get(str(result[2]), 0) + 1
+        return {
+            'requests': len(results),
+            'errors': sum(1 for result in results if result[2] >= 400),
+            'status_codes': statuses,
+            'wall_seconds': round(wall, 3),
+            'throughput_rps': round(len(results) / wall, 1) if wall else None,
+            # Rows handled per second; differs from throughput_rps only for review_bulk.
+            'items_per_second': round(items / wall, 1) if wall else None,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'max': round(max(latencies), 2) if latencies else None,
+            },
+            'queries': {
+                'mean': round(sum(queries) / len(queries), 2) if queries else None,
+                'max': max(queries) if queries else None,
+            },
+            'mean_response_bytes': round(sum(r[3] for r in results) / len(results)) if results else None,
+        }
@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database onto every file in DATABASE_REPLICAS with the online backup API, '
+            'once or every --interval seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every N seconds until interrupted (0: copy once).')
+
+    def handle(self, *args, **options):
+        primary = connections['default'].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The primary database is not SQLite.')
+        targets = [connections[alias].settings_dict['NAME'] for alias in settings.DATABASE_REPLICAS]
+        if not targets:
+            raise CommandError('No replicas configured; set DB_REPLICAS.')
+
+        while True:
+            started = time.perf_counter()
+            self.copy(str(primary['NAME']), [str(target) for target in targets])
+            self.stdout.write(f"Synced {len(targets)} replica(s) in {time.perf_counter() - started:.3f}s")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, targets):
+        # backup() reads a consistent snapshot without blocking writers for
+        # the whole copy; each target is replaced page by page.
+        source = sqlite3.connect(source_path)
+        try:
+            for target_path in targets:
+                target = sqlite3.connect(target_path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
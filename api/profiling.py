@@ -0,0 +1,166 @@
+"""
+On-demand request profiling.
+
+With ``PROFILING_ENABLED``, ``ProfilingMiddleware`` runs a request under
+cProfile and records every SQL statement it issues when either
+
+- a staff user sends the ``X-Profile`` header (session or JWT credentials), or
+- the request falls in the ``PROFILING_SAMPLE_RATE`` random sample.
+
+Each profile is written to ``PROFILING_DIR`` as ``<id>.prof`` (pstats, open
+with ``pstats.Stats`` or snakeviz) plus ``<id>.json``: request metadata and
+the SQL ranked by total time. Only the newest ``PROFILING_KEEP`` profiles are
+kept. Header-triggered responses carry the id in ``X-Profile-Id``;
+``manage.py profiles`` lists, shows and diffs them.
+
+Disabled, the middleware removes itself (MiddlewareNotUsed); enabled, an
+untriggered request costs one header lookup and one random draw.
+"""
+import cProfile
+import json
+import os
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+HEADER = 'HTTP_X_PROFILE'
+RESPONSE_HEADER = 'X-Profile-Id'
+_unsafe = re.compile(r'[^A-Za-z0-9_.-]+')
+# Query parameters kept out of saved profiles (the event stream's ``?token=``).
+REDACTED_PARAMS = ('token',)
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILING_DIR', None) or os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def _saved_path(request):
+    query = request.GET.copy()
+    for name in REDACTED_PARAMS:
+        query.pop(name, None)
+    return f'{request.path}?{query.urlencode()}' if query else request.path
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    if not request.META.get('HTTP_AUTHORIZATION'):
+        return False
+    # API clients authenticate in the view; check their token here.
+    from accounts.authentication import CachedJWTAuthentication
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+class SQLRecorder:
+    """Execute wrapper collecting (sql, seconds) for every statement."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((sql, time.perf_counter() - started))
+
+    def ranked(self):
+        """Statements grouped by SQL text (parameters are placeholders), slowest total first."""
+        groups = {}
+        for sql, seconds in self.statements:
+            group = groups.setdefault(sql, {'sql': sql, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            group['count'] += 1
+            group['total_ms'] += seconds * 1000
+            group['max_ms'] = max(group['max_ms'], seconds * 1000)
+        ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+        for group in ranked:
+            group['total_ms'] = round(group['total_ms'], 3)
+            group['max_ms'] = round(group['max_ms'], 3)
+        return ranked
+
+
+def rotate(directory, keep):
+    """Delete all but the newest ``keep`` profiles."""
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for profile_id in ids[:max(0, len(ids) - keep)]:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """Profile header-triggered (staff only) or sampled requests; see the module docstring."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        if HEADER in request.META and _is_staff(request):
+            trigger = 'header'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sample'
+        else:
+            return self.get_response(request)
+        return self.profile(request, trigger)
+
+    def profile(self, request, trigger):
+        recorder = SQLRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        endpoint = match.view_name if match is not None and match.url_name else 'unresolved'
+        now = timezone.now()
+        profile_id = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}-{_unsafe.sub('_', endpoint)}"
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+        user = getattr(request, 'user', None)
+        summary = {
+            'id': profile_id,
+            'trigger': trigger,
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': _saved_path(request),
+            'status': response.status_code,
+            'user': user.pk if user is not None and user.is_authenticated else None,
+            'started_at': now.isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'queries': len(recorder.statements),
+            'sql_ms': round(sum(seconds for _, seconds in recorder.statements) * 1000, 3),
+            'sql': recorder.ranked(),
+        }
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w') as stream:
+            json.dump(summary, stream, indent=2)
+        rotate(directory, getattr(settings, 'PROFILING_KEEP', 200))
+
+        if trigger == 'header':
+            response[RESPONSE_HEADER] = profile_id
+        return response
@@ -0,0 +1,172 @@
+"""
+Precomputed OpenAPI schema.
+
+Generating the schema walks every view and serializer and takes hundreds of
+milliseconds, yet it only changes on deploy. ``manage.py build_schema``
+renders it once into ``SCHEMA_DIR``: JSON and YAML files named after the API
+version and a content hash, gzip copies of both, and ``manifest.json``
+pointing at the current set. ``PrecomputedSchemaView`` serves those bytes
+with a strong ETag per representation, compressed when the client accepts
+gzip.
+
+Without a manifest the schema is generated on the first request and kept in
+memory for the life of the process. Either way the artifacts are loaded once
+per process; restart (deploy) to pick up a rebuilt schema.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+MANIFEST = 'manifest.json'
+RENDERERS = {'json': OpenApiJsonRenderer, 'yaml': OpenApiYamlRenderer}
+
+_artifacts = None
+_lock = threading.Lock()
+
+
+def accepts_gzip(header):
+    """
+    Whether an Accept-Encoding ``header`` admits gzip: listed (or covered by
+    ``*``) with a non-zero q-value.
+    """
+    qualities = {}
+    for coding in header.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+def schema_dir():
+    return str(getattr(settings, 'SCHEMA_DIR', None) or os.path.join(settings.BASE_DIR, 'schema'))
+
+
+def render_schema():
+    """Generate the schema; returns {'json': bytes, 'yaml': bytes, 'json.gz': ..., 'yaml.gz': ..., 'hash': str}."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    schema = generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+    artifacts = {fmt: renderer().render(schema, renderer_context={}) for fmt, renderer in RENDERERS.items()}
+    for fmt in RENDERERS:
+        # mtime=0 keeps the compressed bytes identical across builds.
+        artifacts[f'{fmt}.gz'] = gzip.compress(artifacts[fmt], compresslevel=9, mtime=0)
+    artifacts['hash'] = hashlib.sha256(artifacts['json']).hexdigest()[:16]
+    return artifacts
+
+
+def build(directory, keep=3):
+    """Write the artifacts and manifest into ``directory``; keep the ``keep`` newest builds."""
+    artifacts = render_schema()
+    os.makedirs(directory, exist_ok=True)
+    version = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(spectacular_settings.VERSION or '0'))
+    stem = f"openapi-{version}-{artifacts['hash']}"
+    files = {}
+    for kind in ('json', 'yaml', 'json.gz', 'yaml.gz'):
+        files[kind] = f'{stem}.{kind}'
+        with open(os.path.join(directory, files[kind]), 'wb') as stream:
+            stream.write(artifacts[kind])
+    manifest = {'version': spectacular_settings.VERSION, 'hash': artifacts['hash'],
+                'generated_at': timezone.now().isoformat(), 'files': files}
+    temporary = os.path.join(directory, f'{MANIFEST}.tmp')
+    with open(temporary, 'w') as stream:
+        json.dump(manifest, stream, indent=2)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+
+    # Older builds, newest first by modification time; the current one is among the kept.
+    stems = {}
+    for name in os.listdir(directory):
+        if name.startswith('openapi-'):
+            stems.setdefault(name.split('.', 1)[0], []).append(name)
+    ordered = sorted(stems, key=lambda s: os.path.getmtime(os.path.join(directory, stems[s][0])), reverse=True)
+    for old in [s for s in ordered if s != stem][max(0, keep - 1):]:
+        for name in stems[old]:
+            os.remove(os.path.join(directory, name))
+    return manifest
+
+
+def _load(directory):
+    """Artifacts from ``directory``'s manifest, or None if there is no build."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as stream:
+            manifest = json.load(stream)
+        artifacts = {'hash': manifest['hash']}
+        for kind, name in manifest['files'].items():
+            with open(os.path.join(directory, name), 'rb') as stream:
+                artifacts[kind] = stream.read()
+        return artifacts
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_artifacts():
+    """The served artifacts: the built ones if present, else generated once and memoized."""
+    global _artifacts
+    if _artifacts is None:
+        with _lock:
+            if _artifacts is None:
+                artifacts = _load(schema_dir())
+                if artifacts is not None:
+                    artifacts['source'] = 'artifact'
+                else:
+                    artifacts = render_schema()
+                    artifacts['source'] = 'generated'
+                _artifacts = artifacts
+    return _artifacts
+
+
+def reset():
+    global _artifacts
+    with _lock:
+        _artifacts = None
+
+
+class PrecomputedSchemaView(SpectacularAPIView):
+    """
+    ``SpectacularAPIView`` (same content negotiation and permissions) serving
+    the precomputed schema. Versioned or translated requests are still
+    generated live.
+    """
+
+    def _get_schema_response(self, request):
+        if self.api_version or request.version or request.GET.get('version') or request.GET.get('lang'):
+            return super()._get_schema_response(request)
+
+        renderer = self.perform_content_negotiation(request, force=True)[0]
+        fmt = 'json' if renderer.format == 'json' else 'yaml'
+        artifacts = get_artifacts()
+        kind = fmt
+        if accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            kind = f'{fmt}.gz'
+        etag = f'"{artifacts["hash"]}-{kind}"'
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(artifacts[kind], content_type=renderer.media_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+            if kind.endswith('.gz'):
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -46,14 +47,17 @@ INSTALLED_APPS = [
     'courses',
     'assignments',  # Added new app
     'drf_spectacular',
+    'api',  # project-wide management commands and tooling
 ]
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',  # browsable API / api-auth login
     ),
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
 SIMPLE_JWT = {
@@ -64,9 +68,12 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': False,
 }
 
-REST_FRAMEWORK = {
-        'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    }
+# Login password verification pool (accounts.login_pool). Workers default to
+# the CPU count; logins beyond them wait in a bounded queue, and a login that
+# finds the queue full or times out waiting gets a 429 with Retry-After.
+LOGIN_HASH_WORKERS = None
+LOGIN_HASH_QUEUE_SIZE = 32  # logins allowed to wait for a free worker
+LOGIN_HASH_TIMEOUT = 5  # seconds a login waits for its hash before giving up
 
 SPECTACULAR_SETTINGS = {
         'TITLE': 'Learning Management System API Functionalities',
@@ -75,11 +82,14 @@ SPECTACULAR_SETTINGS = {
     }
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.db_routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -115,6 +125,115 @@ DATABASES = {
     }
 }
 
+# Read replicas: DB_REPLICAS is a comma-separated list of SQLite files kept
+# in step with the primary by `manage.py sync_sqlite_replicas`. Each becomes
+# alias replica1, replica2, ... Safe requests read from them through
+# api.db_routers; in tests they mirror the primary.
+DATABASE_REPLICAS = []
+for index, path in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+
+# Run on every new SQLite connection (api.sqlite). Set to {} for stock SQLite.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB
+    'busy_timeout': 20000,  # ms
+    'temp_store': 'MEMORY',
+}
+
+# Queue submission/enrollment writes behind one lock (api.sqlite.serialized_write)
+# instead of letting them race for SQLite's single write slot.
+SQLITE_SERIALIZE_WRITES = True
+# Seconds a write waits for that lock before failing with a 503.
+SQLITE_WRITE_LOCK_TIMEOUT = 20
+
+# Seconds a stored Idempotency-Key response (api.idempotency) can be replayed.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# Seconds before an unfinished claim (its request crashed or was killed) can
+# be taken over by a retry.
+IDEMPOTENCY_CLAIM_LEASE = 60
+
+# Seconds a caller's reads stay on the primary after they write. Should cover
+# the replica sync interval.
+REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lms-default',
+    }
+}
+
+# Seconds a course membership answer (courses.membership) stays cached.
+# Entries are also dropped by signals whenever the underlying rows change.
+MEMBERSHIP_CACHE_TTL = 300
+
+# Seconds a cached course/assignment GET response (courses.response_cache)
+# lives. Entries are orphaned by version bumps on writes long before that;
+# the TTL only bounds how long orphans occupy the cache. For several worker
+# processes on one node, point CACHES at a FileBasedCache directory so they
+# share versions and entries.
+RESPONSE_CACHE_TTL = 300
+
+# Seconds a JWT-authenticated user stays cached (accounts.user_cache). Saves
+# drop the entry immediately; the TTL bounds staleness from raw updates.
+AUTH_USER_CACHE_TTL = 60
+
+# Revoked JWTs (accounts.revocation): Bloom filter sizing, how often each
+# process pulls revocations made elsewhere, and how often expired ones are
+# pruned from the table.
+REVOCATION_BLOOM_CAPACITY = 100000
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+REVOCATION_SYNC_INTERVAL = 5
+REVOCATION_PRUNE_INTERVAL = 3600
+
+# Per-endpoint request metrics (api.instrumentation), served to admins at
+# /api/metrics/ in the Prometheus text format. With several worker processes,
+# point METRICS_DIR at a directory they share; each process writes its totals
+# there every METRICS_FLUSH_SECONDS and the endpoint merges them.
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 10
+
+# On-demand profiling (api.profiling). Off unless PROFILING_ENABLED; then a
+# staff request with an X-Profile header, or a PROFILING_SAMPLE_RATE share of
+# all requests, is profiled into PROFILING_DIR (newest PROFILING_KEEP kept).
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0') or 0)
+PROFILING_DIR = os.environ.get('PROFILING_DIR') or BASE_DIR / 'profiles'
+PROFILING_KEEP = 200
+
+# Prebuilt OpenAPI schema (`manage.py build_schema`, served by api.schema).
+# Without a build there, the schema is generated on first request and memoized.
+SCHEMA_DIR = os.environ.get('SCHEMA_DIR') or BASE_DIR / 'schema'
+
+# Server-sent events at /api/events/ (api.events). Under WSGI a stream holds a
+# worker thread and closes after EVENTS_MAX_SECONDS (clients reconnect after
+# EVENTS_RETRY_MS); under ASGI it stays open. Processes share events through
+# EVENTS_SPOOL_DIR, polled every EVENTS_POLL_SECONDS; files expire after
+# EVENTS_SPOOL_TTL seconds.
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_MAX_SECONDS = 300
+EVENTS_RETRY_MS = 3000
+EVENTS_QUEUE_SIZE = 100
+EVENTS_SPOOL_DIR = os.environ.get('EVENTS_SPOOL_DIR') or None
+EVENTS_POLL_SECONDS = 1
+EVENTS_SPOOL_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -0,0 +1,108 @@
+"""
+SQLite tuning for running the API on a single file database.
+
+``apply_pragmas`` is connected to ``connection_created`` (see ApiConfig) and
+runs ``settings.SQLITE_PRAGMAS`` on every new SQLite connection: WAL lets
+readers proceed during a write, ``busy_timeout`` makes a blocked writer wait
+instead of failing at once.
+
+WAL still allows one writer at a time, and a deferred transaction that reads
+before writing can fail with "database is locked" without waiting at all.
+``serialized_write()`` therefore queues write transactions behind a lock -
+a thread lock within the process and an ``flock`` on a file next to the
+database across processes - before opening the transaction. The lock is
+re-entrant per thread, so a serialized write nested in another (or run from
+its ``on_commit`` callback) does not wait on itself. A writer that cannot
+get the lock within ``SQLITE_WRITE_LOCK_TIMEOUT`` seconds gives up with
+``WriteLockTimeout`` (503) rather than hold its worker indefinitely.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .exceptions import WriteLockTimeout
+
+try:
+    import fcntl
+except ImportError:  # Windows: serialize within the process only.
+    fcntl = None
+
+_thread_lock = threading.Lock()
+_held = threading.local()
+# Between non-blocking flock attempts.
+POLL_SECONDS = 0.01
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """connection_created receiver."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _lock_path(using):
+    name = str(connections[using].settings_dict['NAME'])
+    if not name or name == ':memory:' or name.startswith('file:'):
+        return None
+    return f'{name}.write-lock'
+
+
+@contextmanager
+def serialized_write(using='default'):
+    """
+    ``transaction.atomic(using)`` that waits its turn behind every other
+    serialized writer to the same SQLite database. Other backends get a plain
+    atomic block.
+    """
+    if connections[using].vendor != 'sqlite' or not getattr(settings, 'SQLITE_SERIALIZE_WRITES', True):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    if getattr(_held, 'depth', 0):
+        _held.depth += 1
+        try:
+            with transaction.atomic(using=using):
+                yield
+        finally:
+            _held.depth -= 1
+        return
+
+    timeout = getattr(settings, 'SQLITE_WRITE_LOCK_TIMEOUT', 20)
+    deadline = time.monotonic() + timeout
+    path = _lock_path(using) if fcntl is not None else None
+    if not _thread_lock.acquire(timeout=timeout):
+        raise WriteLockTimeout()
+    handle = None
+    try:
+        if path:
+            handle = open(path, 'a')
+            _flock(handle, deadline)
+        _held.depth = 1
+        try:
+            with transaction.atomic(using=using):
+                yield
+        finally:
+            _held.depth = 0
+    finally:
+        if handle is not None:
+            handle.close()  # Also releases the flock.
+        _thread_lock.release()
+
+
+def _flock(handle, deadline):
+    """Take an exclusive flock on ``handle``, or raise WriteLockTimeout at ``deadline``."""
+    while True:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise WriteLockTimeout()
+            time.sleep(POLL_SECONDS)
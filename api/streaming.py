@@ -0,0 +1,88 @@
+"""
+Row-by-row CSV / JSON Lines export helpers.
+
+Views pick the output format through normal DRF content negotiation
+(``?format=csv`` / ``?format=jsonl`` or the Accept header) using the two
+renderers below, then hand a ``values_list(...).iterator()`` to
+``stream_rows`` so neither the queryset nor the body is ever held in memory.
+"""
+import csv
+import json
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_CHUNK_SIZE = 500
+# Leading characters that make spreadsheets evaluate a cell as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    """
+    ``value`` as written to a CSV cell: dates in ISO format, and text that a
+    spreadsheet would run as a formula (user-written content, feedback) prefixed
+    with a quote so it opens as plain text.
+    """
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error bodies; exports stream through stream_rows().
+        writer = csv.writer(_Echo())
+        if isinstance(data, dict):
+            return ''.join(writer.writerow([csv_cell(key), csv_cell(value)]) for key, value in data.items())
+        return writer.writerow([csv_cell(data)])
+
+
+class JSONLinesRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_RENDERERS = [CSVRenderer, JSONLinesRenderer]
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def _jsonl_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def stream_rows(request, columns, rows, filename):
+    """
+    Stream ``rows`` (tuples matching ``columns``) in the negotiated format as
+    an attachment named ``filename`` plus the format's extension.
+    """
+    renderer = request.accepted_renderer
+    lines = _jsonl_lines(columns, rows) if renderer.format == 'jsonl' else _csv_lines(columns, rows)
+    response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{renderer.format}"'
+    return response
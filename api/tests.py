@@ -0,0 +1,824 @@
+"""
+Per-endpoint performance budgets.
+
+Seeds a realistically sized dataset, calls every URL routed by api/urls.py
+as each role and fails if an endpoint issues more queries or returns more
+bytes than its declared budget. New URLs must be added to ENDPOINTS;
+``test_every_url_has_a_budget`` fails until they are.
+"""
+import asyncio
+import csv
+import gzip
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from accounts import revocation
+from accounts.authentication import VersionedRefreshToken
+from accounts.models import CustomUser, StudentProfile, TeacherProfile
+from assignments import counters
+from assignments.models import Assignment, Submission
+from courses import changes
+from courses.models import ChangeLog, Course, Enrollment
+from . import events, instrumentation, schema, sqlite
+from .conditional import ConditionalGetMixin
+from .db_routers import ReplicaRouter, ReplicaRoutingMiddleware
+from .exceptions import WriteLockTimeout
+
+TEACHERS = 10
+STUDENTS = 300
+COURSES_PER_TEACHER = 4
+ENROLLMENTS_PER_COURSE = 50
+ASSIGNMENTS_PER_COURSE = 6
+PASSWORD = 'budget-pass'
+
+# name: URL name as passed to reverse().
+# kwargs/data: callables taking the fixture (the TestCase) and returning the
+# URL kwargs / request body.
+# queries: role -> (maximum number of queries, expected status code). Roles
+# left out are not called.
+# max_bytes: largest acceptable response body for any role.
+Endpoint = namedtuple('Endpoint', 'name method kwargs data queries max_bytes fmt')
+Endpoint.__new__.__defaults__ = (None, 'json')
+
+ENDPOINTS = [
+    # accounts
+    Endpoint('register', 'post', None,
+             lambda f: {'email': 'new@example.com', 'password': 'x', 'password2': 'x',
+                        'first_name': 'N', 'last_name': 'U', 'role': 'STUDENT'},
+             {'anonymous': (4, 201)}, 1024),
+    Endpoint('login', 'post', None, lambda f: {'email': f.student.email, 'password': PASSWORD},
+             {'anonymous': (1, 200)}, 1024),
+    Endpoint('login-metrics', 'get', None, None, {'admin': (1, 200), 'teacher': (0, 403)}, 1024),
+    Endpoint('token-refresh', 'post', None, lambda f: {'refresh': str(VersionedRefreshToken.for_user(f.student))},
+             {'anonymous': (5, 200)}, 1024),
+    Endpoint('logout', 'post', None, lambda f: {'refresh': str(VersionedRefreshToken.for_user(f.student))},
+             {'student': (4, 200)}, 512),
+    Endpoint('logout-all', 'post', None, None, {'student': (5, 200)}, 512),
+    Endpoint('change-password', 'put', None,
+             lambda f: {'old_password': PASSWORD, 'new_password': 'n3w-pass', 'new_password2': 'n3w-pass'},
+             {'student': (1, 200)}, 512),
+    Endpoint('user-detail', 'get', None, None,
+             {'teacher': (1, 200), 'student': (1, 200), 'admin': (1, 200)}, 2048),
+    Endpoint('provision-users', 'post', None,
+             lambda f: {'users': [{'email': 'prov@example.com', 'role': 'TEACHER'}]},
+             {'admin': (6, 201), 'teacher': (0, 403)}, 1024),
+    # courses
+    Endpoint('course-list-create', 'get', None, None,
+             {'teacher': (1, 200), 'student': (1, 200), 'admin': (1, 200)}, 8 * 1024),
+    Endpoint('course-list-create', 'post', None,
+             lambda f: {'instructor': f.teacher.pk, 'title': 'New', 'description': 'd'},
+             {'teacher': (4, 201)}, 1024),
+    Endpoint('course-detail', 'get', lambda f: {'pk': f.course.pk}, None,
+             {'teacher': (4, 200), 'student': (5, 200), 'admin': (5, 200)}, 8 * 1024),
+    Endpoint('enrollment-create', 'post', lambda f: {'course_id': f.other_course.pk},
+             lambda f: {'student': f.student.pk, 'course': f.other_course.pk}, {'student': (6, 201)}, 1024),
+    Endpoint('enrollment-create', 'delete', lambda f: {'course_id': f.course.pk}, None,
+             {'student': (6, 204)}, 512),
+    Endpoint('enrollment-bulk', 'post', lambda f: {'course_id': f.course.pk},
+             lambda f: {'students': [s.email for s in f.students[:100]]},
+             {'teacher': (12, 200), 'student': (1, 403)}, 16 * 1024),
+    Endpoint('enrollment-export', 'get', lambda f: {'course_id': f.course.pk}, None,
+             {'teacher': (2, 200), 'student': (1, 403)}, 8 * 1024),
+    Endpoint('enrollment-list', 'get', None, None,
+             {'teacher': (1, 200), 'student': (1, 200), 'admin': (0, 200)}, 32 * 1024),
+    Endpoint('response-cache-metrics', 'get', None, None, {'admin': (0, 200), 'teacher': (0, 403)}, 1024),
+    # An up-to-date client: one indexed query.
+    Endpoint('change-feed', 'get', None, lambda f: {'since': ChangeLog.objects.latest('id').pk},
+             {'teacher': (1, 200), 'student': (1, 200), 'admin': (1, 200)}, 1024),
+    # A window with the student's enrollments also loads those courses' assignments.
+    Endpoint('change-feed', 'get', None, lambda f: {'since': 0, 'limit': 100},
+             {'teacher': (5, 200), 'student': (6, 200), 'admin': (5, 200)}, 64 * 1024),
+    # assignments
+    Endpoint('assignment-list-create', 'get', lambda f: {'course_id': f.course.pk}, None,
+             {'teacher': (3, 200), 'student': (4, 200), 'admin': (3, 200)}, 4 * 1024),
+    Endpoint('assignment-list-create', 'post', lambda f: {'course_id': f.course.pk},
+             lambda f: {'course': f.course.pk, 'title': 'New', 'description': 'd',
+                        'due_date': timezone.now().isoformat()},
+             {'teacher': (5, 201), 'student': (1, 403)}, 1024),
+    Endpoint('assignment-detail', 'get', lambda f: {'pk': f.assignment.pk}, None,
+             {'teacher': (3, 200), 'student': (4, 200), 'admin': (4, 403)}, 1024),
+    Endpoint('submission-list', 'get', lambda f: {'assignment_id': f.assignment.pk}, None,
+             {'teacher': (4, 200), 'student': (4, 200), 'admin': (4, 200)}, 64 * 1024),
+    Endpoint('submission-export', 'get', lambda f: {'assignment_id': f.assignment.pk}, None,
+             {'teacher': (3, 200), 'student': (2, 403)}, 32 * 1024),
+    Endpoint('submission-bulk-review', 'post', lambda f: {'assignment_id': f.assignment.pk},
+             lambda f: {'reviews': [{'id': pk, 'feedback': 'Checked'}
+                                    for pk in f.assignment.submissions.values_list('id', flat=True)]},
+             {'teacher': (9, 200), 'student': (2, 403)}, 8 * 1024),
+    Endpoint('submission-create', 'post', lambda f: {'assignment_id': f.open_assignment.pk},
+             lambda f: {'assignment': f.open_assignment.pk, 'content': 'My answer'},
+             {'student': (10, 201), 'teacher': (2, 403)}, 1024),
+    Endpoint('submission-detail', 'get', lambda f: {'pk': f.submission.pk}, None,
+             {'teacher': (3, 200), 'student': (1, 200), 'admin': (3, 403)}, 1024),
+    Endpoint('submission-review', 'patch', lambda f: {'pk': f.submission.pk},
+             lambda f: {'feedback': 'Good work'}, {'teacher': (7, 200), 'student': (3, 403)}, 1024),
+    Endpoint('course-gradebook', 'get', lambda f: {'course_id': f.course.pk}, None,
+             {'teacher': (4, 200), 'student': (1, 403)}, 16 * 1024),
+    # project-level
+    Endpoint('database-metrics', 'get', None, None, {'admin': (0, 200), 'teacher': (0, 403)}, 1024),
+    Endpoint('metrics', 'get', None, None, {'admin': (0, 200), 'teacher': (0, 403)}, 1024 * 1024),
+    Endpoint('event-stream', 'get', None, lambda f: {'timeout': 0},
+             {'teacher': (0, 200), 'student': (0, 200), 'anonymous': (0, 401)}, 512),
+    Endpoint('schema', 'get', None, None, {'anonymous': (0, 200)}, 256 * 1024),
+    Endpoint('swagger-ui', 'get', None, None, {'anonymous': (0, 200)}, 8 * 1024),
+    Endpoint('admin:index', 'get', None, None, {'admin': (3, 200)}, 32 * 1024),
+    Endpoint('rest_framework:login', 'get', None, None, {'anonymous': (0, 200)}, 16 * 1024),
+    Endpoint('rest_framework:logout', 'post', None, None, {'admin': (4, 200)}, 16 * 1024),
+]
+
+
+def named_urls(patterns, namespace=None):
+    """Yield every named URL reachable from ``patterns``, namespaced."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace
+            if inner and namespace:
+                inner = f'{namespace}:{inner}'
+            yield from named_urls(pattern.url_patterns, inner or namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}:{pattern.name}' if namespace else pattern.name
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EndpointBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password(PASSWORD)
+        users = [CustomUser(email=f'teacher{i}@example.com', role='TEACHER', password=password,
+                            first_name='T', last_name=str(i)) for i in range(TEACHERS)]
+        users += [CustomUser(email=f'student{i}@example.com', role='STUDENT', password=password,
+                             first_name='S', last_name=str(i)) for i in range(STUDENTS)]
+        CustomUser.objects.bulk_create(users)
+        cls.admin = CustomUser.objects.create_superuser(email='admin@example.com', password=PASSWORD,
+                                                        first_name='A', last_name='D')
+        cls.teachers = list(CustomUser.objects.filter(role='TEACHER').order_by('id'))
+        cls.students = list(CustomUser.objects.filter(role='STUDENT').order_by('id'))
+        TeacherProfile.objects.bulk_create(TeacherProfile(user=u) for u in cls.teachers)
+        StudentProfile.objects.bulk_create(StudentProfile(user=u) for u in cls.students)
+
+        Course.objects.bulk_create(
+            Course(instructor=teacher, title=f'Course {t}.{c}', description='Seeded course ' * 10,
+                   enrollment_count=ENROLLMENTS_PER_COURSE)
+            for t, teacher in enumerate(cls.teachers) for c in range(COURSES_PER_TEACHER)
+        )
+        courses = list(Course.objects.order_by('id'))
+        Enrollment.objects.bulk_create(
+            Enrollment(course=course, student=cls.students[(n * 7 + i) % STUDENTS])
+            for n, course in enumerate(courses) for i in range(ENROLLMENTS_PER_COURSE)
+        )
+        due = timezone.now() + timedelta(days=7)
+        Assignment.objects.bulk_create(
+            Assignment(course=course, title=f'Homework {a}', description='Seeded assignment ' * 10, due_date=due)
+            for course in courses for a in range(ASSIGNMENTS_PER_COURSE)
+        )
+
+        cls.teacher = cls.teachers[0]
+        cls.course = courses[0]
+        roster = list(cls.course.enrollments.values_list('student_id', flat=True))
+        cls.student = next(s for s in cls.students if s.pk == roster[0])
+        joined = set(cls.student.enrollments.values_list('course_id', flat=True))
+        cls.other_course = next(c for c in reversed(courses) if c.pk not in joined)
+        cls.assignment, cls.open_assignment = cls.course.assignments.order_by('id')[:2]
+        Submission.objects.bulk_create(
+            Submission(assignment=cls.assignment, student_id=student_id, content='Seeded answer ' * 20)
+            for student_id in roster
+        )
+        cls.submission = Submission.objects.get(assignment=cls.assignment, student=cls.student)
+        counters.recount()
+        changes.seed()
+
+    def client_for(self, role):
+        client = APIClient()
+        user = {'teacher': self.teacher, 'student': self.student, 'admin': self.admin}.get(role)
+        if user is not None:
+            client.force_authenticate(user)
+            client.force_login(user)
+        return client
+
+    def call(self, endpoint, role):
+        kwargs = endpoint.kwargs(self) if endpoint.kwargs else {}
+        data = endpoint.data(self) if endpoint.data else None
+        url = reverse(endpoint.name, kwargs=kwargs)
+        client = self.client_for(role)
+        cache.clear()
+        revocation.reset_store()
+        # Each call runs in a savepoint that is rolled back so writes do not
+        # leak into the next endpoint.
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, endpoint.method)(url, data, format=endpoint.fmt)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+            transaction.set_rollback(True)
+        return response, len(queries), len(body)
+
+    def test_endpoint_budgets(self):
+        for endpoint in ENDPOINTS:
+            for role, (max_queries, expected_status) in endpoint.queries.items():
+                with self.subTest(endpoint=endpoint.name, method=endpoint.method, role=role):
+                    response, queries, size = self.call(endpoint, role)
+                    self.assertEqual(
+                        response.status_code, expected_status,
+                        f'{endpoint.method.upper()} {endpoint.name} as {role}: status {response.status_code}'
+                    )
+                    self.assertLessEqual(
+                        queries, max_queries,
+                        f'{endpoint.method.upper()} {endpoint.name} as {role}: {queries} queries'
+                    )
+                    self.assertLessEqual(
+                        size, endpoint.max_bytes,
+                        f'{endpoint.method.upper()} {endpoint.name} as {role}: {size} bytes'
+                    )
+
+    def test_every_url_has_a_budget(self):
+        budgeted = {endpoint.name for endpoint in ENDPOINTS}
+        # Only the admin index is budgeted; the rest of the admin site is Django's.
+        routed = {name for name in named_urls(get_resolver().url_patterns)
+                  if not name.startswith('admin:') or name == 'admin:index'}
+        self.assertEqual(routed - budgeted, set(), 'URLs without a performance budget')
+
+
+class PlainView(APIView):
+    authentication_classes = permission_classes = []
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class ConditionalGetMixinTests(SimpleTestCase):
+    class View(ConditionalGetMixin, PlainView):
+        pass
+
+    class ValidatedView(ConditionalGetMixin, PlainView):
+        updated_at = timezone.now() - timedelta(days=1)
+
+        def get_validators(self):
+            return (self.updated_at, 1)
+
+    def test_views_without_validators_are_served_normally(self):
+        response = self.View.as_view()(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_matching_etag_is_not_modified(self):
+        view = self.ValidatedView.as_view()
+        etag = view(RequestFactory().get('/'))['ETag']
+        self.assertEqual(view(RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag)).status_code, 304)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def route(self, method, token='a', model=Course):
+        """Run a request through the middleware; return where ``model`` reads would go."""
+        seen = {}
+
+        def view(request):
+            seen['alias'] = self.router.db_for_read(model)
+            return HttpResponse()
+        request = getattr(self.factory, method)('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        ReplicaRoutingMiddleware(view)(request)
+        return seen['alias']
+
+    def test_safe_requests_read_from_replicas(self):
+        self.assertIn(self.route('get'), {'replica1', 'replica2'})
+
+    def test_writes_and_non_request_reads_use_primary(self):
+        self.assertEqual(self.route('post'), 'default')
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+        self.assertEqual(self.router.db_for_write(Course), 'default')
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.route('post', token='writer')
+        self.assertEqual(self.route('get', token='writer'), 'default')
+        self.assertIn(self.route('get', token='reader'), {'replica1', 'replica2'})
+
+    def test_unrouted_apps_stay_on_primary(self):
+        self.assertEqual(self.route('get', model=Session), 'default')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkCommandTests(TransactionTestCase):
+    """Smoke runs of the load-testing commands at tiny sizes."""
+    sizes = {'teachers': 2, 'students': 6, 'courses_per_teacher': 2, 'enrollments_per_course': 4,
+             'assignments_per_course': 2, 'submission_rate': 0.5}
+
+    def setUp(self):
+        cache.clear()
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_synthetic_data', stdout=out, **self.sizes, **options)
+        return out.getvalue()
+
+    def test_generate_synthetic_data(self):
+        self.assertIn('Generated', self.generate())
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(Enrollment.objects.count(), 16)
+        self.assertEqual(Assignment.objects.count(), 8)
+        self.assertEqual(Submission.objects.count(), 16)
+        self.assertEqual(counters.recount(), {'assignments': [], 'courses': []})
+        with self.assertRaises(CommandError):
+            self.generate()
+        self.generate(clear=True)
+        self.assertEqual(CustomUser.objects.count(), 8)
+
+    # The command's clients send Host: localhost, as allowed by DEBUG's defaults.
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_run_benchmark(self):
+        self.generate()
+        out = StringIO()
+        call_command('run_benchmark', clients=1, requests=2, review_batch=2, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['dataset']['courses'], 4)
+        for name, result in report['endpoints'].items():
+            with self.subTest(endpoint=name):
+                self.assertGreater(result['requests'], 0)
+                self.assertEqual(result['errors'], 0, result['status_codes'])
+
+    def test_run_benchmark_needs_data(self):
+        with self.assertRaises(CommandError):
+            call_command('run_benchmark', stdout=StringIO(), stderr=StringIO())
+
+
+@override_settings(SQLITE_WRITE_LOCK_TIMEOUT=0.05)
+class SerializedWriteTests(TestCase):
+    def test_nested_writes_do_not_wait_on_themselves(self):
+        teacher = CustomUser.objects.create_user(email='t@example.com', password=None, first_name='T',
+                                                 last_name='T', role='TEACHER')
+        with sqlite.serialized_write():
+            with sqlite.serialized_write():
+                Course.objects.create(instructor=teacher, title='Algebra', description='Intro')
+        self.assertTrue(Course.objects.exists())
+
+    def test_busy_thread_lock_times_out(self):
+        with sqlite._thread_lock:
+            with self.assertRaises(WriteLockTimeout):
+                with sqlite.serialized_write():
+                    self.fail('entered without the lock')
+        with sqlite.serialized_write():
+            pass
+
+    @skipIf(sqlite.fcntl is None, 'no flock on this platform')
+    def test_busy_file_lock_times_out(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'db.sqlite3.write-lock')
+        # Another process's writer, as far as flock is concerned.
+        with open(path, 'a') as other, mock.patch.object(sqlite, '_lock_path', return_value=path):
+            sqlite.fcntl.flock(other, sqlite.fcntl.LOCK_EX)
+            with self.assertRaises(WriteLockTimeout):
+                with sqlite.serialized_write():
+                    self.fail('entered without the lock')
+            self.assertFalse(sqlite._thread_lock.locked())
+            sqlite.fcntl.flock(other, sqlite.fcntl.LOCK_UN)
+            with sqlite.serialized_write():
+                pass
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        # The aggregates are process-wide: start from, and leave behind, empty totals.
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+        self.teacher = CustomUser.objects.create_user(email='t@example.com', password=None, first_name='T',
+                                                      last_name='T', role='TEACHER')
+        self.admin = CustomUser.objects.create_superuser(email='a@example.com', password=PASSWORD,
+                                                         first_name='A', last_name='D')
+        Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+
+    def series(self, endpoint='course-list-create', method='GET'):
+        return instrumentation.collect().get(f'{endpoint}|{method}') or instrumentation._new_series()
+
+    def test_request_is_recorded_under_its_url_name(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        client.get(reverse('course-list-create'))
+        series = self.series()
+        self.assertEqual(series['status'], {'200': 1})
+        self.assertGreater(series['queries_sum'], 0)
+        self.assertGreater(series['bytes_sum'], 0)
+        self.assertGreater(series['serializer_seconds'], 0)
+
+    def test_prometheus_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('lms_http_requests_total{endpoint="metrics",method="GET",status="403"}',
+                      response.content.decode())
+
+    def test_histogram_buckets_are_cumulative(self):
+        series = instrumentation._new_series()
+        series['status']['200'] = 2
+        series['latency'][0] = 1
+        series['latency'][-1] = 1
+        text = instrumentation.render({'x|GET': series})
+        self.assertIn('lms_http_request_duration_seconds_bucket{endpoint="x",method="GET",le="0.005"} 1', text)
+        self.assertIn('lms_http_request_duration_seconds_bucket{endpoint="x",method="GET",le="10.0"} 1', text)
+        self.assertIn('lms_http_request_duration_seconds_bucket{endpoint="x",method="GET",le="+Inf"} 2', text)
+        self.assertIn('lms_http_request_duration_seconds_count{endpoint="x",method="GET"} 2', text)
+
+    def test_processes_merge_through_the_metrics_directory(self):
+        other = instrumentation._new_series()
+        other['status']['200'] = 5
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, 'other-worker.json'), 'w') as stream:
+                json.dump({'elsewhere|GET': other}, stream)
+            instrumentation.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(instrumentation.collect()['elsewhere|GET']['status'], {'200': 5})
+
+    def test_concurrent_flushes(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            errors = []
+
+            def flush():
+                try:
+                    for _ in range(20):
+                        instrumentation.flush()
+                except Exception as error:
+                    errors.append(error)
+            threads = [threading.Thread(target=flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(directory), [f'{instrumentation.process_id()}.json'])
+
+    def test_unwritable_metrics_dir_does_not_fail_requests(self):
+        with tempfile.NamedTemporaryFile() as not_a_directory, \
+                override_settings(METRICS_DIR=not_a_directory.name, METRICS_FLUSH_SECONDS=0):
+            client = APIClient()
+            client.force_authenticate(self.teacher)
+            with self.assertLogs('api.instrumentation', 'WARNING'):
+                response = client.get(reverse('course-list-create'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_finished_threads_are_folded_into_the_totals(self):
+        def serve():
+            instrumentation.record('threaded', 'GET', 200, 0.01, instrumentation.RequestMetrics(), 10)
+        for _ in range(3):
+            thread = threading.Thread(target=serve)
+            thread.start()
+            thread.join()
+        self.assertEqual(self.series('threaded')['status'], {'200': 3})
+        self.assertFalse([thread for thread, _ in instrumentation._aggregates if not thread.is_alive()])
+        self.assertEqual(self.series('threaded')['status'], {'200': 3})
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_KEEP=3)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(PROFILING_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = CustomUser.objects.create_superuser(email='a@example.com', password=PASSWORD,
+                                                         first_name='A', last_name='D')
+        self.teacher = CustomUser.objects.create_user(email='t@example.com', password=None, first_name='T',
+                                                      last_name='T', role='TEACHER')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+
+    def get(self, user, **headers):
+        client = APIClient()
+        client.force_login(user)
+        return client.get(reverse('course-detail', kwargs={'pk': self.course.pk}), **headers)
+
+    def test_staff_header_profiles_the_request(self):
+        response = self.get(self.admin, HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+        with open(os.path.join(self.directory, f'{profile_id}.json')) as stream:
+            summary = json.load(stream)
+        self.assertEqual(summary['endpoint'], 'course-detail')
+        self.assertEqual(summary['queries'], sum(group['count'] for group in summary['sql']))
+        self.assertGreater(summary['queries'], 0)
+        stats = pstats.Stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        self.assertTrue(any(name == 'retrieve' for _, _, name in stats.stats))
+
+    def test_header_from_non_staff_is_ignored(self):
+        response = self.get(self.teacher, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampling_and_rotation(self):
+        for _ in range(5):
+            self.get(self.teacher)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.prof')]), 3)
+
+    def test_list_and_diff_command(self):
+        old = self.get(self.admin, HTTP_X_PROFILE='1')['X-Profile-Id']
+        new = self.get(self.admin, HTTP_X_PROFILE='1')['X-Profile-Id']
+        out = StringIO()
+        call_command('profiles', 'list', stdout=out)
+        self.assertIn(old, out.getvalue())
+        out = StringIO()
+        call_command('profiles', 'diff', old, new, stdout=out)
+        self.assertIn('Functions by change in cumulative time', out.getvalue())
+
+    def test_query_token_is_not_saved(self):
+        client = APIClient()
+        client.force_login(self.admin)
+        response = client.get(reverse('course-detail', kwargs={'pk': self.course.pk}),
+                              {'token': 'secret', 'page': '2'}, HTTP_X_PROFILE='1')
+        with open(os.path.join(self.directory, f"{response['X-Profile-Id']}.json")) as stream:
+            summary = json.load(stream)
+        self.assertEqual(summary['path'], reverse('course-detail', kwargs={'pk': self.course.pk}) + '?page=2')
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_middleware_is_not_loaded(self):
+        self.assertNotIn('X-Profile-Id', self.get(self.admin, HTTP_X_PROFILE='1'))
+
+
+class PrecomputedSchemaTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(SCHEMA_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        schema.reset()
+        self.addCleanup(schema.reset)
+
+    def test_built_artifacts_are_served_with_etags(self):
+        call_command('build_schema', stdout=StringIO())
+        with mock.patch.object(schema, 'render_schema') as render:
+            response = self.client.get(reverse('schema'), {'format': 'json'})
+        render.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi+json')
+        self.assertEqual(json.loads(response.content)['info']['version'], '1.0.0')
+        revalidated = self.client.get(reverse('schema'), {'format': 'json'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_gzip_copy_for_clients_that_accept_it(self):
+        call_command('build_schema', stdout=StringIO())
+        plain = self.client.get(reverse('schema'))
+        compressed = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+
+    def test_accept_encoding_q_values(self):
+        for header, expected in (('gzip', True), ('deflate, gzip;q=0.5', True), ('GZIP; Q=1', True),
+                                 ('gzip;q=0', False), ('gzip;q=0.0, deflate', False), ('*', True),
+                                 ('*;q=0.1, gzip;q=0', False), ('deflate', False), ('', False),
+                                 ('identity, x-gzip', True), ('gzip;q=bogus', False)):
+            with self.subTest(header=header):
+                self.assertIs(schema.accepts_gzip(header), expected)
+
+    def test_gzip_refused_with_q_zero_gets_plain_schema(self):
+        call_command('build_schema', stdout=StringIO())
+        plain = self.client.get(reverse('schema'))
+        response = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.content, plain.content)
+        self.assertEqual(response['ETag'], plain['ETag'])
+
+    def test_without_artifacts_generation_is_memoized(self):
+        with mock.patch.object(schema, 'render_schema', wraps=schema.render_schema) as render:
+            first = self.client.get(reverse('schema'))
+            second = self.client.get(reverse('schema'))
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user(email='t@example.com', password=None, first_name='T',
+                                                      last_name='T', role='TEACHER')
+        self.student = CustomUser.objects.create_user(email='s@example.com', password=None, first_name='S',
+                                                      last_name='S', role='STUDENT')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.assignment = Assignment.objects.create(course=self.course, title='Homework', description='d',
+                                                    due_date=timezone.now() + timedelta(days=1))
+
+    def subscribe(self, user):
+        subscription = events.Subscription(user.pk)
+        events.subscribe(subscription)
+        self.addCleanup(subscription.close)
+        return subscription
+
+    def received(self, subscription):
+        items = []
+        while not subscription.queue.empty():
+            items.append(subscription.queue.get_nowait())
+        return [(item['type'], item['data']) for item in items]
+
+    def submit(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('submission-create', kwargs={'assignment_id': self.assignment.pk}),
+                                   {'assignment': self.assignment.pk, 'content': 'Answer'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def test_new_submission_reaches_the_instructor(self):
+        teacher, student = self.subscribe(self.teacher), self.subscribe(self.student)
+        submission_id = self.submit()
+        [(kind, data)] = self.received(teacher)
+        self.assertEqual(kind, 'submission.created')
+        self.assertEqual((data['submission'], data['course'], data['student']),
+                         (submission_id, self.course.pk, self.student.pk))
+        self.assertEqual(self.received(student), [])
+
+    def test_reviews_reach_the_student(self):
+        submission_id = self.submit()
+        student = self.subscribe(self.student)
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        review = reverse('submission-review', kwargs={'pk': submission_id})
+        bulk_review = reverse('submission-bulk-review', kwargs={'assignment_id': self.assignment.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(review, {'feedback': 'Good'}, format='json')
+        self.assertEqual([data['feedback'] for _, data in self.received(student)], ['Good'])
+
+        # Saving an already reviewed submission again is not a new review.
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(review, {'feedback': 'Fine'}, format='json')
+            client.post(bulk_review, {'reviews': [{'id': submission_id, 'feedback': 'Fine!'}]}, format='json')
+        self.assertEqual(self.received(student), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(bulk_review, {'reviews': [{'id': submission_id, 'status': 'submitted'}]}, format='json')
+            client.post(bulk_review, {'reviews': [{'id': submission_id, 'feedback': 'Better'}]}, format='json')
+        received = self.received(student)
+        self.assertEqual([kind for kind, _ in received], ['submission.reviewed'])
+        self.assertEqual([data['feedback'] for _, data in received], ['Better'])
+
+    def test_nothing_is_sent_for_a_rolled_back_write(self):
+        teacher = self.subscribe(self.teacher)
+        with self.captureOnCommitCallbacks(execute=False):
+            Submission.objects.create(assignment=self.assignment, student=self.student, content='Answer')
+        self.assertEqual(self.received(teacher), [])
+
+    def test_wsgi_stream(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        response = client.get(reverse('event-stream'), {'timeout': 5})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        events.publish([events.event(self.student.pk, 'submission.reviewed', {'submission': 1})])
+        chunk = next(chunks).decode()
+        self.assertIn('event: submission.reviewed\ndata: {"submission": 1}\n\n', chunk)
+        response.close()
+        self.assertEqual(events.subscriber_count(), 0)
+
+    def test_wsgi_stream_authenticates_a_query_token(self):
+        token = str(VersionedRefreshToken.for_user(self.student).access_token)
+        client = APIClient()
+        self.assertEqual(client.get(reverse('event-stream'), {'timeout': 0}).status_code, 401)
+        response = client.get(reverse('event-stream'), {'timeout': 0, 'token': token})
+        self.assertEqual(b''.join(response.streaming_content), b'retry: 3000\n\n')
+
+    @override_settings(EVENTS_QUEUE_SIZE=1)
+    def test_slow_stream_is_told_to_resync(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        chunks = iter(client.get(reverse('event-stream'), {'timeout': 5}).streaming_content)
+        next(chunks)
+        events.publish([events.event(self.student.pk, 'submission.reviewed', {'submission': n}) for n in (1, 2)])
+        self.assertEqual(list(chunks), [events.RESYNC.encode()])
+
+    def test_asgi_stream(self):
+        token = str(VersionedRefreshToken.for_user(self.teacher).access_token)
+        passed = []
+
+        async def django_app(scope, receive, send):
+            passed.append(scope['path'])
+
+        async def scenario():
+            app = events.EventStreamApp(django_app)
+            await app({'type': 'http', 'path': '/api/courses/create/'}, None, None)
+            inbox, outbox = asyncio.Queue(), asyncio.Queue()
+            scope = {'type': 'http', 'method': 'GET', 'path': events.PATH,
+                     'headers': [(b'authorization', f'Bearer {token}'.encode())], 'query_string': b''}
+            stream = asyncio.ensure_future(app(scope, inbox.get, outbox.put))
+            messages = [await asyncio.wait_for(outbox.get(), 5) for _ in range(2)]
+            events.publish([events.event(self.teacher.pk, 'submission.created', {'submission': 7})])
+            messages.append(await asyncio.wait_for(outbox.get(), 5))
+            await inbox.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(stream, 5)
+            return messages
+
+        start, preamble, message = async_to_sync(scenario)()
+        self.assertEqual(passed, ['/api/courses/create/'])
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(preamble['body'], b'retry: 3000\n\n')
+        self.assertIn(b'event: submission.created\ndata: {"submission": 7}', message['body'])
+        self.assertTrue(message['more_body'])
+        self.assertEqual(events.subscriber_count(), 0)
+
+    def test_asgi_stream_requires_a_token(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': events.PATH, 'headers': [], 'query_string': b''}
+        async_to_sync(events.EventStreamApp(None))(scope, None, send)
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_spool_carries_events_between_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(EVENTS_SPOOL_DIR=directory, EVENTS_POLL_SECONDS=3600):
+            student = self.subscribe(self.student)
+            with mock.patch.object(events, '_origin', 'other-process'):
+                events._spool_write([dict(events.event(self.student.pk, 'submission.reviewed', {'submission': 3}),
+                                          id='other-process-1')])
+            # Published here: delivered once, directly, not again from the spool.
+            events.publish([events.event(self.student.pk, 'submission.reviewed', {'submission': 4})])
+            seen = set()
+            events.read_spool(seen)
+            events.read_spool(seen)
+            self.assertEqual([data['submission'] for _, data in self.received(student)], [4, 3])
+            with override_settings(EVENTS_SPOOL_TTL=0):
+                events.read_spool(seen)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_unwritable_spool_does_not_fail_the_write(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        blocker = os.path.join(directory, 'file')
+        open(blocker, 'w').close()
+        teacher = self.subscribe(self.teacher)
+        with override_settings(EVENTS_SPOOL_DIR=os.path.join(blocker, 'spool'), EVENTS_POLL_SECONDS=3600):
+            with self.assertLogs('api.events', 'WARNING'):
+                self.submit()
+        self.assertEqual([kind for kind, _ in self.received(teacher)], ['submission.created'])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user(email='t@example.com', password=None, first_name='T',
+                                                      last_name='T', role='TEACHER')
+        self.student = CustomUser.objects.create_user(email='s@example.com', password=None, first_name='S',
+                                                      last_name='S', role='STUDENT')
+        course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        Enrollment.objects.create(course=course, student=self.student)
+        self.assignment = Assignment.objects.create(course=course, title='Homework', description='d',
+                                                    due_date=timezone.now())
+        Submission.objects.create(assignment=self.assignment, student=self.student,
+                                  content='=HYPERLINK("http://example.com")', feedback='-1 for style')
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def export(self, **params):
+        response = self.client.get(reverse('submission-export', kwargs={'assignment_id': self.assignment.pk}),
+                                   params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_neutralizes_formulas(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        [row] = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(row['content'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(row['feedback'], "'-1 for style")
+        self.assertEqual(row['student_email'], 's@example.com')
+
+    def test_jsonl_export_keeps_values(self):
+        response, body = self.export(format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        [row] = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(row['content'], '=HYPERLINK("http://example.com")')
+        self.assertEqual(row['feedback'], '-1 for style')
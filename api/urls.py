@@ -16,14 +16,21 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+
+from .schema import PrecomputedSchemaView
+from .views import EventStreamView, database_metrics_view, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),
     path('api/courses/', include('courses.urls')),
     path('api/assignments/', include('assignments.urls')),
+    path('api/db/metrics/', database_metrics_view, name='database-metrics'),
+    path('api/metrics/', metrics_view, name='metrics'),
+    # Served by events.EventStreamApp before Django under ASGI (api/asgi.py).
+    path('api/events/', EventStreamView.as_view(), name='event-stream'),
     path('api-auth/', include('rest_framework.urls')),  # For browsable API authentication
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', PrecomputedSchemaView.as_view(), name='schema'),
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
 ]
\ No newline at end of file
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.authentication import QueryTokenJWTAuthentication
+from accounts.permissions import IsAuthenticatedAndActive, IsAdminRole
+from . import events, instrumentation
+from .db_routers import query_counts
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedAndActive, IsAdminRole])
+def database_metrics_view(request):
+    """Queries run per database alias by this process, and the configured replicas."""
+    return Response({
+        'replicas': settings.DATABASE_REPLICAS,
+        'queries': query_counts(),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedAndActive, IsAdminRole])
+def metrics_view(request):
+    """Per-endpoint request metrics of every worker process, in the Prometheus text format."""
+    return HttpResponse(instrumentation.render(instrumentation.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class EventStreamView(APIView):
+    """
+    Server-sent events for the caller (see api.events): new submissions for
+    instructors, reviews for students. This is the WSGI path; under ASGI the
+    same URL is served by ``events.EventStreamApp``. ``?timeout=`` closes the
+    stream sooner than ``EVENTS_MAX_SECONDS``.
+    """
+    authentication_classes = [QueryTokenJWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticatedAndActive]
+    renderer_classes = [JSONRenderer, events.EventStreamRenderer]
+
+    def get(self, request):
+        limit = getattr(settings, 'EVENTS_MAX_SECONDS', 300)
+        try:
+            timeout = min(float(request.query_params.get('timeout', limit)), limit)
+        except ValueError:
+            raise ValidationError({'timeout': 'Must be a number of seconds.'})
+        return events.stream_response(request.user.pk, max(timeout, 0))
@@ -0,0 +1,132 @@
+"""
+Denormalized submission counters on ``Assignment`` and ``Course``.
+
+Each row carries ``submission_count``, ``reviewed_count`` and
+``pending_review_count`` (``Course`` also ``enrollment_count``, kept by
+courses.services). Signals keep them current with ``F()`` updates, so
+concurrent writers never lose an increment; bulk paths call ``adjust``
+themselves. Every adjustment also bumps the course's and the catalog's
+response-cache versions, since the counters are part of the course and
+assignment representations and of the catalog summaries.
+``recount`` recomputes everything from the child tables to repair drift,
+e.g. after raw SQL or ``bulk_create``.
+"""
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from courses import membership, response_cache
+from courses.models import Course, Enrollment
+from .models import Assignment, Submission
+
+FIELDS = ('submission_count', 'reviewed_count', 'pending_review_count')
+
+
+def bucket(status):
+    return 'reviewed_count' if status == 'reviewed' else 'pending_review_count'
+
+
+def adjust(assignment_id, course_id=None, **deltas):
+    """
+    Add ``deltas`` (field -> int) to an assignment and its course: two
+    UPDATEs. Without ``course_id`` it comes from the membership cache, which
+    the permission checks have usually filled already.
+    """
+    _adjust(Assignment.objects.filter(pk=assignment_id), assignment_id, course_id, deltas)
+
+
+def _adjust(assignments, assignment_id, course_id, deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes or not assignments.update(**changes):
+        return
+    if course_id is None:
+        course_id = membership.assignment_course_id(assignment_id)
+    Course.objects.filter(pk=course_id).update(**changes)
+    response_cache.bump_course(course_id, catalog=True)
+
+
+def loaded_course_id(submission):
+    """The course id if the assignment is already loaded, else None."""
+    if Submission.assignment.is_cached(submission):
+        return submission.assignment.course_id
+    return None
+
+
+def submission_created(submission):
+    adjust(submission.assignment_id, loaded_course_id(submission),
+           submission_count=1, **{bucket(submission.status): 1})
+
+
+def status_changed(submission, old):
+    if bucket(old) != bucket(submission.status):
+        adjust(submission.assignment_id, loaded_course_id(submission),
+               **{bucket(old): -1, bucket(submission.status): 1})
+
+
+def submission_deleted(submission, status):
+    # Matches nothing once assignment_deleting has zeroed the assignment, so a
+    # cascade leaves the course alone; it already lost the assignment's totals.
+    _adjust(Assignment.objects.filter(pk=submission.assignment_id, submission_count__gt=0),
+            submission.assignment_id, loaded_course_id(submission),
+            {'submission_count': -1, bucket(status): -1})
+
+
+def assignment_deleting(assignment):
+    """
+    pre_delete: take the assignment's totals off its course and zero them, in
+    two UPDATEs that roll back with the delete.
+    """
+    current = Assignment.objects.filter(pk=assignment.pk)
+    Course.objects.filter(pk=assignment.course_id).update(**{
+        field: F(field) - Subquery(current.values(field)) for field in FIELDS
+    })
+    current.update(**{field: 0 for field in FIELDS})
+
+
+def _submission_totals(**outer):
+    """Subqueries counting submissions (all, reviewed, pending) per ``outer`` key."""
+    rows = Submission.objects.filter(**outer).order_by()
+    group = next(iter(outer))
+    totals = {}
+    for field, condition in (('submission_count', Q()), ('reviewed_count', Q(status='reviewed')),
+                             ('pending_review_count', ~Q(status='reviewed'))):
+        counted = rows.filter(condition).values(group).annotate(total=Count('id')).values('total')
+        totals[field] = Coalesce(Subquery(counted), 0)
+    return totals
+
+
+def recount(course_ids=None):
+    """
+    Recompute every counter in bulk (a handful of UPDATEs whatever the row
+    count). Returns the drifted rows as {'assignments': [(id, course_id)],
+    'courses': [id]}.
+    """
+    courses = Course.objects.all()
+    assignments = Assignment.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        assignments = assignments.filter(course_id__in=course_ids)
+
+    assignment_totals = _submission_totals(assignment=OuterRef('pk'))
+    drift = {'assignments': list(
+        assignments.annotate(**{f'actual_{f}': e for f, e in assignment_totals.items()})
+        .exclude(**{f: F(f'actual_{f}') for f in FIELDS}).values_list('id', 'course_id')
+    )}
+    assignments.update(**assignment_totals)
+
+    # Course totals are sums over the (now correct) assignment counters.
+    course_totals = {
+        field: Coalesce(Subquery(
+            Assignment.objects.filter(course=OuterRef('pk')).order_by().values('course')
+            .annotate(total=Sum(field)).values('total')
+        ), 0) for field in FIELDS
+    }
+    course_totals['enrollment_count'] = Coalesce(Subquery(
+        Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course')
+        .annotate(total=Count('id')).values('total')
+    ), 0)
+    drift['courses'] = list(
+        courses.annotate(**{f'actual_{f}': e for f, e in course_totals.items()})
+        .exclude(**{f: F(f'actual_{f}') for f in course_totals}).values_list('id', flat=True)
+    )
+    courses.update(**course_totals)
+    return drift
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='pending_review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='reviewed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='submission_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -9,6 +9,10 @@ class Assignment(models.Model):
     due_date = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by assignments.counters; repair with `manage.py recount_counters`.
+    submission_count = models.PositiveIntegerField(default=0)
+    reviewed_count = models.PositiveIntegerField(default=0)
+    pending_review_count = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f"{self.title} - {self.course.title}"
@@ -29,6 +33,13 @@ class Submission(models.Model):
     
     class Meta:
         unique_together = ('assignment', 'student')  # Ensures one submission per student per assignment
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        submission = super().from_db(db, field_names, values)
+        # The stored status, so the counters know which bucket a change leaves.
+        submission._loaded_status = submission.__dict__.get('status')
+        return submission
     
     def __str__(self):
         return f"Submission by {self.student} for {self.assignment.title}"
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Push events for submissions (delivered by api.events).
+
+``submission.created`` goes to the course instructor and
+``submission.reviewed`` to the student when the submission moves to
+reviewed (not when a reviewed one is saved again), once the write commits.
+The submission save hooks call these for single rows; the bulk review view
+calls ``submissions_reviewed`` with everything it newly reviewed.
+"""
+from api import events
+from courses import membership
+from .models import Assignment, Submission
+
+
+def _payload(submission, course_id):
+    return {
+        'submission': submission.pk,
+        'assignment': submission.assignment_id,
+        'course': course_id,
+        'student': submission.student_id,
+        'status': submission.status,
+    }
+
+
+def _instructor_id(submission, course_id):
+    """From the loaded assignment and course if there, else the membership cache."""
+    if Submission.assignment.is_cached(submission) and Assignment.course.is_cached(submission.assignment):
+        return submission.assignment.course.instructor_id
+    return membership.course_instructor_id(course_id)
+
+
+def submission_created(submission, course_id):
+    instructor_id = _instructor_id(submission, course_id)
+    if instructor_id:
+        data = dict(_payload(submission, course_id), submitted_at=submission.submitted_at)
+        events.publish_on_commit([events.event(instructor_id, 'submission.created', data)])
+
+
+def submissions_reviewed(submissions, course_id):
+    events.publish_on_commit([
+        events.event(submission.student_id, 'submission.reviewed', dict(
+            _payload(submission, course_id), feedback=submission.feedback, reviewed_at=submission.reviewed_at,
+        ))
+        for submission in submissions
+    ])
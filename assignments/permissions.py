@@ -1,5 +1,5 @@
 from rest_framework.permissions import BasePermission
-from courses.models import Course, Enrollment
+from courses import membership
 from .models import Assignment, Submission
 
 class IsTeacher(BasePermission):
@@ -18,18 +18,16 @@ class IsStudent(BasePermission):
 
 class IsCourseTeacher(BasePermission):
     """
-    Check if the user is the teacher of the course
+    Check if the user is the teacher of the course (taken from ``course_id``,
+    or from the assignment when the URL carries ``assignment_id``)
     """
     def has_permission(self, request, view):
         course_id = view.kwargs.get('course_id')
+        if not course_id and view.kwargs.get('assignment_id'):
+            course_id = membership.assignment_course_id(view.kwargs['assignment_id'], request)
         if not course_id:
             return False
-        
-        try:
-            course = Course.objects.get(pk=course_id)
-            return course.instructor == request.user
-        except Course.DoesNotExist:
-            return False
+        return membership.is_instructor(request, course_id)
 
 class IsAssignmentTeacher(BasePermission):
     """
@@ -37,31 +35,27 @@ class IsAssignmentTeacher(BasePermission):
     """
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Assignment):
-            return obj.course.instructor == request.user
+            return membership.is_instructor(request, obj.course_id)
         elif isinstance(obj, Submission):
-            return obj.assignment.course.instructor == request.user
+            return membership.is_instructor(request, membership.assignment_course_id(obj.assignment_id, request))
         return False
 
 class IsEnrolledStudent(BasePermission):
     """
-    Check if the student is enrolled in the course
+    Check if the student is enrolled in the course (taken from ``course_id``,
+    or from the assignment when the URL carries ``assignment_id``)
     """
     def has_permission(self, request, view):
         course_id = view.kwargs.get('course_id')
+        if not course_id and view.kwargs.get('assignment_id'):
+            course_id = membership.assignment_course_id(view.kwargs['assignment_id'], request)
         if not course_id:
             return False
-        
-        try:
-            return Enrollment.objects.filter(
-                student=request.user,
-                course_id=course_id
-            ).exists()
-        except Exception:
-            return False
+        return membership.is_enrolled(request, course_id)
 
 class IsSubmissionOwner(BasePermission):
     """
     Check if the user is the owner of the submission
     """
     def has_object_permission(self, request, view, obj):
-        return obj.student == request.user
\ No newline at end of file
+        return obj.student_id == request.user.pk
\ No newline at end of file
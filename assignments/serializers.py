@@ -4,8 +4,9 @@ from .models import Assignment, Submission
 class AssignmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Assignment
-        fields = ('id', 'course', 'title', 'description', 'due_date', 'created_at', 'updated_at')
-        read_only_fields = ('created_at', 'updated_at')
+        fields = ('id', 'course', 'title', 'description', 'due_date', 'created_at', 'updated_at',
+                  'submission_count', 'reviewed_count', 'pending_review_count')
+        read_only_fields = ('created_at', 'updated_at', 'submission_count', 'reviewed_count', 'pending_review_count')
 
 class SubmissionSerializer(serializers.ModelSerializer):
     student_name = serializers.SerializerMethodField()
@@ -23,4 +24,12 @@ class SubmissionReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Submission
         fields = ('id', 'status', 'feedback', 'reviewed_at')
-        read_only_fields = ('id', 'reviewed_at')
\ No newline at end of file
+        read_only_fields = ('id', 'reviewed_at')
+
+class ReviewItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    feedback = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    status = serializers.ChoiceField(choices=Submission.STATUS_CHOICES, default='reviewed')
+
+class BulkReviewSerializer(serializers.Serializer):
+    reviews = ReviewItemSerializer(many=True, allow_empty=False, max_length=1000)
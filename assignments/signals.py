@@ -0,0 +1,66 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from courses import changes, membership, response_cache
+from courses.models import ChangeLog
+from . import counters, notifications
+from .models import Assignment, Submission
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def forget_assignment_course(sender, instance, signal, **kwargs):
+    membership.forget_assignment(instance.pk)
+    # A deleted assignment's totals left the course counters in the catalog.
+    response_cache.bump_course(instance.course_id, catalog=signal is post_delete)
+
+
+@receiver(pre_delete, sender=Assignment)
+def drop_assignment_counters(sender, instance, **kwargs):
+    counters.assignment_deleting(instance)
+
+
+@receiver(post_save, sender=Submission)
+def count_submission(sender, instance, created, **kwargs):
+    if created:
+        counters.submission_created(instance)
+    elif getattr(instance, '_loaded_status', None) is not None:
+        counters.status_changed(instance, instance._loaded_status)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Submission)
+def uncount_submission(sender, instance, **kwargs):
+    counters.submission_deleted(instance, getattr(instance, '_loaded_status', None) or instance.status)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def log_assignment_change(sender, instance, signal, **kwargs):
+    action = ChangeLog.DELETE if signal is post_delete else ChangeLog.UPSERT
+    changes.record('assignment', instance.pk, instance.course_id, action=action)
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def log_submission_change(sender, instance, signal, **kwargs):
+    action = ChangeLog.DELETE if signal is post_delete else ChangeLog.UPSERT
+    changes.record('submission', instance.pk, _submission_course_id(instance), instance.student_id, action)
+
+
+@receiver(pre_save, sender=Submission)
+def remember_submission_status(sender, instance, **kwargs):
+    # count_submission moves _loaded_status on to the saved status.
+    instance._previous_status = getattr(instance, '_loaded_status', None)
+
+
+@receiver(post_save, sender=Submission)
+def push_submission_event(sender, instance, created, **kwargs):
+    if created:
+        notifications.submission_created(instance, _submission_course_id(instance))
+    elif instance.status == 'reviewed' and getattr(instance, '_previous_status', None) != 'reviewed':
+        notifications.submissions_reviewed([instance], _submission_course_id(instance))
+
+
+def _submission_course_id(submission):
+    return counters.loaded_course_id(submission) or membership.assignment_course_id(submission.assignment_id)
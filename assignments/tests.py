@@ -1,3 +1,329 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.idempotency import fingerprint
+from api.models import IdempotencyKey
+from courses.models import Course, Enrollment
+from courses.tests import QueryCountTestCase, make_user
+from .models import Assignment, Submission
+
+
+class AssignmentQueryCountTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.students = [make_user(f'student{i}@example.com', 'STUDENT') for i in range(12)]
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        Enrollment.objects.bulk_create(Enrollment(course=self.course, student=s) for s in self.students)
+        self.assignment = self.add_assignments(1)[0]
+        self.submit(2)
+
+    def add_assignments(self, count):
+        due = timezone.now() + timedelta(days=7)
+        return [
+            Assignment.objects.create(course=self.course, title=f'Homework {index}', description='d', due_date=due)
+            for index in range(count)
+        ]
+
+    def submit(self, count):
+        done = set(self.assignment.submissions.values_list('student_id', flat=True))
+        new = [s for s in self.students if s.pk not in done][:count]
+        Submission.objects.bulk_create(
+            Submission(assignment=self.assignment, student=s, content='answer') for s in new
+        )
+
+    # Each GET below includes one aggregate query for its ETag validators.
+    def test_assignment_list_for_teacher(self):
+        self.assertConstantQueries(3, self.teacher, f'/api/assignments/courses/{self.course.pk}/assignments/',
+                                   lambda: self.add_assignments(8))
+
+    def test_assignment_list_for_student(self):
+        self.assertConstantQueries(4, self.students[0], f'/api/assignments/courses/{self.course.pk}/assignments/',
+                                   lambda: self.add_assignments(8))
+
+    def test_submission_list_for_teacher(self):
+        self.assertConstantQueries(4, self.teacher, f'/api/assignments/assignments/{self.assignment.pk}/submissions/',
+                                   lambda: self.submit(10))
+
+    def test_submission_detail(self):
+        submission = self.assignment.submissions.first()
+        url = f'/api/assignments/submissions/{submission.pk}/'
+        self.assertLessEqual(self.count_queries(self.teacher, url), 3)
+        self.assertLessEqual(self.count_queries(submission.student, url), 1)
+
+    def test_assignment_detail(self):
+        url = f'/api/assignments/assignments/{self.assignment.pk}/'
+        self.assertLessEqual(self.count_queries(self.teacher, url), 3)
+        self.assertLessEqual(self.count_queries(self.students[0], url), 4)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.student = make_user('student@example.com', 'STUDENT')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.assignment = Assignment.objects.create(course=self.course, title='HW', description='d',
+                                                    due_date=timezone.now() + timedelta(days=7))
+        self.client.force_authenticate(self.teacher)
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_assignment_list_is_not_modified(self):
+        first, second = self.revalidate(f'/api/assignments/courses/{self.course.pk}/assignments/')
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        modified = self.client.get(f'/api/assignments/courses/{self.course.pk}/assignments/',
+                                   HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(modified.status_code, 304)
+
+    def test_edit_changes_etag(self):
+        url = f'/api/assignments/assignments/{self.assignment.pk}/'
+        first, _ = self.revalidate(url)
+        self.assignment.title = 'HW 1'
+        self.assignment.save()
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again['ETag'], first['ETag'])
+
+    def test_new_submission_changes_submission_list(self):
+        url = f'/api/assignments/assignments/{self.assignment.pk}/submissions/'
+        first, second = self.revalidate(url)
+        self.assertEqual(second.status_code, 304)
+        Submission.objects.create(assignment=self.assignment, student=self.student, content='answer')
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(len(again.json()), 1)
+
+    def test_outsider_is_still_forbidden(self):
+        outsider = make_user('outsider@example.com', 'STUDENT')
+        url = f'/api/assignments/assignments/{self.assignment.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+
+class IdempotentCreateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = make_user('teacher@example.com', 'TEACHER')
+        self.student = make_user('student@example.com', 'STUDENT')
+        course = Course.objects.create(instructor=teacher, title='Algebra', description='Intro')
+        Enrollment.objects.create(course=course, student=self.student)
+        self.assignment = Assignment.objects.create(course=course, title='HW', description='d',
+                                                    due_date=timezone.now() + timedelta(days=7))
+        self.url = f'/api/assignments/assignments/{self.assignment.pk}/submit/'
+        self.client.force_authenticate(self.student)
+
+    def submit(self, content='answer', **headers):
+        return self.client.post(self.url, {'assignment': self.assignment.pk, 'content': content},
+                                format='json', **headers)
+
+    def test_second_submission_is_a_conflict(self):
+        self.assertEqual(self.submit().status_code, 201)
+        self.assertEqual(self.submit().status_code, 409)
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_retry_with_same_key_replays_response(self):
+        first = self.submit(HTTP_IDEMPOTENCY_KEY='abc')
+        retry = self.submit(HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_key_reused_for_different_body_is_rejected(self):
+        self.submit(HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(self.submit(content='other', HTTP_IDEMPOTENCY_KEY='abc').status_code, 422)
+
+    def claim(self, age):
+        """A claim left without a response, as by a worker that died mid-request."""
+        request = APIRequestFactory().post(self.url, {'assignment': self.assignment.pk, 'content': 'answer'},
+                                           format='json')
+        request = Request(request, parsers=[JSONParser()])
+        record = IdempotencyKey.objects.create(user=self.student, key='abc', fingerprint=fingerprint(request))
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - age)
+
+    def test_claim_in_progress_is_a_conflict(self):
+        self.claim(timedelta(seconds=5))
+        self.assertEqual(self.submit(HTTP_IDEMPOTENCY_KEY='abc').status_code, 409)
+        self.assertEqual(Submission.objects.count(), 0)
+
+    def test_abandoned_claim_can_be_retried(self):
+        self.claim(timedelta(minutes=5))
+        self.assertEqual(self.submit(HTTP_IDEMPOTENCY_KEY='abc').status_code, 201)
+        retry = self.submit(HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Submission.objects.count(), 1)
+
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.students = [make_user(f'student{i}@example.com', 'STUDENT') for i in range(3)]
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        for student in self.students:
+            Enrollment.objects.create(course=self.course, student=student)
+        self.assignment = Assignment.objects.create(course=self.course, title='HW', description='d',
+                                                    due_date=timezone.now() + timedelta(days=7))
+        for student in self.students:
+            self.client.force_authenticate(student)
+            self.client.post(f'/api/assignments/assignments/{self.assignment.pk}/submit/',
+                             {'assignment': self.assignment.pk, 'content': 'answer'}, format='json')
+        self.client.force_authenticate(self.teacher)
+
+    def assertCounts(self, submissions, reviewed, pending):
+        for row in (Assignment.objects.get(pk=self.assignment.pk), Course.objects.get(pk=self.course.pk)):
+            self.assertEqual((row.submission_count, row.reviewed_count, row.pending_review_count),
+                             (submissions, reviewed, pending), row)
+
+    def test_submissions_are_counted(self):
+        self.assertCounts(3, 0, 3)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).enrollment_count, 3)
+
+    def test_review_moves_counts(self):
+        submission = self.assignment.submissions.first()
+        self.client.patch(f'/api/assignments/submissions/{submission.pk}/review/', {'feedback': 'ok'},
+                          format='json')
+        self.assertCounts(3, 1, 2)
+        # Reviewing again changes nothing.
+        self.client.patch(f'/api/assignments/submissions/{submission.pk}/review/', {'feedback': 'ok'},
+                          format='json')
+        self.assertCounts(3, 1, 2)
+
+    def test_bulk_review_moves_counts(self):
+        ids = list(self.assignment.submissions.values_list('id', flat=True))
+        reviews = [{'id': pk} for pk in ids] + [{'id': ids[0], 'status': 'submitted'}]
+        self.client.post(f'/api/assignments/assignments/{self.assignment.pk}/submissions/review/',
+                         {'reviews': reviews}, format='json')
+        self.assertCounts(3, 3, 0)
+        self.client.post(f'/api/assignments/assignments/{self.assignment.pk}/submissions/review/',
+                         {'reviews': [{'id': ids[0], 'status': 'submitted'}]}, format='json')
+        self.assertCounts(3, 2, 1)
+
+    def test_delete_uncounts(self):
+        self.assignment.submissions.first().delete()
+        self.assertCounts(2, 0, 2)
+        self.assignment.delete()
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertEqual((course.submission_count, course.pending_review_count), (0, 0))
+
+    def test_rolled_back_assignment_delete_keeps_counting(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Assignment.objects.filter(pk=self.assignment.pk).delete()
+            raise RuntimeError
+        self.assertCounts(3, 0, 3)
+        self.assignment.submissions.first().delete()
+        self.assertCounts(2, 0, 2)
+
+    def test_counters_are_exposed(self):
+        response = self.client.get(f'/api/assignments/assignments/{self.assignment.pk}/')
+        self.assertEqual(response.json()['pending_review_count'], 3)
+        response = self.client.get(f'/api/courses/courses/{self.course.pk}/')
+        self.assertEqual(response.json()['submission_count'], 3)
+
+    def test_recount_repairs_drift(self):
+        Assignment.objects.update(submission_count=7, reviewed_count=7)
+        Course.objects.update(enrollment_count=0, pending_review_count=0)
+        out = StringIO()
+        call_command('recount_counters', stdout=out)
+        self.assertIn('1 course(s) and 1 assignment(s) had drifted', out.getvalue())
+        self.assertCounts(3, 0, 3)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).enrollment_count, 3)
+
+
+class BulkReviewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        first, second = make_user('a@example.com', 'STUDENT'), make_user('b@example.com', 'STUDENT')
+        course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        other_course = Course.objects.create(instructor=make_user('other@example.com', 'TEACHER'),
+                                             title='Poetry', description='Intro')
+        due = timezone.now() + timedelta(days=1)
+        self.assignment = Assignment.objects.create(course=course, title='HW1', description='d', due_date=due)
+        sibling = Assignment.objects.create(course=course, title='HW2', description='d', due_date=due)
+        foreign = Assignment.objects.create(course=other_course, title='Essay', description='d', due_date=due)
+        self.first = Submission.objects.create(assignment=self.assignment, student=first, content='answer')
+        self.second = Submission.objects.create(assignment=self.assignment, student=second, content='answer')
+        self.sibling = Submission.objects.create(assignment=sibling, student=first, content='answer')
+        self.foreign = Submission.objects.create(assignment=foreign, student=first, content='answer')
+        self.client.force_authenticate(self.teacher)
+
+    def review(self, reviews):
+        return self.client.post(reverse('submission-bulk-review', kwargs={'assignment_id': self.assignment.pk}),
+                                {'reviews': reviews}, format='json')
+
+    def test_results_follow_the_request_order(self):
+        response = self.review([
+            {'id': 999999}, {'id': self.second.pk, 'feedback': 'Good'}, {'id': self.first.pk},
+            {'id': self.second.pk, 'feedback': 'Ignored'}, {'id': self.first.pk, 'status': 'submitted'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual([(row['id'], row['status']) for row in response.json()['results']], [
+            (999999, 'not_found'), (self.second.pk, 'updated'), (self.first.pk, 'updated'),
+            (self.second.pk, 'duplicate'), (self.first.pk, 'duplicate'),
+        ])
+        # The first review of an id wins.
+        self.second.refresh_from_db()
+        self.first.refresh_from_db()
+        self.assertEqual((self.second.status, self.second.feedback), ('reviewed', 'Good'))
+        self.assertEqual(self.first.status, 'reviewed')
+
+    def test_submissions_outside_the_assignment_are_not_found(self):
+        response = self.review([{'id': self.foreign.pk}, {'id': self.sibling.pk}, {'id': self.first.pk}])
+        self.assertEqual([row['status'] for row in response.json()['results']],
+                         ['not_found', 'not_found', 'updated'])
+        self.assertEqual(Submission.objects.filter(status='reviewed').get(), self.first)
+
+    def test_only_the_course_teacher_may_review(self):
+        self.client.force_authenticate(self.foreign.assignment.course.instructor)
+        self.assertEqual(self.review([{'id': self.first.pk}]).status_code, 403)
+        self.assertFalse(Submission.objects.filter(status='reviewed').exists())
+
+
+class GradebookTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.first, self.second = make_user('a@example.com', 'STUDENT'), make_user('b@example.com', 'STUDENT')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        for student in (self.first, self.second):
+            Enrollment.objects.create(course=self.course, student=student)
+        now = timezone.now()
+        self.past = Assignment.objects.create(course=self.course, title='Past', description='d',
+                                              due_date=now - timedelta(days=1))
+        self.future = Assignment.objects.create(course=self.course, title='Future', description='d',
+                                                due_date=now + timedelta(days=1))
+        Submission.objects.create(assignment=self.past, student=self.first, content='late answer')
+        Submission.objects.create(assignment=self.future, student=self.second, content='answer',
+                                  status='reviewed', reviewed_at=now)
+
+    def test_unsubmitted_work_is_missing_only_once_due(self):
+        self.client.force_authenticate(self.teacher)
+        response = self.client.get(reverse('course-gradebook', kwargs={'course_id': self.course.pk}))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['assignments']['id'], [self.past.pk, self.future.pk])
+        rows = dict(zip(body['students']['id'], body['status']))
+        legend = {int(code): name for code, name in body['legend'].items()}
+        self.assertEqual([legend[code] for code in rows[self.first.pk]], ['late', 'pending'])
+        self.assertEqual([legend[code] for code in rows[self.second.pk]], ['missing', 'reviewed'])
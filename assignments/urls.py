@@ -2,16 +2,20 @@ from django.urls import path
 from .views import (
     AssignmentListCreateView, AssignmentDetailView,
     SubmissionCreateView, SubmissionListView,
-    SubmissionDetailView, SubmissionReviewView
+    SubmissionDetailView, SubmissionReviewView, GradebookView,
+    SubmissionExportView, BulkSubmissionReviewView
 )
 
 urlpatterns = [
     # Assignment URLs
     path('courses/<int:course_id>/assignments/', AssignmentListCreateView.as_view(), name='assignment-list-create'),
     path('assignments/<int:pk>/', AssignmentDetailView.as_view(), name='assignment-detail'),
+    path('courses/<int:course_id>/gradebook/', GradebookView.as_view(), name='course-gradebook'),
     
     # Submission URLs
     path('assignments/<int:assignment_id>/submissions/', SubmissionListView.as_view(), name='submission-list'),
+    path('assignments/<int:assignment_id>/submissions/export/', SubmissionExportView.as_view(), name='submission-export'),
+    path('assignments/<int:assignment_id>/submissions/review/', BulkSubmissionReviewView.as_view(), name='submission-bulk-review'),
     path('assignments/<int:assignment_id>/submit/', SubmissionCreateView.as_view(), name='submission-create'),
     path('submissions/<int:pk>/', SubmissionDetailView.as_view(), name='submission-detail'),
     path('submissions/<int:pk>/review/', SubmissionReviewView.as_view(), name='submission-review'),
@@ -1,20 +1,31 @@
+from django.db import IntegrityError
+from django.db.models import Count, Max, Sum
 from django.utils import timezone
-from rest_framework import generics, permissions, status
+from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from courses import changes, membership
+from courses.response_cache import CachedResponseMixin
 from courses.models import Course, Enrollment
 from accounts.permissions import IsAuthenticatedAndActive
+from api.conditional import ConditionalGetMixin
+from api.exceptions import Conflict
+from api.idempotency import IdempotentCreateMixin
+from api.sqlite import serialized_write
+from api.streaming import EXPORT_RENDERERS, EXPORT_CHUNK_SIZE, stream_rows
+from . import counters, notifications
 from .models import Assignment, Submission
-from .serializers import AssignmentSerializer, SubmissionSerializer, SubmissionReviewSerializer
+from .serializers import AssignmentSerializer, SubmissionSerializer, SubmissionReviewSerializer, BulkReviewSerializer
 from .permissions import (
     IsTeacher, IsStudent, IsCourseTeacher, IsAssignmentTeacher,
     IsEnrolledStudent, IsSubmissionOwner
 )
 
-class AssignmentListCreateView(generics.ListCreateAPIView):
+class AssignmentListCreateView(ConditionalGetMixin, CachedResponseMixin, generics.ListCreateAPIView):
     serializer_class = AssignmentSerializer
     permission_classes = [IsAuthenticatedAndActive]
+    cache_scope = 'assignment-list'
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -24,19 +35,26 @@ class AssignmentListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         course_id = self.kwargs['course_id']
         # Check if user is teacher of the course or enrolled student
-        course = Course.objects.get(pk=course_id)
-        if course.instructor == self.request.user:
-            return Assignment.objects.filter(course_id=course_id)
-        elif self.request.user.is_student and Enrollment.objects.filter(student=self.request.user, course_id=course_id).exists():
+        if membership.is_member(self.request, course_id):
             return Assignment.objects.filter(course_id=course_id)
         return Assignment.objects.none()
 
+    def cache_course_id(self):
+        return self.kwargs['course_id']
+
+    def get_validators(self):
+        state = self.get_queryset().aggregate(
+            updated=Max('updated_at'), total=Count('id'),
+            submissions=Sum('submission_count'), reviewed=Sum('reviewed_count'),
+        )
+        return state['updated'], state['total'], state['submissions'], state['reviewed']
+
     def perform_create(self, serializer):
         course_id = self.kwargs['course_id']
         course = Course.objects.get(pk=course_id)
         serializer.save(course=course)
 
-class AssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AssignmentDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AssignmentSerializer
     queryset = Assignment.objects.all()
     permission_classes = [IsAuthenticatedAndActive]
@@ -49,56 +67,90 @@ class AssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_object(self):
         obj = super().get_object()
         # Check if user is teacher of the course or enrolled student
-        if obj.course.instructor == self.request.user:
-            return obj
-        elif self.request.user.is_student and Enrollment.objects.filter(student=self.request.user, course=obj.course).exists():
+        if membership.is_member(self.request, obj.course_id):
             return obj
         self.permission_denied(self.request)
 
-class SubmissionCreateView(generics.CreateAPIView):
+    def get_validators(self):
+        state = Assignment.objects.filter(pk=self.kwargs['pk']).values_list(
+            'course_id', 'updated_at', 'submission_count', 'reviewed_count').first()
+        # Missing or not visible: let get_object() answer 404/403.
+        if state is None or not membership.is_member(self.request, state[0]):
+            return None
+        return state
+
+class SubmissionCreateView(IdempotentCreateMixin, generics.CreateAPIView):
     serializer_class = SubmissionSerializer
     permission_classes = [IsAuthenticatedAndActive, IsStudent, IsEnrolledStudent]
 
     def perform_create(self, serializer):
         assignment_id = self.kwargs['assignment_id']
-        assignment = Assignment.objects.get(pk=assignment_id)
-        
-        # Check if student already submitted
-        if Submission.objects.filter(student=self.request.user, assignment=assignment).exists():
-            raise permissions.PermissionDenied("You have already submitted for this assignment.")
-        
-        serializer.save(student=self.request.user, assignment=assignment)
+        # The course comes along for the new-submission event to its instructor.
+        assignment = Assignment.objects.select_related('course').get(pk=assignment_id)
 
-class SubmissionListView(generics.ListAPIView):
+        # unique_together (assignment, student) rejects a second submission.
+        try:
+            with serialized_write():
+                serializer.save(student=self.request.user, assignment=assignment)
+        except IntegrityError:
+            raise Conflict("You have already submitted for this assignment.")
+
+class SubmissionListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = SubmissionSerializer
     permission_classes = [IsAuthenticatedAndActive]
 
     def get_queryset(self):
         assignment_id = self.kwargs['assignment_id']
-        assignment = Assignment.objects.get(pk=assignment_id)
+        course_id = membership.assignment_course_id(assignment_id, self.request)
         
         # Teachers see all submissions for their course assignments
-        if assignment.course.instructor == self.request.user:
-            return Submission.objects.filter(assignment_id=assignment_id)
+        if membership.is_instructor(self.request, course_id):
+            return Submission.objects.filter(assignment_id=assignment_id).select_related('student')
         
         # Students see only their own submissions
         elif self.request.user.is_student:
             return Submission.objects.filter(
                 assignment_id=assignment_id,
                 student=self.request.user
-            )
+            ).select_related('student')
         
         return Submission.objects.none()
 
+    def get_validators(self):
+        state = self.get_queryset().aggregate(
+            submitted=Max('submitted_at'), reviewed=Max('reviewed_at'), total=Count('id'),
+        )
+        return state['submitted'], state['reviewed'], state['total']
+
+class SubmissionExportView(APIView):
+    """
+    Stream every submission of an assignment as CSV (default) or JSON Lines
+    (``?format=jsonl``), reading the table in chunks.
+    """
+    permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsCourseTeacher]
+    renderer_classes = EXPORT_RENDERERS
+
+    COLUMNS = ('id', 'student_id', 'student_email', 'student_first_name', 'student_last_name',
+               'status', 'submitted_at', 'reviewed_at', 'feedback', 'content')
+
+    def get(self, request, assignment_id):
+        rows = Submission.objects.filter(assignment_id=assignment_id).order_by('id').values_list(
+            'id', 'student_id', 'student__email', 'student__first_name', 'student__last_name',
+            'status', 'submitted_at', 'reviewed_at', 'feedback', 'content',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return stream_rows(request, self.COLUMNS, rows, f'assignment-{assignment_id}-submissions')
+
 class SubmissionDetailView(generics.RetrieveAPIView):
     serializer_class = SubmissionSerializer
-    queryset = Submission.objects.all()
+    queryset = Submission.objects.select_related('student')
     permission_classes = [IsAuthenticatedAndActive]
 
     def get_object(self):
         obj = super().get_object()
         # Teacher of the course or owner of the submission
-        if obj.assignment.course.instructor == self.request.user or obj.student == self.request.user:
+        if obj.student_id == self.request.user.pk:
+            return obj
+        if membership.is_instructor(self.request, membership.assignment_course_id(obj.assignment_id, self.request)):
             return obj
         self.permission_denied(self.request)
 
@@ -108,4 +160,148 @@ class SubmissionReviewView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsAssignmentTeacher]
 
     def perform_update(self, serializer):
-        serializer.save(status='reviewed', reviewed_at=timezone.now())
\ No newline at end of file
+        serializer.save(status='reviewed', reviewed_at=timezone.now())
+
+class BulkSubmissionReviewView(generics.GenericAPIView):
+    """
+    Review many submissions of one assignment at once. Ownership of every
+    submission is checked in the same query that loads them; changes are
+    written with one bulk_update and a shared reviewed_at timestamp, and the
+    review counters move by the net change in one adjustment; the change feed
+    gets one batched insert and each newly reviewed student one push event.
+    """
+    serializer_class = BulkReviewSerializer
+    permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsCourseTeacher]
+
+    def post(self, request, assignment_id):
+        data = {'reviews': request.data} if isinstance(request.data, list) else request.data
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        reviews = serializer.validated_data['reviews']
+
+        wanted = {}
+        for item in reviews:
+            wanted.setdefault(item['id'], item)
+
+        now = timezone.now()
+        moved = {'reviewed_count': 0, 'pending_review_count': 0}
+        newly_reviewed = []
+        with serialized_write():
+            submissions = {
+                submission.pk: submission for submission in Submission.objects.filter(
+                    pk__in=list(wanted), assignment_id=assignment_id,
+                    assignment__course__instructor=request.user,
+                ).only('id', 'assignment_id', 'student_id', 'status', 'feedback', 'reviewed_at')
+            }
+            outcomes = {}
+            for pk, item in wanted.items():
+                submission = submissions.get(pk)
+                if submission is None:
+                    outcomes[pk] = {'id': pk, 'status': 'not_found'}
+                    continue
+                # bulk_update skips post_save; net out the counter changes here.
+                moved[counters.bucket(submission.status)] -= 1
+                moved[counters.bucket(item['status'])] += 1
+                if item['status'] == 'reviewed' and submission.status != 'reviewed':
+                    newly_reviewed.append(submission)
+                submission.status = item['status']
+                if 'feedback' in item:
+                    submission.feedback = item['feedback']
+                submission.reviewed_at = now if item['status'] == 'reviewed' else None
+                outcomes[pk] = {'id': pk, 'status': 'updated', 'submission_status': submission.status}
+            Submission.objects.bulk_update(
+                submissions.values(), ['status', 'feedback', 'reviewed_at'], batch_size=500
+            )
+            course_id = membership.assignment_course_id(assignment_id, request)
+            counters.adjust(assignment_id, course_id, **moved)
+            changes.record_many('submission', (
+                (submission.pk, course_id, submission.student_id) for submission in submissions.values()
+            ))
+            notifications.submissions_reviewed(newly_reviewed, course_id)
+
+        # One result per review, in request order; repeats of an id are not applied.
+        results = []
+        for item in reviews:
+            outcome = outcomes.pop(item['id'], None)
+            results.append(outcome or {'id': item['id'], 'status': 'duplicate'})
+        return Response({
+            'assignment': assignment_id,
+            'reviewed_at': now,
+            'updated': len(submissions),
+            'results': results,
+        })
+
+    patch = post
+
+class GradebookView(APIView):
+    """
+    Students x assignments matrix for a course, built from three narrow
+    queries (roster, assignments, submissions) and returned column-wise:
+    ``status[i][j]`` is student ``i`` on assignment ``j``, timestamps are Unix
+    epoch seconds. Nothing submitted is ``missing`` once the assignment is
+    past due and ``pending`` before.
+    """
+    permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsCourseTeacher]
+
+    MISSING, SUBMITTED, LATE, REVIEWED, REVIEWED_LATE, PENDING = range(6)
+    LEGEND = {MISSING: 'missing', SUBMITTED: 'submitted', LATE: 'late',
+              REVIEWED: 'reviewed', REVIEWED_LATE: 'reviewed_late', PENDING: 'pending'}
+
+    def get(self, request, course_id):
+        roster = list(
+            Enrollment.objects.filter(course_id=course_id)
+            .order_by('student__last_name', 'student__first_name', 'student_id')
+            .values_list('student_id', 'student__first_name', 'student__last_name', 'student__email')
+        )
+        assignments = list(
+            Assignment.objects.filter(course_id=course_id).order_by('due_date', 'id')
+            .values_list('id', 'title', 'due_date')
+        )
+        rows = {student_id: index for index, (student_id, _, _, _) in enumerate(roster)}
+        columns = {assignment_id: index for index, (assignment_id, _, _) in enumerate(assignments)}
+        due_dates = [due_date for _, _, due_date in assignments]
+
+        width = len(assignments)
+        now = timezone.now()
+        unsubmitted = [self.MISSING if due_date < now else self.PENDING for due_date in due_dates]
+        status_matrix = [list(unsubmitted) for _ in roster]
+        submitted_matrix = [[None] * width for _ in roster]
+        reviewed_matrix = [[None] * width for _ in roster]
+
+        # Filter on the assignment ids already in hand so SQLite walks the
+        # (assignment, student) unique index instead of joining.
+        submissions = Submission.objects.filter(assignment_id__in=list(columns)).values_list(
+            'assignment_id', 'student_id', 'status', 'submitted_at', 'reviewed_at'
+        )
+        for assignment_id, student_id, state, submitted_at, reviewed_at in submissions.iterator():
+            row = rows.get(student_id)
+            if row is None:
+                continue  # no longer enrolled
+            column = columns[assignment_id]
+            late = submitted_at > due_dates[column]
+            if state == 'reviewed':
+                code = self.REVIEWED_LATE if late else self.REVIEWED
+            else:
+                code = self.LATE if late else self.SUBMITTED
+            status_matrix[row][column] = code
+            submitted_matrix[row][column] = int(submitted_at.timestamp())
+            if reviewed_at is not None:
+                reviewed_matrix[row][column] = int(reviewed_at.timestamp())
+
+        return Response({
+            'course': course_id,
+            'students': {
+                'id': [student_id for student_id, _, _, _ in roster],
+                'name': [f"{first} {last}" for _, first, last, _ in roster],
+                'email': [email for _, _, _, email in roster],
+            },
+            'assignments': {
+                'id': [assignment_id for assignment_id, _, _ in assignments],
+                'title': [title for _, title, _ in assignments],
+                'due_date': [int(due_date.timestamp()) for due_date in due_dates],
+            },
+            'legend': self.LEGEND,
+            'status': status_matrix,
+            'submitted_at': submitted_matrix,
+            'reviewed_at': reviewed_matrix,
+        })
@@ -6,4 +6,19 @@ from .models import *
 
 
 admin.site.register(Course)
-admin.site.register(Enrollment)
\ No newline at end of file
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(admin.ModelAdmin):
+    list_select_related = ('student', 'course')
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('course', 'student', 'created_at')
+    list_select_related = ('student', 'course')
+
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model', 'object_id', 'action', 'course_id', 'changed_at')
+    list_filter = ('model', 'action')
@@ -0,0 +1,138 @@
+"""
+Delta-sync change feed.
+
+Every create, update and delete of a ``Course``, ``Enrollment``,
+``Assignment`` or ``Submission`` appends a ``ChangeLog`` row (the signals do
+it for single rows, bulk paths call ``record_many``). A client keeps the
+``cursor`` of its last sync and asks for what changed since:
+
+- ``feed`` reads the visible log rows after the cursor in one indexed query,
+  so a sync with nothing new costs exactly that query;
+- several changes to one row collapse into its latest state, fetched with
+  one query per model; rows deleted since are returned as tombstones.
+
+Visibility follows the list endpoints: students see their own enrollments
+and submissions plus the courses and assignments they are enrolled in,
+teachers everything in the courses they teach, admins everything. A course
+and its assignments become visible to a student when they enroll, but were
+logged before that; a window holding the student's new enrollment also
+returns the course and all of its assignments. A student who leaves a
+course gets the enrollment tombstone and should drop the course's data.
+The stored counters are aggregates and do not log changes of their own;
+they are current whenever their row is returned.
+"""
+from django.db.models import BigIntegerField, Q, Value
+
+from .models import ChangeLog, Course, Enrollment
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+BATCH_SIZE = 500
+
+
+def record(model, object_id, course_id, owner_id=None, action=ChangeLog.UPSERT):
+    ChangeLog.objects.create(model=model, object_id=object_id, course_id=course_id, owner_id=owner_id,
+                             action=action)
+
+
+def record_many(model, rows, action=ChangeLog.UPSERT):
+    """Log ``rows`` of (object_id, course_id, owner_id) in batched INSERTs."""
+    ChangeLog.objects.bulk_create(
+        [ChangeLog(model=model, object_id=object_id, course_id=course_id, owner_id=owner_id, action=action)
+         for object_id, course_id, owner_id in rows],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def seed(course_ids=None):
+    """Log every existing row (of ``course_ids``) as an upsert, for data written around the signals."""
+    from assignments.models import Assignment, Submission
+
+    # model -> (rows of (object_id, course_id, owner_id), course lookup)
+    sources = {
+        'course': (Course.objects.values_list('id', 'id', 'instructor_id'), 'id'),
+        'enrollment': (Enrollment.objects.values_list('id', 'course_id', 'student_id'), 'course_id'),
+        'assignment': (Assignment.objects.values_list('id', 'course_id', Value(None, BigIntegerField())), 'course_id'),
+        'submission': (Submission.objects.values_list('id', 'assignment__course_id', 'student_id'),
+                       'assignment__course_id'),
+    }
+    for model, (rows, course_lookup) in sources.items():
+        if course_ids is not None:
+            rows = rows.filter(**{f'{course_lookup}__in': course_ids})
+        record_many(model, rows.order_by('id').iterator())
+
+
+def _synced():
+    """model name -> (key in the response, queryset, serializer class)."""
+    from assignments.models import Assignment, Submission
+    from assignments.serializers import AssignmentSerializer, SubmissionSerializer
+    from .serializers import CourseSummarySerializer, SyncEnrollmentSerializer
+
+    return {
+        'course': ('courses', Course.objects.all(), CourseSummarySerializer),
+        'enrollment': ('enrollments', Enrollment.objects.all(), SyncEnrollmentSerializer),
+        'assignment': ('assignments', Assignment.objects.all(), AssignmentSerializer),
+        'submission': ('submissions', Submission.objects.select_related('student'), SubmissionSerializer),
+    }
+
+
+def visible(user):
+    """The log rows ``user`` may see."""
+    if user.role == 'ADMIN' or user.is_superuser:
+        return ChangeLog.objects.all()
+    if user.role == 'TEACHER':
+        taught = Course.objects.filter(instructor=user).values('id')
+        # The owner clause keeps the tombstone of a course the teacher deleted.
+        return ChangeLog.objects.filter(Q(course_id__in=taught) | Q(model='course', owner_id=user.pk))
+    enrolled = Enrollment.objects.filter(student=user).values('course_id')
+    return ChangeLog.objects.filter(
+        Q(owner_id=user.pk) | Q(model__in=('course', 'assignment'), course_id__in=enrolled)
+    )
+
+
+def feed(user, since=0, limit=DEFAULT_LIMIT):
+    """
+    Changes visible to ``user`` after cursor ``since``, at most ``limit`` log
+    rows. Returns {'cursor', 'has_more', 'changes': {name: [rows]},
+    'deleted': {name: [ids]}}; pass ``cursor`` back as the next ``since``
+    (repeat at once while ``has_more``).
+    """
+    entries = list(
+        visible(user).filter(id__gt=since).order_by('id')
+        .values_list('id', 'model', 'object_id', 'action', 'course_id', 'owner_id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest, joined = {}, {}
+    for _, model, object_id, action, course_id, owner_id in entries:
+        latest[model, object_id] = action
+        if model == 'enrollment' and owner_id == user.pk:
+            joined[course_id] = action
+    joined = [course_id for course_id, action in joined.items() if action == ChangeLog.UPSERT]
+
+    synced = _synced()
+    if joined:
+        # Logged before the student could see them, so behind their cursor.
+        for course_id in joined:
+            latest['course', course_id] = ChangeLog.UPSERT
+        for assignment_id in synced['assignment'][1].filter(course_id__in=joined).values_list('id', flat=True):
+            latest.setdefault(('assignment', assignment_id), ChangeLog.UPSERT)
+    changes = {name: [] for name, _, _ in synced.values()}
+    deleted = {name: [] for name, _, _ in synced.values()}
+    for model, (name, queryset, serializer_class) in synced.items():
+        ids = [object_id for (kind, object_id), action in latest.items() if kind == model]
+        upserts = [object_id for object_id in ids if latest[model, object_id] == ChangeLog.UPSERT]
+        rows = {}
+        if upserts:
+            rows = {row.pk: row for row in queryset.filter(pk__in=upserts)}
+            changes[name] = serializer_class(sorted(rows.values(), key=lambda row: row.pk), many=True).data
+        # Rows gone since they were logged are deleted as far as the client is concerned.
+        deleted[name] = sorted(object_id for object_id in ids if object_id not in rows)
+
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': deleted,
+    }
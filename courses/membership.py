@@ -0,0 +1,116 @@
+"""
+Cached course membership lookups.
+
+Answers "is this user the instructor of / enrolled in course C" for the
+permission classes and views. Each answer is memoized on the request and
+backed by Django's cache; ``courses.signals`` and ``assignments.signals``
+delete the affected keys whenever a Course, Enrollment or Assignment is saved
+or deleted, so entries never need to be scanned or versioned.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.db_routers import cache_timeout
+
+MEMBERSHIP_CACHE_TTL = getattr(settings, 'MEMBERSHIP_CACHE_TTL', 300)
+
+
+def instructor_key(course_id):
+    return f'membership:course:{course_id}:instructor'
+
+
+def enrollment_key(course_id, user_id):
+    return f'membership:course:{course_id}:student:{user_id}'
+
+
+def assignment_key(assignment_id):
+    return f'membership:assignment:{assignment_id}:course'
+
+
+def _memo(request):
+    if request is None:
+        return {}
+    # DRF's Request wraps the HttpRequest; memoize on the underlying one so
+    # permission classes and views share it.
+    request = getattr(request, '_request', request)
+    memo = getattr(request, '_membership_memo', None)
+    if memo is None:
+        memo = request._membership_memo = {}
+    return memo
+
+
+def _lookup(request, key, loader):
+    memo = _memo(request)
+    if key in memo:
+        return memo[key]
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        cache.set(key, value, cache_timeout(MEMBERSHIP_CACHE_TTL))
+    memo[key] = value
+    return value
+
+
+def course_instructor_id(course_id, request=None):
+    """Instructor id of the course, or 0 if the course does not exist."""
+    Course = apps.get_model('courses', 'Course')
+
+    def load():
+        return Course.objects.filter(pk=course_id).values_list('instructor_id', flat=True).first() or 0
+    return _lookup(request, instructor_key(course_id), load)
+
+
+def assignment_course_id(assignment_id, request=None):
+    """Course id of the assignment, or 0 if the assignment does not exist."""
+    Assignment = apps.get_model('assignments', 'Assignment')
+
+    def load():
+        return Assignment.objects.filter(pk=assignment_id).values_list('course_id', flat=True).first() or 0
+    return _lookup(request, assignment_key(assignment_id), load)
+
+
+def is_instructor(request, course_id):
+    user = request.user
+    if not course_id or not user.is_authenticated:
+        return False
+    return course_instructor_id(course_id, request) == user.pk
+
+
+def is_enrolled(request, course_id):
+    user = request.user
+    if not course_id or not user.is_authenticated:
+        return False
+    Enrollment = apps.get_model('courses', 'Enrollment')
+
+    def load():
+        return Enrollment.objects.filter(course_id=course_id, student_id=user.pk).exists()
+    return _lookup(request, enrollment_key(course_id, user.pk), load)
+
+
+def is_member(request, course_id):
+    """Instructor of, or enrolled in, the course."""
+    return is_instructor(request, course_id) or is_enrolled(request, course_id)
+
+
+def forget(*keys):
+    """
+    Drop cache entries now and again once the surrounding transaction
+    commits, so a concurrent reader cannot re-cache pre-commit state.
+    """
+    keys = list(keys)
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_course(course_id):
+    forget(instructor_key(course_id))
+
+
+def forget_enrollments(course_id, user_ids):
+    forget(*[enrollment_key(course_id, user_id) for user_id in user_ids])
+
+
+def forget_assignment(assignment_id):
+    forget(assignment_key(assignment_id))
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_submissions(apps, schema_editor):
+    Assignment = apps.get_model('assignments', 'Assignment')
+    Submission = apps.get_model('assignments', 'Submission')
+    Course = apps.get_model('courses', 'Course')
+    buckets = {'submission_count': Q(), 'reviewed_count': Q(status='reviewed'),
+               'pending_review_count': ~Q(status='reviewed')}
+    Assignment.objects.update(**{
+        field: Coalesce(Subquery(
+            Submission.objects.filter(condition, assignment=OuterRef('pk')).order_by()
+            .values('assignment').annotate(total=Count('id')).values('total')
+        ), 0) for field, condition in buckets.items()
+    })
+    Course.objects.update(**{
+        field: Coalesce(Subquery(
+            Assignment.objects.filter(course=OuterRef('pk')).order_by()
+            .values('course').annotate(total=Sum(field)).values('total')
+        ), 0) for field in buckets
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_capacity_waitlist'),
+        ('assignments', '0002_submission_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='pending_review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='reviewed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='submission_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+def seed_changes(apps, schema_editor):
+    # Existing rows appear as upserts, so a sync from cursor 0 sees everything.
+    ChangeLog = apps.get_model('courses', 'ChangeLog')
+    sources = (
+        ('course', apps.get_model('courses', 'Course').objects.values_list('id', 'id', 'instructor_id')),
+        ('enrollment', apps.get_model('courses', 'Enrollment').objects.values_list('id', 'course_id', 'student_id')),
+        ('assignment', apps.get_model('assignments', 'Assignment').objects.values_list(
+            'id', 'course_id', models.Value(None, models.BigIntegerField()))),
+        ('submission', apps.get_model('assignments', 'Submission').objects.values_list(
+            'id', 'assignment__course_id', 'student_id')),
+    )
+    for model, rows in sources:
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(model=model, object_id=pk, course_id=course_id, owner_id=owner_id)
+             for pk, course_id, owner_id in rows.order_by('id').iterator()),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_submission_counters'),
+        ('assignments', '0002_submission_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], default='upsert', max_length=6)),
+                ('course_id', models.BigIntegerField()),
+                ('owner_id', models.BigIntegerField(null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['course_id', 'id'], name='changelog_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['owner_id', 'id'], name='changelog_owner_idx'),
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
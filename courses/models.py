@@ -7,6 +7,21 @@ class Course(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Seat limit; null means unlimited.
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    # Seats taken. Claimed with a conditional UPDATE (courses.services) so
+    # concurrent enrollments can never push it past capacity.
+    enrollment_count = models.PositiveIntegerField(default=0)
+    # Totals over all assignments, maintained by assignments.counters.
+    submission_count = models.PositiveIntegerField(default=0)
+    reviewed_count = models.PositiveIntegerField(default=0)
+    pending_review_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated catalog (see courses.pagination).
+            models.Index(fields=['-created_at', '-id'], name='course_catalog_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -21,3 +36,45 @@ class Enrollment(models.Model):
 
     def __str__(self):
         return f"{self.student} enrolled in {self.course}"
+
+class WaitlistEntry(models.Model):
+    """A student waiting for a seat; promoted in created order when one frees up."""
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='waitlist_entries')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'course')
+        ordering = ('created_at', 'id')
+
+    def __str__(self):
+        return f"{self.student} waiting for {self.course}"
+
+
+class ChangeLog(models.Model):
+    """
+    One row per create, update or delete of a synced model, in insert order
+    of ``id``. Backs the delta-sync feed (courses.changes); ``id`` is the
+    cursor. Ids are plain integers, not foreign keys, so tombstones outlive
+    their rows.
+    """
+    UPSERT, DELETE = 'upsert', 'delete'
+    ACTION_CHOICES = ((UPSERT, 'Created or updated'), (DELETE, 'Deleted'))
+
+    model = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES, default=UPSERT)
+    course_id = models.BigIntegerField()
+    # The user the row belongs to: the student of an enrollment or
+    # submission, the instructor of a course.
+    owner_id = models.BigIntegerField(null=True)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course_id', 'id'], name='changelog_course_idx'),
+            models.Index(fields=['owner_id', 'id'], name='changelog_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model} {self.object_id}"
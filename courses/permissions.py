@@ -5,7 +5,7 @@ class IsCourseInstructor(BasePermission):
     Check if the user is instructor of the course
     """
     def has_object_permission(self, request, view, obj):
-        return obj.instructor == request.user
+        return obj.instructor_id == request.user.pk
 
 class IsStudentOrInstructor(BasePermission):
     """
@@ -0,0 +1,154 @@
+"""
+Versioned read-through cache for course and assignment GET responses.
+
+Every cached response is keyed by a version number: the catalog version for
+the course list, the course's own version for per-course reads. Signals in
+``courses.signals`` and ``assignments.signals`` bump the version on every
+Course, Enrollment or Assignment write, which orphans the old entries (they
+age out by TTL) instead of deleting them, so invalidation never scans keys.
+
+Keys also carry the caller's role and course membership, so a response built
+for an instructor is never served to a student or an outsider.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from api.db_routers import cache_timeout
+from . import membership
+
+RESPONSE_CACHE_TTL = getattr(settings, 'RESPONSE_CACHE_TTL', 300)
+
+CATALOG_VERSION_KEY = 'response:version:catalog'
+STATS_KEY = 'response:stats'
+
+
+def course_version_key(course_id):
+    return f'response:version:course:{course_id}'
+
+
+def _version(key):
+    # Versions start from the clock so one that was evicted comes back higher
+    # than any value it had, never reusing keys of older responses.
+    cache.add(key, time.time_ns() // 1000, None)
+    version = cache.get(key)
+    return version if version is not None else _bump(key)
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns() // 1000
+        cache.set(key, version, None)
+        return version
+
+
+def _bump_now_and_on_commit(*keys):
+    """
+    Bump now and again once the surrounding transaction commits, so a reader
+    that cached pre-commit rows under the intermediate version is orphaned.
+    """
+    for key in keys:
+        _bump(key)
+    transaction.on_commit(lambda: [_bump(key) for key in keys])
+
+
+def catalog_version():
+    return _version(CATALOG_VERSION_KEY)
+
+
+def course_version(course_id):
+    return _version(course_version_key(course_id))
+
+
+def bump_catalog():
+    _bump_now_and_on_commit(CATALOG_VERSION_KEY)
+
+
+def bump_course(course_id, catalog=False):
+    """Invalidate a course's cached reads; ``catalog`` also invalidates the list."""
+    keys = [course_version_key(course_id)]
+    if catalog:
+        keys.append(CATALOG_VERSION_KEY)
+    _bump_now_and_on_commit(*keys)
+
+
+def _count(scope, outcome):
+    key = f'{STATS_KEY}:{scope}:{outcome}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def stats(scopes):
+    """Hit/miss counters per scope."""
+    keys = [f'{STATS_KEY}:{scope}:{outcome}' for scope in scopes for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    report = {}
+    for scope in scopes:
+        hits = values.get(f'{STATS_KEY}:{scope}:hit', 0)
+        misses = values.get(f'{STATS_KEY}:{scope}:miss', 0)
+        total = hits + misses
+        report[scope] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+    return report
+
+
+def audience(request, course_id):
+    """How the caller relates to the course: instructor, student or none."""
+    if membership.is_instructor(request, course_id):
+        return 'instructor'
+    if membership.is_enrolled(request, course_id):
+        return 'student'
+    return 'none'
+
+
+class CachedResponseMixin:
+    """
+    Serve GET from the response cache. Permission checks still run on every
+    request (they happen in ``initial()``, before the handler); only the
+    queries and serialization behind a 200 response are skipped.
+
+    Views set ``cache_scope`` and, for per-course reads, override
+    ``cache_course_id()``.
+    """
+    cache_scope = None
+
+    def cache_course_id(self):
+        return None
+
+    def cache_key(self, request):
+        course_id = self.cache_course_id()
+        if course_id is None:
+            version, relation = catalog_version(), '-'
+        else:
+            version, relation = course_version(course_id), audience(request, course_id)
+        # The absolute URI covers the query string and the host that
+        # pagination links are built from.
+        digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        return f'response:{self.cache_scope}:{course_id}:{version}:{request.user.role}:{relation}:{digest}'
+
+    def get(self, request, *args, **kwargs):
+        key = self.cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _count(self.cache_scope, 'hit')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        _count(self.cache_scope, 'miss')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, cache_timeout(RESPONSE_CACHE_TTL))
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1,3 +1,6 @@
+import csv
+import io
+
 from rest_framework import serializers
 from .models import Course, Enrollment
 
@@ -5,10 +8,70 @@ class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ('student', 'course', 'enrolled_at')
+        # Set by EnrollmentCreateView from the URL and the caller; the
+        # database constraint, not a validator query, rejects duplicates.
+        read_only_fields = ('student', 'course')
+
+class SyncEnrollmentSerializer(EnrollmentSerializer):
+    """Enrollment with its id, which the change feed's tombstones refer to."""
+    class Meta(EnrollmentSerializer.Meta):
+        fields = ('id',) + EnrollmentSerializer.Meta.fields
 
 class CourseSerializer(serializers.ModelSerializer):
     enrollments = EnrollmentSerializer(many=True, read_only=True)
     
     class Meta:
         model = Course
-        fields = ('id', 'instructor', 'title', 'description', 'created_at', 'updated_at', 'enrollments')
+        fields = ('id', 'instructor', 'title', 'description', 'capacity', 'enrollment_count',
+                  'submission_count', 'reviewed_count', 'pending_review_count',
+                  'created_at', 'updated_at', 'enrollments')
+        read_only_fields = ('enrollment_count', 'submission_count', 'reviewed_count', 'pending_review_count')
+
+class CourseSummarySerializer(serializers.ModelSerializer):
+    """
+    Catalog representation: the stored counters instead of the nested roster.
+    """
+    class Meta:
+        model = Course
+        fields = ('id', 'instructor', 'title', 'description', 'capacity', 'created_at', 'updated_at',
+                  'enrollment_count', 'submission_count', 'reviewed_count', 'pending_review_count')
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    """
+    Roster import: either a JSON ``students`` list of emails/ids or an
+    uploaded CSV ``file`` with an ``email``, ``student`` or ``id`` column
+    (a header-less single column is accepted too).
+    """
+    students = serializers.ListField(child=serializers.CharField(allow_blank=True), required=False)
+    file = serializers.FileField(required=False)
+
+    CSV_COLUMNS = ('email', 'student', 'student_id', 'id')
+
+    def validate(self, data):
+        if 'students' not in data and 'file' not in data:
+            raise serializers.ValidationError("Provide a 'students' list or a CSV 'file'.")
+        identifiers = list(data.get('students', []))
+        if 'file' in data:
+            identifiers.extend(self.read_csv(data['file']))
+        data['identifiers'] = identifiers
+        return data
+
+    def read_csv(self, upload):
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise serializers.ValidationError({'file': 'CSV must be UTF-8 encoded.'})
+        rows = list(csv.reader(io.StringIO(text)))
+        if not rows:
+            return []
+        header = [cell.strip().lower() for cell in rows[0]]
+        column = next((header.index(name) for name in self.CSV_COLUMNS if name in header), None)
+        if column is None:
+            if len(header) != 1:
+                raise serializers.ValidationError(
+                    {'file': f"CSV needs one of the columns: {', '.join(self.CSV_COLUMNS)}."}
+                )
+            column, body = 0, rows
+        else:
+            body = rows[1:]
+        return [row[column] if len(row) > column else '' for row in body if any(cell.strip() for cell in row)]
@@ -0,0 +1,219 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+
+from api.sqlite import serialized_write
+from . import changes, membership, response_cache
+from .models import Course, Enrollment, WaitlistEntry
+
+# Keep IN (...) lists under SQLite's host-parameter limit.
+QUERY_CHUNK_SIZE = 500
+
+
+def chunked(items, size=QUERY_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _resolve_students(emails, ids):
+    """
+    Map lowercased emails and ids to (id, role) with one query per chunk.
+    Emails match case-insensitively: stored ones keep the case of their local
+    part, which people rarely retype.
+    """
+    User = get_user_model()
+    by_email, by_id = {}, {}
+    users = User.objects.annotate(email_lower=Lower('email'))
+    for chunk in chunked(emails):
+        for pk, email, role in users.filter(email_lower__in=chunk).values_list('id', 'email_lower', 'role'):
+            by_email[email] = (pk, role)
+    for chunk in chunked(ids):
+        for pk, role in User.objects.filter(pk__in=chunk).values_list('id', 'role'):
+            by_id[pk] = (pk, role)
+    return by_email, by_id
+
+
+def claim_seats(course_id, seats=1):
+    """
+    Take ``seats`` seats in one conditional UPDATE; False (and nothing taken)
+    if the course is missing or has fewer free seats. The database evaluates
+    the condition and the increment together, so concurrent callers can
+    neither overbook nor lose an update.
+    """
+    has_room = Q(capacity__isnull=True) | Q(enrollment_count__lte=F('capacity') - seats)
+    return bool(Course.objects.filter(has_room, pk=course_id).update(enrollment_count=F('enrollment_count') + seats))
+
+
+def release_seat(course_id):
+    """Give a seat back; False if the course is gone or had none taken."""
+    return bool(
+        Course.objects.filter(pk=course_id, enrollment_count__gt=0).update(enrollment_count=F('enrollment_count') - 1)
+    )
+
+
+def enroll_student(course_id, student):
+    """
+    Enroll ``student`` if a seat is free, otherwise add them to the waitlist.
+
+    Returns (status, object) with status 'enrolled', 'waitlisted',
+    'already_enrolled', 'already_waitlisted' or 'not_found'. A successful
+    enrollment costs one UPDATE and one INSERT whatever the contention.
+    """
+    outcome = 'already_enrolled'
+    try:
+        with serialized_write():
+            if claim_seats(course_id):
+                enrollment = Enrollment(course_id=course_id, student=student)
+                enrollment.seat_claimed = True
+                enrollment.save()
+                return 'enrolled', enrollment
+
+            # No seat, or no course.
+            if not Course.objects.filter(pk=course_id).exists():
+                return 'not_found', None
+            if Enrollment.objects.filter(course_id=course_id, student=student).exists():
+                return 'already_enrolled', None
+            outcome = 'already_waitlisted'
+            return 'waitlisted', WaitlistEntry.objects.create(course_id=course_id, student=student)
+    except IntegrityError:
+        # A duplicate row; any seat claim rolled back with it.
+        return outcome, None
+
+
+def waitlist_position(entry):
+    return WaitlistEntry.objects.filter(course_id=entry.course_id, id__lte=entry.pk).count()
+
+
+def promote_waitlist(course_id):
+    """Move waitlisted students into free seats, oldest first. Returns how many were promoted."""
+    promoted = 0
+    while True:
+        with serialized_write():
+            entry = WaitlistEntry.objects.filter(course_id=course_id).order_by('created_at', 'id').first()
+            if entry is None or not claim_seats(course_id):
+                return promoted
+            entry.delete()
+            try:
+                with transaction.atomic():
+                    enrollment = Enrollment(course_id=course_id, student_id=entry.student_id)
+                    enrollment.seat_claimed = True
+                    enrollment.save()
+            except IntegrityError:
+                # Enrolled some other way meanwhile; give the seat back.
+                release_seat(course_id)
+                continue
+        promoted += 1
+
+
+def bulk_enroll(course, identifiers):
+    """
+    Enroll many students in ``course`` at once.
+
+    ``identifiers`` is a sequence of student emails or primary keys. Returns
+    a per-row report in input order plus summary counts. Lookups run in
+    batched queries and new rows are written with one ``bulk_create`` inside a
+    single serialized write transaction. Students beyond the course's free
+    seats are waitlisted.
+    """
+    rows = []
+    emails, ids = set(), set()
+    for value in identifiers:
+        value = str(value).strip()
+        if not value:
+            rows.append({'value': value, 'status': 'invalid'})
+        elif value.isdigit():
+            ids.add(int(value))
+            rows.append({'value': value, 'key': ('id', int(value))})
+        elif '@' in value:
+            emails.add(value.lower())
+            rows.append({'value': value, 'key': ('email', value.lower())})
+        else:
+            rows.append({'value': value, 'status': 'invalid'})
+
+    by_email, by_id = _resolve_students(emails, ids)
+
+    candidates = set()
+    for row in rows:
+        if 'key' not in row:
+            continue
+        kind, key = row['key']
+        match = by_email.get(key) if kind == 'email' else by_id.get(key)
+        if match is None:
+            row['status'] = 'not_found'
+        elif match[1] != 'STUDENT':
+            row['status'] = 'not_student'
+        else:
+            row['student'] = match[0]
+            candidates.add(match[0])
+
+    with serialized_write():
+        existing = set()
+        for chunk in chunked(candidates):
+            existing.update(
+                Enrollment.objects.filter(course=course, student_id__in=chunk).values_list('student_id', flat=True)
+            )
+
+        # Lock the course row (a no-op on SQLite, where serialized_write
+        # already excludes other enrollment writers) so the free seat count
+        # cannot change before the claim below.
+        capacity, taken = Course.objects.select_for_update().filter(pk=course.pk).values_list(
+            'capacity', 'enrollment_count').get()
+        free = None if capacity is None else max(0, capacity - taken)
+
+        new_ids, waitlisted, seen = [], [], set()
+        for row in rows:
+            student_id = row.get('student')
+            if student_id is None:
+                continue
+            if student_id in existing:
+                row['status'] = 'already_enrolled'
+            elif student_id in seen:
+                row['status'] = 'duplicate'
+            elif free is not None and len(new_ids) >= free:
+                row['status'] = 'waitlisted'
+                seen.add(student_id)
+                waitlisted.append(student_id)
+            else:
+                row['status'] = 'enrolled'
+                seen.add(student_id)
+                new_ids.append(student_id)
+
+        if new_ids and not claim_seats(course.pk, len(new_ids)):
+            # The seats went between the read above and the claim (only
+            # possible where the row lock is not honoured): queue everyone.
+            for row in rows:
+                if row.get('status') == 'enrolled':
+                    row['status'] = 'waitlisted'
+            new_ids, waitlisted = [], new_ids + waitlisted
+        Enrollment.objects.bulk_create(
+            [Enrollment(course=course, student_id=student_id) for student_id in new_ids],
+            batch_size=QUERY_CHUNK_SIZE,
+        )
+        for chunk in chunked(new_ids):
+            WaitlistEntry.objects.filter(course=course, student_id__in=chunk).delete()
+        WaitlistEntry.objects.bulk_create(
+            [WaitlistEntry(course=course, student_id=student_id) for student_id in waitlisted],
+            batch_size=QUERY_CHUNK_SIZE, ignore_conflicts=True,
+        )
+        # bulk_create skips post_save, so drop the cached "not enrolled" answers
+        # and cached responses, and log the new rows for the change feed here.
+        for chunk in chunked(new_ids):
+            changes.record_many('enrollment', (
+                (pk, course.pk, student_id) for pk, student_id in
+                Enrollment.objects.filter(course=course, student_id__in=chunk).values_list('id', 'student_id')
+            ))
+        membership.forget_enrollments(course.pk, new_ids)
+        if new_ids:
+            response_cache.bump_course(course.pk, catalog=True)
+
+    report = []
+    summary = {}
+    for index, row in enumerate(rows, start=1):
+        entry = {'row': index, 'value': row['value'], 'status': row['status']}
+        if 'student' in row:
+            entry['student'] = row['student']
+        report.append(entry)
+        summary[row['status']] = summary.get(row['status'], 0) + 1
+    return {'course': course.pk, 'summary': summary, 'results': report}
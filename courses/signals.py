@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import changes, membership, response_cache, services
+from .models import ChangeLog, Course, Enrollment
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def forget_course_membership(sender, instance, **kwargs):
+    """The instructor may have changed, or the course is gone."""
+    membership.forget_course(instance.pk)
+    response_cache.bump_course(instance.pk, catalog=True)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def forget_enrollment_membership(sender, instance, **kwargs):
+    membership.forget_enrollments(instance.course_id, [instance.student_id])
+    # Rosters and enrollment counts show up in the catalog as well.
+    response_cache.bump_course(instance.course_id, catalog=True)
+
+
+@receiver(post_save, sender=Enrollment)
+def take_seat(sender, instance, created, **kwargs):
+    # services.enroll_student claims its seat up front with a conditional
+    # update; enrollments made any other way (admin, shell) are counted here.
+    if created and not getattr(instance, 'seat_claimed', False):
+        Course.objects.filter(pk=instance.course_id).update(enrollment_count=F('enrollment_count') + 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def free_seat(sender, instance, **kwargs):
+    course_id = instance.course_id
+    if services.release_seat(course_id):
+        transaction.on_commit(lambda: services.promote_waitlist(course_id))
+
+
+@receiver(pre_delete, sender=Course)
+def close_course(sender, instance, **kwargs):
+    # Runs before the cascade: with no seats left to release, the enrollments
+    # deleted along with the course do not schedule waitlist promotions.
+    Course.objects.filter(pk=instance.pk).update(enrollment_count=0)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def log_course_change(sender, instance, signal, **kwargs):
+    action = ChangeLog.DELETE if signal is post_delete else ChangeLog.UPSERT
+    changes.record('course', instance.pk, instance.pk, instance.instructor_id, action)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def log_enrollment_change(sender, instance, signal, **kwargs):
+    action = ChangeLog.DELETE if signal is post_delete else ChangeLog.UPSERT
+    changes.record('enrollment', instance.pk, instance.course_id, instance.student_id, action)
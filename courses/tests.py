@@ -1,3 +1,556 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APITestCase
+
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from assignments.models import Assignment, Submission
+from . import membership, services
+from .pagination import CourseKeysetPagination
+from .models import ChangeLog, Course, Enrollment, WaitlistEntry
+
+
+def make_user(email, role):
+    return CustomUser.objects.create_user(email=email, password=None, first_name='F', last_name='L', role=role)
+
+
+class QueryCountTestCase(APITestCase):
+    """Helpers to prove an endpoint's query count does not grow with its rows."""
+
+    def setUp(self):
+        # Membership answers live in the cache; start every test cold.
+        cache.clear()
+
+    def count_queries(self, user, url):
+        cache.clear()
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def assertConstantQueries(self, expected, user, url, grow):
+        small = self.count_queries(user, url)
+        grow()
+        large = self.count_queries(user, url)
+        self.assertEqual(small, large, f"{url} went from {small} to {large} queries")
+        self.assertLessEqual(large, expected)
+
+
+class CourseQueryCountTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.students = [make_user(f'student{i}@example.com', 'STUDENT') for i in range(12)]
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        self.add_courses(2)
+
+    def add_courses(self, count):
+        for index in range(count):
+            course = Course.objects.create(instructor=self.teacher, title=f'Course {index}', description='d')
+            Enrollment.objects.bulk_create(Enrollment(course=course, student=s) for s in self.students[:4])
+
+    def enroll(self, count):
+        existing = set(self.course.enrollments.values_list('student_id', flat=True))
+        new = [s for s in self.students if s.pk not in existing][:count]
+        Enrollment.objects.bulk_create(Enrollment(course=self.course, student=s) for s in new)
+
+    def test_catalog_summary(self):
+        self.assertConstantQueries(1, self.teacher, '/api/courses/create/', lambda: self.add_courses(8))
+
+    def test_catalog_with_rosters(self):
+        self.assertConstantQueries(2, self.teacher, '/api/courses/create/?include=enrollments',
+                                   lambda: self.add_courses(8))
+
+    def test_course_detail(self):
+        self.enroll(2)
+        # Course + roster, the instructor lookup that keys the response cache
+        # and the ETag validator query.
+        self.assertConstantQueries(4, self.teacher, f'/api/courses/courses/{self.course.pk}/',
+                                   lambda: self.enroll(10))
+
+    def test_enrollment_list_for_teacher(self):
+        self.enroll(2)
+        self.assertConstantQueries(1, self.teacher, '/api/courses/enrollments/', lambda: self.enroll(10))
+
+    def test_enrollment_list_for_student(self):
+        student = self.students[0]
+        self.assertConstantQueries(1, student, '/api/courses/enrollments/', lambda: self.add_courses(6))
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.student = make_user('student@example.com', 'STUDENT')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        self.url = f'/api/courses/courses/{self.course.pk}/'
+
+    def get(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, len(queries)
+
+    def test_second_read_is_served_from_cache(self):
+        first, _ = self.get(self.teacher, self.url)
+        second, queries = self.get(self.teacher, self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        # Only the ETag validator query runs.
+        self.assertEqual(queries, 1)
+
+    def test_enrollment_invalidates_course_and_catalog(self):
+        self.get(self.teacher, self.url)
+        self.get(self.teacher, '/api/courses/create/')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        detail, _ = self.get(self.teacher, self.url)
+        catalog, _ = self.get(self.teacher, '/api/courses/create/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(len(detail.json()['enrollments']), 1)
+        self.assertEqual(catalog['X-Cache'], 'MISS')
+        self.assertEqual(catalog.json()['results'][0]['enrollment_count'], 1)
+
+    def test_bulk_enroll_invalidates_course(self):
+        self.get(self.teacher, self.url)
+        self.client.post(f'/api/courses/courses/{self.course.pk}/enrollments/bulk/',
+                         {'students': [self.student.email]}, format='json')
+        detail, _ = self.get(self.teacher, self.url)
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(len(detail.json()['enrollments']), 1)
+
+    def test_catalog_follows_submission_counters(self):
+        Enrollment.objects.create(course=self.course, student=self.student)
+        assignment = self.course.assignments.create(title='HW', description='d', due_date='2030-01-01T00:00:00Z')
+        catalog = '/api/courses/create/'
+
+        def counts():
+            response, _ = self.get(self.teacher, catalog)
+            row = response.json()['results'][0]
+            return response['X-Cache'], (row['submission_count'], row['reviewed_count'], row['pending_review_count'])
+
+        self.assertEqual(counts(), ('MISS', (0, 0, 0)))
+        self.assertEqual(counts(), ('HIT', (0, 0, 0)))
+        self.client.force_authenticate(self.student)
+        response = self.client.post(f'/api/assignments/assignments/{assignment.pk}/submit/',
+                                    {'assignment': assignment.pk, 'content': 'answer'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(counts(), ('MISS', (1, 0, 1)))
+        self.client.force_authenticate(self.teacher)
+        response = self.client.patch(f"/api/assignments/submissions/{response.json()['id']}/review/",
+                                     {'feedback': 'ok'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(counts(), ('MISS', (1, 1, 0)))
+        assignment.delete()
+        self.assertEqual(counts(), ('MISS', (0, 0, 0)))
+
+    def test_keys_vary_by_membership(self):
+        url = f'/api/assignments/courses/{self.course.pk}/assignments/'
+        self.course.assignments.create(title='HW', description='d', due_date='2030-01-01T00:00:00Z')
+        teacher_view, _ = self.get(self.teacher, url)
+        outsider_view, _ = self.get(self.student, url)
+        self.assertEqual(len(teacher_view.json()), 1)
+        self.assertEqual(outsider_view['X-Cache'], 'MISS')
+        self.assertEqual(outsider_view.json(), [])
+
+
+
+class CoursePaginationTests(APITestCase):
+    url = '/api/courses/create/'
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.courses = [Course.objects.create(instructor=self.teacher, title=f'Course {n}', description='d')
+                        for n in range(5)]
+        # Ties on created_at are broken by id.
+        Course.objects.filter(pk__in=[c.pk for c in self.courses[1:4]]).update(
+            created_at=self.courses[1].created_at)
+        self.client.force_authenticate(self.teacher)
+
+    def test_cursor_round_trip(self):
+        paginator = CourseKeysetPagination()
+        course = Course.objects.get(pk=self.courses[2].pk)
+        cursor = paginator.encode_cursor(course)
+        request = Request(RequestFactory().get(self.url, {'cursor': cursor}))
+        self.assertEqual(paginator.decode_cursor(request), (course.created_at, course.pk))
+        self.assertIsNone(paginator.decode_cursor(Request(RequestFactory().get(self.url))))
+
+    def test_pages_cover_every_course_once(self):
+        seen, url = [], f'{self.url}?page_size=2'
+        while url:
+            body = self.client.get(url).json()
+            self.assertLessEqual(len(body['results']), 2)
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+        expected = Course.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not base64!', 'Z2FyYmFnZQ==', 'MjAyNC0wMS0wMXx4'):  # 'garbage', '2024-01-01|x'
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+
+class MembershipCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.student = make_user('student@example.com', 'STUDENT')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        self.assignment = self.course.assignments.create(title='HW', description='d',
+                                                         due_date='2030-01-01T00:00:00Z')
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_cached_answers_cost_no_queries(self):
+        with self.assertNumQueries(3):
+            request = self.request(self.student)
+            self.assertFalse(membership.is_member(request, self.course.pk))
+            self.assertEqual(membership.assignment_course_id(self.assignment.pk, request), self.course.pk)
+        # Memoized on the request, then served by the cache for the next one.
+        with self.assertNumQueries(0):
+            self.assertFalse(membership.is_member(request, self.course.pk))
+            request = self.request(self.student)
+            self.assertFalse(membership.is_member(request, self.course.pk))
+            self.assertEqual(membership.assignment_course_id(self.assignment.pk, request), self.course.pk)
+            self.assertTrue(membership.is_instructor(self.request(self.teacher), self.course.pk))
+
+    def test_enrollment_writes_invalidate(self):
+        self.assertFalse(membership.is_enrolled(self.request(self.student), self.course.pk))
+        enrollment = Enrollment.objects.create(course=self.course, student=self.student)
+        self.assertTrue(membership.is_enrolled(self.request(self.student), self.course.pk))
+        enrollment.delete()
+        self.assertFalse(membership.is_enrolled(self.request(self.student), self.course.pk))
+
+    def test_bulk_enrollment_invalidates(self):
+        self.assertFalse(membership.is_enrolled(self.request(self.student), self.course.pk))
+        services.bulk_enroll(self.course, [self.student.email])
+        self.assertTrue(membership.is_enrolled(self.request(self.student), self.course.pk))
+
+    def test_course_and_assignment_writes_invalidate(self):
+        other = Course.objects.create(instructor=self.teacher, title='Geometry', description='Intro')
+        self.assertTrue(membership.is_instructor(self.request(self.teacher), self.course.pk))
+        self.assertEqual(membership.assignment_course_id(self.assignment.pk), self.course.pk)
+        self.course.instructor = make_user('new@example.com', 'TEACHER')
+        self.course.save()
+        self.assignment.course = other
+        self.assignment.save()
+        self.assertFalse(membership.is_instructor(self.request(self.teacher), self.course.pk))
+        self.assertEqual(membership.assignment_course_id(self.assignment.pk), other.pk)
+        assignment_id = self.assignment.pk
+        self.assignment.delete()
+        self.assertEqual(membership.assignment_course_id(assignment_id), 0)
+
+    def test_keys_are_dropped_again_on_commit(self):
+        self.assertFalse(membership.is_enrolled(self.request(self.student), self.course.pk))
+        with self.captureOnCommitCallbacks() as callbacks:
+            Enrollment.objects.create(course=self.course, student=self.student)
+        # A concurrent reader re-caching the pre-commit answer...
+        cache.set(membership.enrollment_key(self.course.pk, self.student.pk), False)
+        for callback in callbacks:
+            callback()
+        # ...is dropped once the write commits.
+        self.assertTrue(membership.is_enrolled(self.request(self.student), self.course.pk))
+
+
+class CapacityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.students = [make_user(f'student{i}@example.com', 'STUDENT') for i in range(4)]
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro',
+                                            capacity=2)
+        self.url = f'/api/courses/courses/{self.course.pk}/enrollments/'
+
+    def enroll(self, student):
+        self.client.force_authenticate(student)
+        return self.client.post(self.url, {}, format='json')
+
+    def test_full_course_waitlists(self):
+        statuses = [self.enroll(student).status_code for student in self.students]
+        self.assertEqual(statuses, [201, 201, 202, 202])
+        self.assertEqual(self.enroll(self.students[3]).json()['detail'],
+                         'You are already on the waitlist for this course.')
+        self.assertEqual(self.enroll(self.students[0]).status_code, 409)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, 2)
+
+    def test_waitlist_position(self):
+        for student in self.students[:3]:
+            self.enroll(student)
+        self.assertEqual(self.enroll(self.students[3]).json(),
+                         {'course': self.course.pk, 'status': 'waitlisted', 'position': 2})
+
+    def test_leaving_promotes_the_oldest_waitlisted(self):
+        for student in self.students:
+            self.enroll(student)
+        self.client.force_authenticate(self.students[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        enrolled = set(self.course.enrollments.values_list('student_id', flat=True))
+        self.assertEqual(enrolled, {self.students[1].pk, self.students[2].pk})
+        self.assertEqual(list(self.course.waitlist.values_list('student_id', flat=True)), [self.students[3].pk])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, 2)
+
+    def test_leaving_the_waitlist(self):
+        for student in self.students[:3]:
+            self.enroll(student)
+        self.client.force_authenticate(self.students[2])
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(self.client.delete(self.url).status_code, 404)
+
+    def test_bulk_enroll_waitlists_overflow(self):
+        self.client.force_authenticate(self.teacher)
+        response = self.client.post(f'{self.url}bulk/', {'students': [s.email for s in self.students]},
+                                    format='json')
+        self.assertEqual(response.json()['summary'], {'enrolled': 2, 'waitlisted': 2})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, 2)
+        self.assertEqual(self.course.waitlist.count(), 2)
+
+    def test_bulk_enroll_waitlists_everyone_if_the_claim_fails(self):
+        self.client.force_authenticate(self.teacher)
+        with mock.patch.object(services, 'claim_seats', return_value=False):
+            response = self.client.post(f'{self.url}bulk/', {'students': [s.email for s in self.students]},
+                                        format='json')
+        self.assertEqual(response.json()['summary'], {'waitlisted': 4})
+        self.assertFalse(self.course.enrollments.exists())
+        self.assertEqual(list(self.course.waitlist.order_by('id').values_list('student_id', flat=True)),
+                         [student.pk for student in self.students])
+
+    def test_deleting_the_course_promotes_no_one(self):
+        for student in self.students:
+            self.enroll(student)
+        with mock.patch.object(services, 'promote_waitlist') as promote:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.course.delete()
+        promote.assert_not_called()
+        self.assertFalse(Enrollment.objects.exists())
+
+
+class BulkEnrollmentTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.mixed = make_user('Mixed.Case@example.com', 'STUDENT')
+        self.plain = make_user('plain@example.com', 'STUDENT')
+        self.enrolled = make_user('enrolled@example.com', 'STUDENT')
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        Enrollment.objects.create(course=self.course, student=self.enrolled)
+        self.url = f'/api/courses/courses/{self.course.pk}/enrollments/bulk/'
+        self.client.force_authenticate(self.teacher)
+
+    def upload(self, content):
+        return self.client.post(self.url, {'file': SimpleUploadedFile('roster.csv', content)}, format='multipart')
+
+    def test_report_in_input_order(self):
+        response = self.client.post(self.url, {'students': [
+            'mixed.case@EXAMPLE.com', str(self.plain.pk), 'MIXED.CASE@example.com', 'enrolled@example.com',
+            'teacher@example.com', 'nobody@example.com', 'not an email', '',
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['status'] for row in response.json()['results']], [
+            'enrolled', 'enrolled', 'duplicate', 'already_enrolled', 'not_student', 'not_found', 'invalid',
+            'invalid',
+        ])
+        self.assertEqual(response.json()['results'][0]['student'], self.mixed.pk)
+        self.assertEqual(set(self.course.enrollments.values_list('student_id', flat=True)),
+                         {self.mixed.pk, self.plain.pk, self.enrolled.pk})
+
+    def test_csv_column_is_picked_by_header(self):
+        response = self.upload(b'\xef\xbb\xbfName,Email\nMixed,mixed.case@example.com\n,\nPlain,plain@example.com\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['value'], row['status']) for row in response.json()['results']],
+                         [('mixed.case@example.com', 'enrolled'), ('plain@example.com', 'enrolled')])
+
+    def test_headerless_single_column_csv(self):
+        response = self.upload(f'plain@example.com\n{self.mixed.pk}\n'.encode())
+        self.assertEqual(response.json()['summary'], {'enrolled': 2})
+
+    def test_unreadable_csv_is_rejected(self):
+        self.assertEqual(self.upload(b'name,age\nA,1\n').status_code, 400)
+        self.assertEqual(self.upload('email\nm\xe9@example.com\n'.encode('latin-1')).status_code, 400)
+        self.assertFalse(Enrollment.objects.exclude(student=self.enrolled).exists())
+
+
+class ChangeFeedTests(APITestCase):
+    url = '/api/courses/changes/'
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_user('teacher@example.com', 'TEACHER')
+        self.outsider = make_user('outsider@example.com', 'TEACHER')
+        self.student, self.classmate = (make_user(f'student{i}@example.com', 'STUDENT') for i in range(2))
+        self.course = Course.objects.create(instructor=self.teacher, title='Algebra', description='Intro')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        Enrollment.objects.create(course=self.course, student=self.classmate)
+        self.assignment = Assignment.objects.create(course=self.course, title='Homework', description='d',
+                                                    due_date=timezone.now())
+        self.submission = Submission.objects.create(assignment=self.assignment, student=self.student,
+                                                    content='Answer')
+        Submission.objects.create(assignment=self.assignment, student=self.classmate, content='Other')
+
+    def sync(self, user, since=None, **params):
+        self.client.force_authenticate(user)
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, body, name):
+        return [row['id'] for row in body['changes'][name]]
+
+    def test_initial_sync_returns_visible_rows(self):
+        body = self.sync(self.student)
+        self.assertEqual(self.ids(body, 'courses'), [self.course.pk])
+        self.assertEqual(len(body['changes']['enrollments']), 1)
+        self.assertEqual(self.ids(body, 'assignments'), [self.assignment.pk])
+        self.assertEqual(self.ids(body, 'submissions'), [self.submission.pk])
+        self.assertFalse(body['has_more'])
+
+        teacher = self.sync(self.teacher)
+        self.assertEqual(len(teacher['changes']['enrollments']), 2)
+        self.assertEqual(len(teacher['changes']['submissions']), 2)
+        self.assertEqual(self.sync(self.outsider)['changes'], {name: [] for name in teacher['changes']})
+
+    def test_sync_with_nothing_new_is_one_query(self):
+        cursor = self.sync(self.student)['cursor']
+        self.client.force_authenticate(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get(self.url, {'since': cursor}).json()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(body['cursor'], cursor)
+        self.assertEqual(body['changes']['submissions'], [])
+
+    def test_changes_after_the_cursor_collapse_to_the_latest_state(self):
+        cursor = self.sync(self.student)['cursor']
+        self.submission.status = 'reviewed'
+        self.submission.save()
+        self.submission.feedback = 'Good'
+        self.submission.save()
+        Submission.objects.filter(student=self.classmate).get().delete()
+        body = self.sync(self.student, cursor)
+        self.assertEqual([row['feedback'] for row in body['changes']['submissions']], ['Good'])
+        self.assertEqual(body['deleted']['submissions'], [])
+        self.assertEqual(self.ids(body, 'courses'), [])
+        self.assertEqual(len(self.sync(self.teacher, cursor)['deleted']['submissions']), 1)
+
+    def test_deletions_are_tombstones(self):
+        cursor = self.sync(self.student)['cursor']
+        enrollment = Enrollment.objects.get(student=self.student)
+        enrollment_id, assignment_id, submission_id = enrollment.pk, self.assignment.pk, self.submission.pk
+        self.assignment.delete()
+        enrollment.delete()
+        body = self.sync(self.student, cursor)
+        self.assertEqual(body['deleted']['enrollments'], [enrollment_id])
+        self.assertEqual(body['deleted']['submissions'], [submission_id])
+        teacher = self.sync(self.teacher, cursor)
+        self.assertEqual(teacher['deleted']['assignments'], [assignment_id])
+
+    def test_limit_pages_through_the_log(self):
+        seen, cursor, calls = set(), 0, 0
+        while True:
+            body = self.sync(self.teacher, cursor, limit=2)
+            calls += 1
+            seen.update(self.ids(body, 'submissions'))
+            cursor = body['cursor']
+            if not body['has_more']:
+                break
+        self.assertGreater(calls, 2)
+        self.assertEqual(len(seen), 2)
+
+    def test_bulk_enrollment_is_logged(self):
+        newcomer = make_user('newcomer@example.com', 'STUDENT')
+        cursor = ChangeLog.objects.latest('id').pk
+        self.client.force_authenticate(self.teacher)
+        self.client.post(f'/api/courses/courses/{self.course.pk}/enrollments/bulk/',
+                         {'students': [newcomer.email]}, format='json')
+        body = self.sync(newcomer, cursor)
+        self.assertEqual([row['student'] for row in body['changes']['enrollments']], [newcomer.pk])
+        self.assertEqual(self.ids(body, 'courses'), [self.course.pk])
+        self.assertEqual(self.ids(body, 'assignments'), [self.assignment.pk])
+
+    def test_enrolling_returns_the_course_and_its_assignments(self):
+        other = Course.objects.create(instructor=self.teacher, title='Geometry', description='Intro')
+        homework = Assignment.objects.create(course=other, title='Proofs', description='d', due_date=timezone.now())
+        cursor = self.sync(self.student)['cursor']
+        Enrollment.objects.create(course=other, student=self.student)
+        body = self.sync(self.student, cursor)
+        self.assertEqual(self.ids(body, 'courses'), [other.pk])
+        self.assertEqual(self.ids(body, 'assignments'), [homework.pk])
+        self.assertEqual(self.sync(self.classmate, cursor)['changes']['courses'], [])
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(self.url, {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': -1}).status_code, 400)
+
+
+class ConcurrentEnrollmentTests(TransactionTestCase):
+    """Many students racing for a few seats from separate threads and connections."""
+    CAPACITY = 5
+    STUDENTS = 30
+
+    def setUp(self):
+        cache.clear()
+        teacher = make_user('teacher@example.com', 'TEACHER')
+        self.students = [make_user(f'student{i}@example.com', 'STUDENT') for i in range(self.STUDENTS)]
+        self.course = Course.objects.create(instructor=teacher, title='Seminar', description='d',
+                                            capacity=self.CAPACITY)
+
+    def test_no_overbooking(self):
+        start = threading.Barrier(self.STUDENTS)
+        outcomes = []
+
+        # The service rather than the API: the in-memory test database shares
+        # one cache between connections, where a read next to a write fails
+        # with "table is locked" instead of waiting as it would on a file.
+        def enroll(student):
+            try:
+                start.wait()
+                outcomes.append(services.enroll_student(self.course.pk, student)[0])
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=enroll, args=(student,)) for student in self.students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes),
+                         ['enrolled'] * self.CAPACITY + ['waitlisted'] * (self.STUDENTS - self.CAPACITY))
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, self.CAPACITY)
+        self.assertEqual(self.course.enrollments.count(), self.CAPACITY)
+        self.assertEqual(self.course.waitlist.count(), self.STUDENTS - self.CAPACITY)
+
+        # Leaving frees the seat for the first student on the waitlist; the
+        # promotion runs on commit, still inside the leaver's serialized write.
+        first_waiting = self.course.waitlist.first().student_id
+        client = APIClient()
+        client.force_authenticate(self.course.enrollments.first().student)
+        self.assertEqual(client.delete(f'/api/courses/courses/{self.course.pk}/enrollments/').status_code, 204)
+        self.assertTrue(self.course.enrollments.filter(student_id=first_waiting).exists())
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, self.CAPACITY)
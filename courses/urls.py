@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import CourseListCreateView, CourseDetailView, EnrollmentCreateView, EnrollmentListView
+from .views import CourseListCreateView, CourseDetailView, EnrollmentCreateView, EnrollmentListView, BulkEnrollmentView, EnrollmentExportView, ResponseCacheMetricsView, ChangeFeedView
 
 urlpatterns = [
     path('create/', CourseListCreateView.as_view(), name='course-list-create'),
     path('courses/<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
     path('courses/<int:course_id>/enrollments/', EnrollmentCreateView.as_view(), name='enrollment-create'),
+    path('courses/<int:course_id>/enrollments/bulk/', BulkEnrollmentView.as_view(), name='enrollment-bulk'),
+    path('courses/<int:course_id>/enrollments/export/', EnrollmentExportView.as_view(), name='enrollment-export'),
     path('enrollments/', EnrollmentListView.as_view(), name='enrollment-list'),
+    path('changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('cache/metrics/', ResponseCacheMetricsView.as_view(), name='response-cache-metrics'),
 ]
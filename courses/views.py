@@ -1,23 +1,37 @@
+from django.db.models import Count, Max, Prefetch
+from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.response import Response
-from .models import Course, Enrollment
-from .serializers import CourseSerializer, EnrollmentSerializer
-from accounts.permissions import IsAuthenticatedAndActive
-from .permissions import IsCourseInstructor, IsStudentOrInstructor
-from assignments.permissions import IsTeacher, IsStudent
+from rest_framework.views import APIView
 
-from rest_framework import generics, permissions, status
-from rest_framework.response import Response
-from .models import Course, Enrollment
-from .serializers import CourseSerializer, EnrollmentSerializer
-from accounts.permissions import IsAuthenticatedAndActive
+from accounts.permissions import IsAuthenticatedAndActive, IsAdminRole
+from api.conditional import ConditionalGetMixin
+from api.exceptions import Conflict
+from api.idempotency import IdempotentCreateMixin
+from api.sqlite import serialized_write
+from api.streaming import EXPORT_RENDERERS, EXPORT_CHUNK_SIZE, stream_rows
+from assignments.permissions import IsTeacher, IsStudent, IsCourseTeacher
+from . import changes, response_cache
+from .models import Course, Enrollment, WaitlistEntry
+from .pagination import CourseKeysetPagination
 from .permissions import IsCourseInstructor, IsStudentOrInstructor
-from assignments.permissions import IsTeacher, IsStudent # changed the import
-
+from .response_cache import CachedResponseMixin
+from .serializers import CourseSerializer, EnrollmentSerializer, CourseSummarySerializer, BulkEnrollmentSerializer
+from .services import bulk_enroll, enroll_student, waitlist_position
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
+    """
+    Course catalog. GET returns keyset-paginated summaries with an enrollment
+    count; pass ``?include=enrollments`` to get the nested rosters instead.
+    Pages are served from the response cache until any course or enrollment
+    changes.
+    """
     queryset = Course.objects.all()
+    cache_scope = 'course-list'
     serializer_class = CourseSerializer
+    pagination_class = CourseKeysetPagination
     permission_classes = [IsAuthenticatedAndActive]
     
     def get_permissions(self):
@@ -25,28 +39,115 @@ class CourseListCreateView(generics.ListCreateAPIView):
             self.permission_classes = [IsAuthenticatedAndActive, IsTeacher]
         return super().get_permissions()
 
+    def wants_roster(self):
+        include = self.request.query_params.get('include', '')
+        return 'enrollments' in include.split(',')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        if self.wants_roster():
+            return queryset.prefetch_related(Prefetch('enrollments', queryset=Enrollment.objects.order_by('id')))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and not self.wants_roster():
+            return CourseSummarySerializer
+        return super().get_serializer_class()
+
     def perform_create(self, serializer):
         serializer.save(instructor=self.request.user)
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Course.objects.all()
+class CourseDetailView(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Course.objects.prefetch_related(Prefetch('enrollments', queryset=Enrollment.objects.order_by('id')))
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticatedAndActive]
+    cache_scope = 'course-detail'
 
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             self.permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsCourseInstructor]
         return super().get_permissions()
 
-class EnrollmentCreateView(generics.CreateAPIView):
+    def cache_course_id(self):
+        return self.kwargs['pk']
+
+    def get_validators(self):
+        # The roster is part of the body; the count catches removed students.
+        # The stored counters change with every submission and review.
+        state = Course.objects.filter(pk=self.kwargs['pk']).aggregate(
+            updated=Max('updated_at'), enrolled=Max('enrollments__enrolled_at'), students=Count('enrollments'),
+            submissions=Max('submission_count'), reviewed=Max('reviewed_count'),
+        )
+        if state['updated'] is None:
+            return None
+        return state['updated'], state['enrolled'], state['students'], state['submissions'], state['reviewed']
+
+class EnrollmentCreateView(IdempotentCreateMixin, generics.CreateAPIView):
+    """
+    POST enrolls the caller (201) or, when the course is full, puts them on
+    the waitlist (202 with their position). DELETE leaves the course, or the
+    waitlist, and frees the seat for the next waitlisted student.
+    """
     serializer_class = EnrollmentSerializer
     permission_classes = [IsAuthenticatedAndActive, IsStudent] #changed permission
 
-    def perform_create(self, serializer):
-        course = Course.objects.get(pk=self.kwargs['course_id'])
-        if Enrollment.objects.filter(student=self.request.user, course=course).exists():
-            raise permissions.PermissionDenied("You are already enrolled in this course.")
-        serializer.save(student=self.request.user, course=course)
+    def create(self, request, *args, **kwargs):
+        course_id = self.kwargs['course_id']
+        outcome, obj = enroll_student(course_id, request.user)
+        if outcome == 'enrolled':
+            return Response(self.get_serializer(obj).data, status=status.HTTP_201_CREATED)
+        if outcome == 'waitlisted':
+            return Response({'course': int(course_id), 'status': 'waitlisted', 'position': waitlist_position(obj)},
+                            status=status.HTTP_202_ACCEPTED)
+        if outcome == 'not_found':
+            raise NotFound("Course not found.")
+        if outcome == 'already_waitlisted':
+            raise Conflict("You are already on the waitlist for this course.")
+        raise Conflict("You are already enrolled in this course.")
+
+    def delete(self, request, *args, **kwargs):
+        course_id = self.kwargs['course_id']
+        with serialized_write():
+            removed, _ = Enrollment.objects.filter(course_id=course_id, student=request.user).delete()
+            if not removed:
+                removed, _ = WaitlistEntry.objects.filter(course_id=course_id, student=request.user).delete()
+        if not removed:
+            raise NotFound("You are not enrolled in or waitlisted for this course.")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class BulkEnrollmentView(generics.GenericAPIView):
+    """
+    Enroll a whole roster in one request. Accepts a JSON list of student
+    emails/ids or a CSV upload and returns a per-row report.
+    """
+    serializer_class = BulkEnrollmentSerializer
+    permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsCourseTeacher]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def post(self, request, *args, **kwargs):
+        course = get_object_or_404(Course, pk=self.kwargs['course_id'])
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = bulk_enroll(course, serializer.validated_data['identifiers'])
+        return Response(report, status=status.HTTP_200_OK)
+
+class EnrollmentExportView(APIView):
+    """
+    Stream a course roster as CSV (default) or JSON Lines (``?format=jsonl``).
+    """
+    permission_classes = [IsAuthenticatedAndActive, IsTeacher, IsCourseTeacher]
+    renderer_classes = EXPORT_RENDERERS
+
+    COLUMNS = ('student_id', 'email', 'first_name', 'last_name', 'student_number', 'enrolled_at')
+
+    def get(self, request, course_id):
+        rows = Enrollment.objects.filter(course_id=course_id).order_by('id').values_list(
+            'student_id', 'student__email', 'student__first_name', 'student__last_name',
+            'student__student_id', 'enrolled_at',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return stream_rows(request, self.COLUMNS, rows, f'course-{course_id}-enrollments')
 
 class EnrollmentListView(generics.ListAPIView):
     serializer_class = EnrollmentSerializer
@@ -61,3 +162,37 @@ class EnrollmentListView(generics.ListAPIView):
             # Teachers can see enrollments for *their* courses.  This is the key fix.
             return Enrollment.objects.filter(course__instructor=user)
         return Enrollment.objects.none()
+
+class ResponseCacheMetricsView(APIView):
+    """Hit/miss counters of the course and assignment response cache."""
+    permission_classes = [IsAuthenticatedAndActive, IsAdminRole]
+
+    SCOPES = ('course-list', 'course-detail', 'assignment-list')
+
+    def get(self, request):
+        return Response(response_cache.stats(self.SCOPES))
+
+class ChangeFeedView(APIView):
+    """
+    Delta sync: the courses, enrollments, assignments and submissions visible
+    to the caller that changed after ``?since=<cursor>`` (0 or omitted: all),
+    with tombstones for deletions. ``?limit`` caps the log rows read per call;
+    call again with the returned ``cursor`` while ``has_more``.
+    """
+    permission_classes = [IsAuthenticatedAndActive]
+
+    def get(self, request):
+        since = self.integer_param('since', 0)
+        limit = min(self.integer_param('limit', changes.DEFAULT_LIMIT), changes.MAX_LIMIT)
+        if since < 0 or limit < 1:
+            raise ValidationError({'detail': "'since' must be >= 0 and 'limit' >= 1."})
+        return Response(changes.feed(request.user, since, limit))
+
+    def integer_param(self, name, default):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be an integer.'})